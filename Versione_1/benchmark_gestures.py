@@ -0,0 +1,60 @@
+# benchmark_gestures.py
+
+"""
+Benchmark da riga di comando per GestureEngine (gesture_engine.py).
+
+Uso:
+    python benchmark_gestures.py [--hands N] [--frames N] [--repeat N]
+
+Misura il tempo di classify() su mani sintetiche (landmark casuali attorno
+a una mano aperta), così il confronto si può ripetere senza webcam né
+MediaPipe installato.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from gesture_engine import GestureEngine
+
+def synthetic_hands(frames, hands, seed=0):
+    """
+    :return: Lista di `frames` array (mani, 21, 3) di landmark normalizzati.
+    """
+    rng = np.random.default_rng(seed)
+    # Mano aperta di riferimento: polso in basso, dita a ventaglio verso l'alto
+    base = np.zeros((21, 3), dtype=np.float32)
+    base[0] = (0.5, 0.8, 0.0)
+    for finger in range(5):
+        x = 0.38 + finger * 0.06
+        for joint in range(4):
+            base[1 + finger * 4 + joint] = (x, 0.7 - joint * 0.07, 0.0)
+    noise = rng.normal(0.0, 0.03, size=(frames, hands, 21, 3)).astype(np.float32)
+    return list(base + noise)
+
+def time_per_frame(engine, frames, repeat):
+    """Restituisce il tempo medio di classify() per frame in millisecondi (miglior ripetizione)."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for hands in frames:
+            engine.classify(hands)
+        best = min(best, (time.perf_counter() - start) / len(frames))
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del classificatore dei gesti")
+    parser.add_argument('--hands', type=int, default=3, help="Mani per frame")
+    parser.add_argument('--frames', type=int, default=1000, help="Numero di frame")
+    parser.add_argument('--repeat', type=int, default=5, help="Ripetizioni (vale la migliore)")
+    args = parser.parse_args()
+
+    engine = GestureEngine()
+    frames = synthetic_hands(args.frames, args.hands)
+    ms = time_per_frame(engine, frames, args.repeat)
+    print(f"GestureEngine.classify: {ms:.3f} ms/frame con {args.hands} mani "
+          f"({len(engine.GESTURES)} gesti, {args.frames} frame)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import numpy as np
+
+# Indici dei landmark MediaPipe usati dal classificatore dei gesti
+WRIST = 0
+THUMB_IP, THUMB_TIP = 3, 4
+FINGER_MCP = np.array([5, 9, 13, 17])
+FINGER_PIP = np.array([6, 10, 14, 18])
+FINGER_TIP = np.array([8, 12, 16, 20])
+INDEX_TIP, MIDDLE_MCP, PINKY_MCP = 8, 9, 17
+
+def landmarks_to_array(hand_landmarks):
+    """Converte i 21 landmark di una mano in un array NumPy (21, 3), una sola volta per frame."""
+    return np.array([(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark], dtype=np.float32)
+
+class GestureEngine:
+    """
+    Classificatore dei gesti guidato da tabella. Per tutte le mani del frame
+    calcola in un colpo solo, con operazioni vettoriali, le caratteristiche
+    (dita estese, pizzico pollice-indice, orientamento del pollice) e le
+    confronta con tutte le righe di GESTURES: una mano può avere più gesti.
+    """
+
+    # Colonne delle caratteristiche: pollice, indice, medio, anulare, mignolo estesi,
+    # pizzico, pollice verso l'alto, pollice verso il basso
+    FEATURES = ("pollice", "indice", "medio", "anulare", "mignolo", "pizzico", "pollice_su", "pollice_giu")
+
+    # Ogni gesto: 1 = richiesto, 0 = escluso, -1 = indifferente (stesso ordine di FEATURES)
+    GESTURES = (
+        ("Pugno Chiuso",   (0, 0, 0, 0, 0, -1, 0, 0)),
+        ("Mano Aperta",    (1, 1, 1, 1, 1, 0, -1, -1)),
+        ("Indice Alzato",  (-1, 1, 0, 0, 0, 0, -1, -1)),
+        ("Vittoria",       (-1, 1, 1, 0, 0, 0, -1, -1)),
+        ("Pollice in Su",  (1, 0, 0, 0, 0, 0, 1, 0)),
+        ("Pollice in Giù", (1, 0, 0, 0, 0, 0, 0, 1)),
+        ("OK",             (-1, -1, 1, 1, 1, 1, -1, -1)),
+    )
+
+    # Gesto inviato quando una mano non ne forma nessuno della tabella
+    NO_GESTURE = "Nessun Gesto"
+
+    def __init__(self, extension_ratio=1.1, pinch_threshold=0.35, thumb_vertical=0.5):
+        """
+        :param extension_ratio: Un dito è esteso se la punta dista dal polso più di ratio volte la nocca intermedia.
+        :param pinch_threshold: Distanza pollice-indice (in unità di palmo) sotto cui c'è un pizzico.
+        :param thumb_vertical: Spostamento verticale minimo (in unità di palmo) del pollice per "su"/"giù".
+        """
+        self.extension_ratio = extension_ratio
+        self.pinch_threshold = pinch_threshold
+        self.thumb_vertical = thumb_vertical
+        self.names = [name for name, _ in self.GESTURES]
+        self.patterns = np.array([pattern for _, pattern in self.GESTURES], dtype=np.int8)
+
+    def features(self, hands):
+        """
+        :param hands: Array (mani, 21, 3) di landmark normalizzati.
+        :return: Array booleano (mani, len(FEATURES)).
+        """
+        wrist = hands[:, WRIST:WRIST + 1, :2]
+        # Dimensione del palmo (polso - nocca del medio), per rendere le soglie indipendenti dalla distanza
+        palm = np.linalg.norm(hands[:, MIDDLE_MCP, :2] - hands[:, WRIST, :2], axis=1) + 1e-6
+
+        # Dita lunghe: la punta è più lontana dal polso della nocca intermedia
+        tip_dist = np.linalg.norm(hands[:, FINGER_TIP, :2] - wrist, axis=2)
+        pip_dist = np.linalg.norm(hands[:, FINGER_PIP, :2] - wrist, axis=2)
+        fingers = tip_dist > pip_dist * self.extension_ratio
+
+        # Pollice: la punta si allontana dalla base del mignolo più dell'articolazione IP
+        pinky_mcp = hands[:, PINKY_MCP, :2]
+        thumb = (np.linalg.norm(hands[:, THUMB_TIP, :2] - pinky_mcp, axis=1) >
+                 np.linalg.norm(hands[:, THUMB_IP, :2] - pinky_mcp, axis=1) * self.extension_ratio)
+
+        pinch = np.linalg.norm(hands[:, THUMB_TIP, :2] - hands[:, INDEX_TIP, :2], axis=1) / palm < self.pinch_threshold
+
+        # Orientamento del pollice rispetto alle nocche (y dell'immagine cresce verso il basso)
+        knuckles_y = hands[:, FINGER_MCP, 1].mean(axis=1)
+        thumb_rise = (knuckles_y - hands[:, THUMB_TIP, 1]) / palm
+        thumb_up = thumb_rise > self.thumb_vertical
+        thumb_down = thumb_rise < -self.thumb_vertical
+
+        return np.column_stack([thumb, fingers, pinch, thumb_up, thumb_down])
+
+    def classify(self, hands):
+        """
+        Classifica tutte le mani del frame contro tutti i gesti in un'unica operazione.
+        :param hands: Array (mani, 21, 3) di landmark.
+        :return: Per ogni mano, la lista dei gesti riconosciuti.
+        """
+        if len(hands) == 0:
+            return []
+        features = self.features(hands).astype(np.int8)
+        # (mani, gesti, caratteristiche): ogni colonna è indifferente o uguale al valore richiesto
+        matches = ((self.patterns == -1) | (self.patterns == features[:, np.newaxis, :])).all(axis=2)
+        return [[self.names[g] for g in np.flatnonzero(row)] for row in matches]
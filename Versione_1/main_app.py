@@ -31,7 +31,8 @@ from PyQt6.QtWidgets import (
 
 # IMPORTAZIONE MODULI LOCALI
 from visual_background import VideoThread
-from ollama_manager import OllamaThread, OllamaModelsThread
+from ollama_manager import (OllamaThread, OllamaModelsThread, get_client, DEFAULT_BASE_URL,
+                            DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
 from tts_manager import TTSThread, VOCI_DI_SISTEMA, GTTS_LANGUAGES
 from speech_recognition_manager import SpeechRecognitionThread
 from vosk_model_manager import VoskModelManager
@@ -291,6 +292,30 @@ class ConfigurationDialog(QDialog):
 
         ai_group = QGroupBox("Selezione AI")
         ai_layout = QVBoxLayout(ai_group)
+        ai_layout.addWidget(QLabel("Indirizzo del server Ollama:"))
+        self.ollama_url_input = QLineEdit(DEFAULT_BASE_URL)
+        ai_layout.addWidget(self.ollama_url_input)
+
+        timeout_layout = QGridLayout()
+        timeout_layout.addWidget(QLabel("Attesa massima della connessione (s):"), 0, 0)
+        self.ollama_connect_timeout_slider = QSlider(Qt.Orientation.Horizontal)
+        self.ollama_connect_timeout_slider.setRange(1, 30)
+        self.ollama_connect_timeout_slider.setValue(DEFAULT_CONNECT_TIMEOUT)
+        self.ollama_connect_timeout_label = QLabel(str(DEFAULT_CONNECT_TIMEOUT))
+        self.ollama_connect_timeout_slider.valueChanged.connect(lambda value: self.ollama_connect_timeout_label.setText(str(value)))
+        timeout_layout.addWidget(self.ollama_connect_timeout_slider, 0, 1)
+        timeout_layout.addWidget(self.ollama_connect_timeout_label, 0, 2)
+        timeout_layout.addWidget(QLabel("Attesa massima della risposta (s):"), 1, 0)
+        self.ollama_read_timeout_slider = QSlider(Qt.Orientation.Horizontal)
+        self.ollama_read_timeout_slider.setRange(10, 600)
+        self.ollama_read_timeout_slider.setSingleStep(10)
+        self.ollama_read_timeout_slider.setValue(DEFAULT_READ_TIMEOUT)
+        self.ollama_read_timeout_label = QLabel(str(DEFAULT_READ_TIMEOUT))
+        self.ollama_read_timeout_slider.valueChanged.connect(lambda value: self.ollama_read_timeout_label.setText(str(value)))
+        timeout_layout.addWidget(self.ollama_read_timeout_slider, 1, 1)
+        timeout_layout.addWidget(self.ollama_read_timeout_label, 1, 2)
+        ai_layout.addLayout(timeout_layout)
+
         self.ollama_model_combo = QComboBox()
         self.ollama_model_combo.addItem("Caricamento modelli...")
         ai_layout.addWidget(QLabel("Modello Ollama:"))
@@ -696,6 +721,9 @@ class ConfigurationDialog(QDialog):
     def update_ui_from_settings(self):
         """Aggiorna i widget del dialogo con le impostazioni caricate."""
         self.ollama_model_combo.setCurrentText(self.settings.get('ollama_model', 'llava:7b'))
+        self.ollama_url_input.setText(self.settings.get('ollama_url', DEFAULT_BASE_URL))
+        self.ollama_connect_timeout_slider.setValue(int(self.settings.get('ollama_connect_timeout', DEFAULT_CONNECT_TIMEOUT)))
+        self.ollama_read_timeout_slider.setValue(int(self.settings.get('ollama_read_timeout', DEFAULT_READ_TIMEOUT)))
         self.tts_engine_combo.setCurrentText(self.settings.get('tts_engine', 'pyttsx3'))
         self.tts_gender_combo.setCurrentText(self.settings.get('tts_gender', 'Qualsiasi'))
         self.update_voice_combo() # Aggiorna le voci/lingue in base al motore e al sesso
@@ -731,6 +759,9 @@ class ConfigurationDialog(QDialog):
         """Restituisce le impostazioni correnti dai widget in modo robusto."""
         settings = {
             'ollama_model': self.ollama_model_combo.currentText(),
+            'ollama_url': self.ollama_url_input.text().strip() or DEFAULT_BASE_URL,
+            'ollama_connect_timeout': self.ollama_connect_timeout_slider.value(),
+            'ollama_read_timeout': self.ollama_read_timeout_slider.value(),
             'tts_engine': self.tts_engine_combo.currentText(),
             'tts_voice_or_lang': self.tts_voice_combo.currentText(),
             'tts_gender': self.tts_gender_combo.currentText(), # Nuova impostazione
@@ -1114,6 +1145,11 @@ class MainWindow(QMainWindow):
         """Applica le impostazioni caricate ai thread e all'UI."""
         self.settings = settings
 
+        # Indirizzo e timeout del server Ollama, usati da tutte le richieste successive
+        get_client().configure(base_url=self.settings.get('ollama_url', DEFAULT_BASE_URL),
+                               connect_timeout=self.settings.get('ollama_connect_timeout', DEFAULT_CONNECT_TIMEOUT),
+                               read_timeout=self.settings.get('ollama_read_timeout', DEFAULT_READ_TIMEOUT))
+
         # Applica impostazioni al video thread
         self.video_thread.face_detection_enabled = self.settings.get('face_recognition', False)
         self.video_thread.hand_detection_enabled = self.settings.get('hand_recognition', False)
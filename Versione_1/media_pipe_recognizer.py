@@ -4,6 +4,12 @@ import numpy as np
 
 from PyQt6.QtCore import QObject, pyqtSignal
 
+from emotion_classifier import EmotionClassifier
+from visual_background import IdentityTracker
+
+from .gesture_engine import INDEX_TIP, GestureEngine, landmarks_to_array
+from .recognition_events import RecognitionEventBus
+
 class MediaPipeRecognizer(QObject):
     # Segnali per comunicare con l'interfaccia principale
     hand_position_signal = pyqtSignal(tuple) # Invia le coordinate della mano
@@ -16,15 +22,19 @@ class MediaPipeRecognizer(QObject):
         self.mp_face_detection = mp.solutions.face_detection
         self.hands = self.mp_hands.Hands(min_detection_confidence=0.7, min_tracking_confidence=0.5)
         self.face_detection = self.mp_face_detection.FaceDetection(min_detection_confidence=0.7)
+        self.gesture_engine = GestureEngine()
 
-        # Inizializza un classificatore di emozioni (per il volto)
-        # Sostituisci con il tuo modello di classificazione delle emozioni
-        self.emotion_classifier = self.load_emotion_model()
+        # Gli eventi passano dal bus: posizioni alla frequenza dello schermo, gesti ed emozioni solo se cambiano
+        self.events = RecognitionEventBus(parent=self)
+        self.events.hand_position_signal.connect(self.hand_position_signal)
+        self.events.hand_gesture_signal.connect(self.hand_gesture_signal)
+        self.events.face_emotion_signal.connect(self.face_emotion_signal)
+        # Identità stabili di mani e volti tra un frame e l'altro, usate come chiavi dal bus
+        self.hand_tracker = IdentityTracker()
+        self.face_tracker = IdentityTracker()
 
-    def load_emotion_model(self):
-        # Placeholder: Carica qui il tuo modello di machine learning per le emozioni
-        # Potrebbe essere un modello Keras/TensorFlow pre-addestrato
-        return None # Ritorna il modello caricato
+        # Classificatore ONNX delle emozioni: il modello viene caricato una sola volta, al primo volto
+        self.emotion_classifier = EmotionClassifier()
 
     def process_frame(self, frame):
         # Converte l'immagine da BGR (OpenCV) a RGB (MediaPipe)
@@ -33,121 +43,42 @@ class MediaPipeRecognizer(QObject):
         # Elabora le mani
         hands_results = self.hands.process(image_rgb)
         if hands_results.multi_hand_landmarks:
-            for hand_landmarks in hands_results.multi_hand_landmarks:
-                # Trova la posizione della mano (es. centro o polso)
-                index_finger_tip = hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_TIP]
-                h, w, c = frame.shape
-                cx, cy = int(index_finger_tip.x * w), int(index_finger_tip.y * h)
-                self.hand_position_signal.emit((cx, cy))
-
-                # Riconosci il gesto (es. pugno chiuso, indice alzato)
-                gesture = self.recognize_gesture(hand_landmarks)
-                if gesture:
-                    self.hand_gesture_signal.emit(gesture)
+            # Landmark di tutte le mani convertiti una sola volta in un array (mani, 21, 3)
+            hands = np.stack([landmarks_to_array(hand_landmarks)
+                              for hand_landmarks in hands_results.multi_hand_landmarks])
+            h, w, c = frame.shape
+            # Posizione della mano: punta dell'indice in pixel
+            positions = (hands[:, INDEX_TIP, :2] * (w, h)).astype(int)
+            # Riquadro (x, y, w, h) in pixel di ogni mano, dai landmark, per l'inseguimento
+            top_left = hands[:, :, :2].min(axis=1) * (w, h)
+            size = hands[:, :, :2].max(axis=1) * (w, h) - top_left
+            tracks = self.hand_tracker.update(np.hstack([top_left, size]).astype(int).tolist())
+
+            # Riconosci i gesti (es. pugno chiuso, indice alzato) di tutte le mani insieme
+            self.events.publish_hands([track.id for track in tracks], positions,
+                                      self.gesture_engine.classify(hands))
+        else:
+            self.hand_tracker.update([])
+            self.events.publish_hands([], [], [])
 
         # Elabora il volto
         face_results = self.face_detection.process(image_rgb)
-        if face_results.detections:
-            for detection in face_results.detections:
-                # Usa un classificatore per riconoscere l'emozione
-                # Devi implementare la logica per estrarre il volto e passarlo al modello
-                emotion = self.recognize_emotion(frame, detection)
-                if emotion:
-                    self.face_emotion_signal.emit(emotion)
-
-    def recognize_gesture(self, hand_landmarks):
-        # Semplice logica di esempio per un gesto di "pugno chiuso"
-        thumb_tip = hand_landmarks.landmark[self.mp_hands.HandLandmark.THUMB_TIP]
-        index_tip = hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_TIP]
-        middle_tip = hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP]
-        ring_tip = hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_TIP]
-        pinky_tip = hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_TIP]
-
-        # Se tutte le punte delle dita sono al di sotto dei nodi intermedi, è un pugno
-        if (index_tip.y > hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_PIP].y and
-            middle_tip.y > hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_PIP].y and
-            ring_tip.y > hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_PIP].y and
-            pinky_tip.y > hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_PIP].y):
-            return "Pugno Chiuso"
-
-        # Aggiungi qui la logica per altri gesti...
-
-        return "Nessun Gesto"
-
-    def recognize_emotion(self, frame, detection):
-        if not self.emotion_classifier:
-            return "Modello non caricato"
-
-        # 1. Estrai la regione del volto dal frame video
-        bboxC = detection.location_data.relative_bounding_box
+        detections = face_results.detections or ()
         ih, iw, _ = frame.shape
-        x, y, w, h = int(bboxC.xmin * iw), int(bboxC.ymin * ih), int(bboxC.width * iw), int(bboxC.height * ih)
-        face_roi = frame[y:y+h, x:x+w]
-
-        # 2. Pre-processa il volto per il modello (es. ridimensionamento, normalizzazione)
-        # face_preprocessed = ...
-
-        # 3. Fai la previsione con il modello
-        # prediction = self.emotion_classifier.predict(face_preprocessed)
-
-        # 4. Restituisci l'emozione con la probabilità più alta
-        # return emotion_label[np.argmax(prediction)]
-        return "Felice" # Esempio statico
-
----
+        boxes = [(int(box.xmin * iw), int(box.ymin * ih), int(box.width * iw), int(box.height * ih))
+                 for box in (detection.location_data.relative_bounding_box for detection in detections)]
+        ids = [track.id for track in self.face_tracker.update(boxes)]
+        emotions = self.recognize_emotions(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), boxes, ids) if boxes else []
+        self.events.publish_faces(ids, emotions)
 
-### Modifiche a `MainWindow`
-
-Nella tua classe `MainWindow` (che non hai fornito, ma che probabilmente esiste), dovrai connettere il `MediaPipeRecognizer` al thread video (`VideoThread`).
-
-1.  **Instanza del Riconoscitore**: Crea un'istanza del `MediaPipeRecognizer`.
-2.  **Connessione Segnali**: Collega i segnali del `MediaPipeRecognizer` agli slot (metodi) della tua `MainWindow` per gestire i dati ricevuti (ad esempio, per muovere un widget).
-3.  **Integrazione con `VideoThread`**: Modifica la `VideoThread` per passargli un'istanza del `MediaPipeRecognizer`.
-4.  **Gestione del Drag and Drop**: Quando ricevi il segnale `hand_position_signal`, puoi aggiornare la posizione del widget selezionato. Il segnale `hand_gesture_signal` (es. "Pugno Chiuso") può essere usato per "afferrare" e "rilasciare" il widget.
-
-Ecco un esempio di come potresti integrare il `MediaPipeRecognizer` nella tua `MainWindow`:
-
-```python
-# Nel tuo file main.py o dove si trova la classe MainWindow
-class MainWindow(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        # ... (altri widget)
-
-        self.recognizer = MediaPipeRecognizer()
-
-        self.video_thread = VideoThread()
-        self.video_thread.change_pixmap_signal.connect(self.update_video_frame)
-        self.video_thread.start()
-
-        # Collega i segnali del riconoscimento ai metodi di gestione
-        self.recognizer.hand_position_signal.connect(self.handle_hand_position)
-        self.recognizer.hand_gesture_signal.connect(self.handle_hand_gesture)
-        self.recognizer.face_emotion_signal.connect(self.handle_face_emotion)
-
-    def update_video_frame(self, cv_img):
-        # Qui ricevi il frame video da VideoThread
-        # Prima di visualizzarlo, lo passi al riconoscitore
-        self.recognizer.process_frame(cv_img)
-        # Poi converti il frame e lo visualizzi come al solito
-        # ...
-
-    def handle_hand_position(self, pos):
-        # Metodo per aggiornare la posizione di un widget trascinato
-        # self.current_dragged_widget.move(pos)
-        pass
-
-    def handle_hand_gesture(self, gesture):
-        if gesture == "Pugno Chiuso":
-            # Inizia il trascinamento
-            pass
-        elif gesture == "Mano Aperta":
-            # Rilascia il widget
-            pass
+    def recognize_gesture(self, hand_landmarks):
+        # Compatibilità: primo gesto riconosciuto per una sola mano
+        gestures = self.gesture_engine.classify(landmarks_to_array(hand_landmarks)[np.newaxis])[0]
+        return gestures[0] if gestures else GestureEngine.NO_GESTURE
 
-    def handle_face_emotion(self, emotion):
-        # Fai qualcosa in base all'emozione rilevata (es. cambia colore UI)
-        print(f"Emozione rilevata: {emotion}")
+    def recognize_emotions(self, gray, boxes, ids):
+        # Tutti i volti del frame in una sola inferenza; l'emozione di ogni traccia resta in cache
+        emotions = self.emotion_classifier.classify(gray, boxes, keys=ids)
+        # Senza modello (o per un volto non ancora classificato) l'emozione è sconosciuta
+        return [emotion or RecognitionEventBus.UNKNOWN_EMOTION for emotion in emotions]
 
-    # Aggiungi qui la gestione del widget da trascinare
-    # ...
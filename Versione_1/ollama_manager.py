@@ -3,8 +3,81 @@
 import requests
 import json
 import logging
+import threading
 from PyQt6.QtCore import QThread, pyqtSignal
 
+# Questa versione si avvia dalla propria cartella e non vede ollama_manager.py
+# della cartella principale: il client ne segue il comportamento e le impostazioni
+# (ollama_url, ollama_connect_timeout, ollama_read_timeout).
+DEFAULT_BASE_URL = "http://localhost:11434"
+# Secondi di attesa per aprire la connessione e per ricevere la risposta
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 60
+
+class OllamaClient:
+    """
+    Accesso HTTP al server Ollama condiviso dai thread di questo modulo.
+    Le connessioni restano aperte nel pool della requests.Session tra una
+    richiesta e l'altra; il JSON inviato viene serializzato sempre dallo
+    stesso encoder.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, pool_size=4):
+        """
+        :param pool_size: Numero massimo di connessioni tenute aperte verso Ollama.
+        """
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        self.base_url = DEFAULT_BASE_URL
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.configure(base_url=base_url)
+
+    def configure(self, base_url=None, connect_timeout=None, read_timeout=None):
+        """Aggiorna indirizzo e timeout dalle impostazioni; None lascia il valore attuale."""
+        if base_url:
+            self.base_url = base_url.rstrip("/")
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
+        if read_timeout is not None:
+            self.read_timeout = read_timeout
+
+    def url(self, path):
+        """Indirizzo di un endpoint relativo al server, es. "api/generate"."""
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _timeout(self, read_timeout):
+        return (self.connect_timeout, self.read_timeout if read_timeout is None else read_timeout)
+
+    def get_json(self, path, read_timeout=None):
+        """GET verso l'endpoint indicato. :return: Il corpo della risposta decodificato."""
+        response = self.session.get(self.url(path), timeout=self._timeout(read_timeout))
+        response.raise_for_status()
+        return response.json()
+
+    def post_json(self, path, payload, read_timeout=None):
+        """POST di `payload` codificato in JSON. :return: Il corpo della risposta decodificato."""
+        body = self._encoder.encode(payload).encode("utf-8")
+        with self.session.post(self.url(path), data=body, timeout=self._timeout(read_timeout)) as response:
+            response.raise_for_status()
+            return response.json()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Restituisce l'OllamaClient del processo, creandolo alla prima richiesta."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
+
 class OllamaModelsThread(QThread):
     """
     Thread per recuperare la lista dei modelli Ollama disponibili.
@@ -15,9 +88,8 @@ class OllamaModelsThread(QThread):
     def run(self):
         try:
             logging.info("Recupero modelli Ollama disponibili...")
-            response = requests.get("http://localhost:11434/api/tags")
-            response.raise_for_status() # Lancia un'eccezione per risposte HTTP non riuscite
-            data = response.json()
+            # Elenco breve: non serve attendere quanto una generazione
+            data = get_client().get_json("api/tags", read_timeout=10)
             models = [m['name'] for m in data.get('models', [])]
 
             if not models:
@@ -50,23 +122,14 @@ class OllamaThread(QThread):
         try:
             logging.info(f"Invio prompt a Ollama con il modello '{self.model}'...")
 
-            headers = {"Content-Type": "application/json"}
-            data = {
+            payload = {
                 "model": self.model,
                 "prompt": self.prompt,
                 "stream": False # Semplifichiamo disabilitando lo streaming
             }
 
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                headers=headers,
-                data=json.dumps(data)
-            )
-            response.raise_for_status()
-
-            # La risposta non è un singolo oggetto JSON, ma una sequenza di oggetti.
-            # Se lo streaming è disabilitato, avremo un solo oggetto.
-            data = response.json()
+            # Se lo streaming è disabilitato, la risposta è un solo oggetto JSON
+            data = get_client().post_json("api/generate", payload)
 
             full_response = data.get('response', '')
 
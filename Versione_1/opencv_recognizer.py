@@ -3,6 +3,11 @@ import numpy as np
 
 from PyQt6.QtCore import QObject, pyqtSignal
 
+from emotion_classifier import EmotionClassifier
+from visual_background import IdentityTracker
+
+from .recognition_events import RecognitionEventBus
+
 class OpenCVRecognizer(QObject):
     # Segnali per comunicare con l'interfaccia principale
     hand_position_signal = pyqtSignal(tuple) # Posizione della mano
@@ -15,14 +20,17 @@ class OpenCVRecognizer(QObject):
         # Qui si usa il modello Haar Cascade di OpenCV, un metodo classico
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
 
-        # Carica il modello per il riconoscimento delle emozioni
-        # Se usi un modello Keras/TensorFlow, caricalo qui
-        self.emotion_model = self.load_emotion_model()
+        # Classificatore ONNX delle emozioni: il modello viene caricato una sola volta, al primo volto
+        self.emotion_classifier = EmotionClassifier()
 
-    def load_emotion_model(self):
-        # Implementa qui la logica per caricare il tuo modello di emozioni
-        # Ad esempio, un modello .h5 o un classificatore SVM
-        return None # Sostituisci con il tuo modello
+        # Gli eventi passano dal bus: posizioni alla frequenza dello schermo, gesti ed emozioni solo se cambiano
+        self.events = RecognitionEventBus(parent=self)
+        self.events.hand_position_signal.connect(self.hand_position_signal)
+        self.events.hand_gesture_signal.connect(self.hand_gesture_signal)
+        self.events.face_emotion_signal.connect(self.face_emotion_signal)
+        # Identità stabili di mani e volti tra un frame e l'altro, usate come chiavi dal bus
+        self.hand_tracker = IdentityTracker()
+        self.face_tracker = IdentityTracker()
 
     def process_frame(self, frame):
         # Rilevamento della mano (basato sul colore)
@@ -57,47 +65,82 @@ class OpenCVRecognizer(QObject):
             if M["m00"] != 0:
                 cx = int(M["m10"] / M["m00"])
                 cy = int(M["m01"] / M["m00"])
-                self.hand_position_signal.emit((cx, cy))
 
                 # Riconosci il gesto (es. pugno o mano aperta)
                 gesture = self.recognize_gesture_from_contour(max_contour)
-                self.hand_gesture_signal.emit(gesture)
+                gestures = [] if gesture == RecognitionEventBus.NO_GESTURE else [gesture]
+                track, = self.hand_tracker.update([cv2.boundingRect(max_contour)])
+                self.events.publish_hands([track.id], [(cx, cy)], [gestures])
+                return
+        self.hand_tracker.update([])
+        self.events.publish_hands([], [], [])
 
     def recognize_gesture_from_contour(self, contour):
-        # Usa il "convex hull" per analizzare la forma della mano
+        features = self.hand_shape_features(contour)
+        if features is None:
+            return "Nessun Gesto"
+        return self.classify_hand_shape(features)
+
+    def hand_shape_features(self, contour, min_depth_ratio=0.1, max_angle=90, profile_size=4):
+        # Caratteristiche della forma della mano calcolate in un solo passaggio vettoriale:
+        # dita (dalle valli tra le dita), solidità, proporzioni e profilo di profondità dei difetti
         hull = cv2.convexHull(contour, returnPoints=False)
-
-        if len(hull) > 3:
+        if len(hull) <= 3:
+            return None
+
+        area = cv2.contourArea(contour)
+        hull_area = cv2.contourArea(cv2.convexHull(contour))
+        x, y, w, h = cv2.boundingRect(contour)
+        features = {
+            'solidity': area / hull_area if hull_area > 0 else 0.0,
+            'aspect_ratio': w / h if h > 0 else 0.0,
+            'finger_count': 0,
+            'depth_profile': np.zeros(profile_size, dtype=np.float32),
+        }
+
+        try:
             defects = cv2.convexityDefects(contour, hull)
-            if defects is not None:
-                # La logica del riconoscimento dei gesti è complessa
-                # Puoi contare il numero di "difetti" tra le dita per
-                # distinguere tra pugno (pochi difetti) e mano aperta (molti difetti)
-                # Ad esempio, un pugno chiuso ha meno difetti di una mano aperta
-                # con 5 dita distese.
-                # Questa è un'implementazione molto semplificata.
-                finger_count = 0
-                for i in range(defects.shape[0]):
-                    s, e, f, d = defects[i, 0]
-                    start = tuple(contour[s][0])
-                    end = tuple(contour[e][0])
-                    far = tuple(contour[f][0])
-
-                    # Calcola l'angolo tra le dita per contare quante sono aperte
-                    # Questo è solo un esempio. La logica reale è più complessa
-                    # e richiede una calibrazione accurata.
-                    a = np.sqrt((end[0] - start[0])**2 + (end[1] - start[1])**2)
-                    b = np.sqrt((far[0] - start[0])**2 + (far[1] - start[1])**2)
-                    c = np.sqrt((end[0] - far[0])**2 + (end[1] - far[1])**2)
-                    angle = np.degrees(np.arccos((b**2 + c**2 - a**2) / (2*b*c)))
-                    if angle <= 90:
-                        finger_count += 1
-
-                if finger_count > 3:
-                    return "Mano Aperta"
-                else:
-                    return "Pugno Chiuso"
-        return "Nessun Gesto"
+        except cv2.error:
+            # Inviluppo non monotono (contorni che si auto-intersecano)
+            defects = None
+        if defects is None or h == 0:
+            return features
+
+        # Tutti i difetti insieme: indici di inizio, fine e punto più lontano, profondità
+        # (OpenCV 4 restituisce la forma (n, 1, 4), OpenCV 5 (n, 4))
+        defects = defects.reshape(-1, 4)
+        points = contour[:, 0].astype(np.float32)
+        start, end, far = points[defects[:, 0]], points[defects[:, 1]], points[defects[:, 2]]
+        depth = defects[:, 3] / 256.0
+
+        # Lati del triangolo inizio-valle-fine e angolo nella valle (teorema del coseno)
+        a = np.linalg.norm(end - start, axis=1)
+        b = np.linalg.norm(far - start, axis=1)
+        c = np.linalg.norm(end - far, axis=1)
+        # Triangoli degeneri (lati nulli) e difetti poco profondi non sono valli tra le dita
+        valid = (b > 1e-3) & (c > 1e-3) & (depth > min_depth_ratio * h)
+        cosine = np.clip((b ** 2 + c ** 2 - a ** 2) / np.maximum(2 * b * c, 1e-6), -1.0, 1.0)
+        angle = np.degrees(np.arccos(cosine))
+        gaps = int(np.count_nonzero(valid & (angle <= max_angle)))
+
+        # N valli separano N + 1 dita; senza valli il numero di dita aperte è 0
+        features['finger_count'] = gaps + 1 if gaps else 0
+        profile = np.sort(depth[valid] / h)[::-1][:profile_size]
+        features['depth_profile'][:len(profile)] = profile
+        return features
+
+    def classify_hand_shape(self, features):
+        fingers = features['finger_count']
+        if fingers >= 4:
+            return "Mano Aperta"
+        if fingers == 3:
+            return "Tre Dita"
+        if fingers == 2:
+            return "Vittoria"
+        # Nessuna valle: un pugno è compatto, un dito alzato rende la forma alta e poco solida
+        if features['solidity'] < 0.75 and features['aspect_ratio'] < 0.6:
+            return "Indice Alzato"
+        return "Pugno Chiuso"
 
     def detect_face_and_emotion(self, frame):
         # Converti il frame in scala di grigi per il rilevamento del volto
@@ -106,19 +149,12 @@ class OpenCVRecognizer(QObject):
         # Rileva i volti nel frame
         faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
 
-        for (x, y, w, h) in faces:
-            # Estrai la regione di interesse (ROI) del volto
-            face_roi = gray[y:y+h, x:x+w]
-
-            # Classifica l'emozione
-            emotion = self.recognize_emotion_from_face(face_roi)
-            self.face_emotion_signal.emit(emotion)
-
-    def recognize_emotion_from_face(self, face_roi):
-        if self.emotion_model is None:
-            return "Modello non caricato"
+        boxes = [tuple(int(v) for v in face) for face in faces]
+        ids = [track.id for track in self.face_tracker.update(boxes)]
+        self.events.publish_faces(ids, self.recognize_emotions(gray, boxes, ids))
 
-        # 1. Pre-processa la ROI del volto (ridimensionamento, normalizzazione)
-        # 2. Fai una previsione usando il tuo modello
-        # 3. Restituisci il nome dell'emozione
-        return "Felice" # Sostituisci con il risultato del tuo modello
+    def recognize_emotions(self, gray, boxes, ids):
+        # Tutti i volti del frame in una sola inferenza; l'emozione di ogni traccia resta in cache
+        emotions = self.emotion_classifier.classify(gray, boxes, keys=ids)
+        # Senza modello (o per un volto non ancora classificato) l'emozione è sconosciuta
+        return [emotion or RecognitionEventBus.UNKNOWN_EMOTION for emotion in emotions]
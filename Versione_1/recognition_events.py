@@ -0,0 +1,197 @@
+import collections
+import logging
+import threading
+import time
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtGui import QGuiApplication
+
+class StateFilter:
+    """
+    Stato con isteresi: un nuovo valore diventa stabile solo dopo `confirm`
+    osservazioni consecutive, così un gesto o un'emozione che tremola per un
+    frame non genera eventi.
+    """
+
+    def __init__(self, confirm):
+        self.confirm = confirm
+        self.stable = None
+        self._candidate = None
+        self._count = 0
+
+    def observe(self, value):
+        """
+        :return: True se lo stato stabile è cambiato.
+        """
+        if value == self.stable:
+            self._candidate, self._count = None, 0
+            return False
+        if value != self._candidate:
+            self._candidate, self._count = value, 0
+        self._count += 1
+        if self._count < self.confirm:
+            return False
+        self.stable, self._candidate, self._count = value, None, 0
+        return True
+
+class RecognitionEventBus(QObject):
+    """
+    Flusso di eventi tra i riconoscitori e l'interfaccia. I riconoscitori
+    pubblicano tutto ciò che vedono in ogni frame, da qualunque thread; il bus
+    invia le posizioni della mano al massimo una volta per aggiornamento dello
+    schermo (conta solo l'ultima) e gesti ed emozioni solo quando cambiano in
+    modo stabile. Gli eventi vengono emessi dal thread del bus con un timer,
+    quindi la coda degli eventi Qt non si riempie di segnali ridondanti; il
+    timer parte solo quando c'è qualcosa da inviare.
+    Mani e volti sono identificati dall'ID della loro traccia (IdentityTracker),
+    non dalla posizione nella lista, che cambia quando si scambiano di posto.
+    """
+
+    hand_position_signal = pyqtSignal(tuple)
+    hand_gesture_signal = pyqtSignal(str)
+    face_emotion_signal = pyqtSignal(str)
+    # Interno: chiede al thread del bus di avviare il timer
+    _wake_signal = pyqtSignal()
+
+    NO_GESTURE = "Nessun Gesto"
+    # Emozione di un volto quando il modello non è disponibile o non l'ha ancora classificato
+    UNKNOWN_EMOTION = "Sconosciuta"
+    # Ogni quanti secondi scrivere nel log le statistiche del bus
+    STATS_LOG_INTERVAL = 30.0
+
+    def __init__(self, refresh_rate=None, gesture_confirm_frames=3, emotion_confirm_frames=5, parent=None):
+        """
+        :param refresh_rate: Invii al secondo (predefinito: frequenza dello schermo principale).
+        :param gesture_confirm_frames: Frame consecutivi necessari per cambiare gesto.
+        :param emotion_confirm_frames: Frame consecutivi necessari per cambiare emozione.
+        """
+        super().__init__(parent)
+        self.gesture_confirm_frames = gesture_confirm_frames
+        self.emotion_confirm_frames = emotion_confirm_frames
+        self._lock = threading.Lock()
+        # ID della mano -> ultima posizione non ancora inviata
+        self._positions = {}
+        # (segnale, valore) dei cambi di gesto ed emozione non ancora inviati
+        self._events = collections.deque()
+        # ID della mano / del volto -> StateFilter
+        self._gestures = {}
+        self._emotions = {}
+        self.posted = 0
+        self.emitted = 0
+        self.max_queue_depth = 0
+        self._last_stats_log = time.monotonic()
+        # True se il timer è avviato (o sta per esserlo) per inviare gli eventi in coda
+        self._scheduled = False
+
+        if refresh_rate is None:
+            refresh_rate = self._display_refresh_rate()
+        # Un solo colpo per volta: il timer non gira a vuoto quando non c'è nulla da inviare
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(max(1, round(1000 / refresh_rate)))
+        self._timer.timeout.connect(self.flush)
+        # I riconoscitori possono pubblicare da altri thread: il timer va avviato nel thread del bus
+        self._wake_signal.connect(self._start_timer)
+
+    @staticmethod
+    def _display_refresh_rate():
+        """Frequenza di aggiornamento dello schermo principale (60 Hz se non è nota)."""
+        screen = QGuiApplication.primaryScreen()
+        if screen is not None and screen.refreshRate() > 0:
+            return screen.refreshRate()
+        return 60.0
+
+    def publish_hands(self, ids, positions, gestures):
+        """
+        Pubblica le mani di un frame.
+        :param ids: ID della traccia di ogni mano.
+        :param positions: Posizione (x, y) di ogni mano.
+        :param gestures: Per ogni mano, la lista dei gesti riconosciuti.
+        """
+        with self._lock:
+            self.posted += len(positions)
+            for hand, position in zip(ids, positions):
+                self._positions[hand] = (int(position[0]), int(position[1]))
+            states = {hand: tuple(hand_gestures) for hand, hand_gestures in zip(ids, gestures)}
+            self._observe(self._gestures, states, self.gesture_confirm_frames, self._emit_gestures)
+            self._schedule()
+
+    def publish_faces(self, ids, emotions):
+        """
+        Pubblica i volti di un frame.
+        :param ids: ID della traccia di ogni volto.
+        :param emotions: Emozione di ogni volto (None se non riconosciuta).
+        """
+        with self._lock:
+            self.posted += len(emotions)
+            states = {face: emotion for face, emotion in zip(ids, emotions) if emotion}
+            self._observe(self._emotions, states, self.emotion_confirm_frames, self._emit_emotion)
+            self._schedule()
+
+    def _schedule(self):
+        """Avvia il timer di invio se ci sono eventi in coda e non è già avviato (con il lock preso)."""
+        if self._scheduled or not self._queue_depth():
+            return
+        self._scheduled = True
+        self._wake_signal.emit()
+
+    def _start_timer(self):
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def _observe(self, filters, states, confirm, on_change):
+        """Aggiorna i filtri con gli stati del frame; le chiavi assenti tendono a None."""
+        for key in set(filters) | set(states):
+            state_filter = filters.setdefault(key, StateFilter(confirm))
+            if state_filter.observe(states.get(key)):
+                if state_filter.stable is None:
+                    # Mano o volto uscito dalla scena: nessun evento
+                    del filters[key]
+                else:
+                    on_change(state_filter.stable)
+        self.max_queue_depth = max(self.max_queue_depth, self._queue_depth())
+
+    def _emit_gestures(self, gestures):
+        for gesture in gestures or (self.NO_GESTURE,):
+            self._events.append((self.hand_gesture_signal, gesture))
+
+    def _emit_emotion(self, emotion):
+        self._events.append((self.face_emotion_signal, emotion))
+
+    def _queue_depth(self):
+        return len(self._positions) + len(self._events)
+
+    def queue_depth(self):
+        """Eventi in attesa di essere inviati all'interfaccia."""
+        with self._lock:
+            return self._queue_depth()
+
+    def flush(self):
+        """Invia gli eventi accumulati: l'ultima posizione di ogni mano e i cambi di stato."""
+        with self._lock:
+            positions = list(self._positions.values())
+            events = list(self._events)
+            self._positions.clear()
+            self._events.clear()
+            self._scheduled = False
+        for position in positions:
+            self.hand_position_signal.emit(position)
+        for signal, value in events:
+            signal.emit(value)
+        self.emitted += len(positions) + len(events)
+
+        now = time.monotonic()
+        if now - self._last_stats_log >= self.STATS_LOG_INTERVAL:
+            self._last_stats_log = now
+            self.log_stats()
+
+    def log_stats(self):
+        """Scrive nel log eventi ricevuti, eventi inviati e profondità massima della coda."""
+        if self.posted:
+            logging.info(f"Eventi di riconoscimento: {self.posted} ricevuti, {self.emitted} inviati "
+                         f"({self.emitted / self.posted * 100:.0f}%), coda massima {self.max_queue_depth}")
+
+    def stop(self):
+        """Ferma il timer e invia gli ultimi eventi."""
+        self._timer.stop()
+        self.flush()
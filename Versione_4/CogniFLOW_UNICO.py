@@ -26,6 +26,89 @@ from PyQt6.QtWidgets import (
     QScrollArea, QSpacerItem, QGroupBox, QMenu
 )
 
+# --- CLIENT OLLAMA ---
+# Stesso comportamento e stesse impostazioni di OllamaClient in ollama_manager.py
+# (cartella principale): questa versione è un file unico e non importa moduli
+# da fuori della sua cartella.
+OLLAMA_BASE_URL = "http://localhost:11434"
+# Secondi di attesa per aprire la connessione e per ricevere la risposta
+OLLAMA_CONNECT_TIMEOUT = 5
+OLLAMA_READ_TIMEOUT = 60
+
+class OllamaClient:
+    """
+    Tutte le chiamate di CogniFLOW al server Ollama passano da qui: la
+    requests.Session riusa le stesse connessioni per l'elenco dei modelli e
+    per le generazioni, e un solo encoder JSON serializza le richieste.
+    Indirizzo e timeout arrivano dal menu di configurazione.
+    """
+
+    def __init__(self, base_url=OLLAMA_BASE_URL, connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+                 read_timeout=OLLAMA_READ_TIMEOUT, pool_size=4):
+        """
+        :param pool_size: Connessioni verso Ollama che restano aperte tra una chiamata e l'altra.
+        """
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        self.base_url = OLLAMA_BASE_URL
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.configure(base_url=base_url)
+
+    def configure(self, base_url=None, connect_timeout=None, read_timeout=None):
+        """Applica indirizzo e timeout scelti nel menu; con None il valore non cambia."""
+        if base_url:
+            self.base_url = base_url.rstrip("/")
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
+        if read_timeout is not None:
+            self.read_timeout = read_timeout
+
+    def url(self, path):
+        """Compone l'indirizzo dell'endpoint `path` (es. "api/tags") sul server configurato."""
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _timeout(self, read_timeout):
+        return (self.connect_timeout, self.read_timeout if read_timeout is None else read_timeout)
+
+    def get_json(self, path, read_timeout=None):
+        """:return: Il JSON restituito da una GET su `path`."""
+        response = self.session.get(self.url(path), timeout=self._timeout(read_timeout))
+        response.raise_for_status()
+        return response.json()
+
+    def post_json(self, path, payload, read_timeout=None):
+        """:return: Il JSON restituito da una POST su `path` con `payload` come corpo."""
+        body = self._encoder.encode(payload).encode("utf-8")
+        with self.session.post(self.url(path), data=body, timeout=self._timeout(read_timeout)) as response:
+            response.raise_for_status()
+            return response.json()
+
+    def list_models(self):
+        """Modelli scaricati sul server, per il menu a tendina della configurazione."""
+        return [model.get('name') for model in self.get_json("api/tags", read_timeout=10).get('models', [])]
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """OllamaClient unico dell'applicazione, creato alla prima chiamata."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
+
+def configure_client(settings):
+    """Passa al client indirizzo e timeout delle impostazioni (vedi ConfigurationDialog.get_settings)."""
+    get_client().configure(base_url=settings.get('ollama_url', OLLAMA_BASE_URL),
+                           connect_timeout=settings.get('ollama_connect_timeout', OLLAMA_CONNECT_TIMEOUT),
+                           read_timeout=settings.get('ollama_read_timeout', OLLAMA_READ_TIMEOUT))
+
 # Importa la libreria pyttsx3 per una sintesi vocale più robusta
 try:
     import pyttsx3
@@ -355,6 +438,30 @@ class ConfigurationDialog(QDialog):
 
         ai_group = QGroupBox("Selezione AI")
         ai_layout = QVBoxLayout(ai_group)
+        ai_layout.addWidget(QLabel("Indirizzo del server Ollama:"))
+        self.ollama_url_input = QLineEdit(OLLAMA_BASE_URL)
+        ai_layout.addWidget(self.ollama_url_input)
+
+        timeout_layout = QGridLayout()
+        timeout_layout.addWidget(QLabel("Attesa massima della connessione (s):"), 0, 0)
+        self.ollama_connect_timeout_slider = QSlider(Qt.Orientation.Horizontal)
+        self.ollama_connect_timeout_slider.setRange(1, 30)
+        self.ollama_connect_timeout_slider.setValue(OLLAMA_CONNECT_TIMEOUT)
+        self.ollama_connect_timeout_label = QLabel(str(OLLAMA_CONNECT_TIMEOUT))
+        self.ollama_connect_timeout_slider.valueChanged.connect(lambda value: self.ollama_connect_timeout_label.setText(str(value)))
+        timeout_layout.addWidget(self.ollama_connect_timeout_slider, 0, 1)
+        timeout_layout.addWidget(self.ollama_connect_timeout_label, 0, 2)
+        timeout_layout.addWidget(QLabel("Attesa massima della risposta (s):"), 1, 0)
+        self.ollama_read_timeout_slider = QSlider(Qt.Orientation.Horizontal)
+        self.ollama_read_timeout_slider.setRange(10, 600)
+        self.ollama_read_timeout_slider.setSingleStep(10)
+        self.ollama_read_timeout_slider.setValue(OLLAMA_READ_TIMEOUT)
+        self.ollama_read_timeout_label = QLabel(str(OLLAMA_READ_TIMEOUT))
+        self.ollama_read_timeout_slider.valueChanged.connect(lambda value: self.ollama_read_timeout_label.setText(str(value)))
+        timeout_layout.addWidget(self.ollama_read_timeout_slider, 1, 1)
+        timeout_layout.addWidget(self.ollama_read_timeout_label, 1, 2)
+        ai_layout.addLayout(timeout_layout)
+
         self.ollama_model_combo = QComboBox()
         self.ollama_model_combo.addItem("Seleziona un modello")
         ai_layout.addWidget(QLabel("Modello Ollama:"))
@@ -501,13 +608,10 @@ class ConfigurationDialog(QDialog):
             QMessageBox.critical(self, "Errore", f"Si è verificato un errore: {e}")
 
     def get_ollama_models(self):
-        """Recupera la lista dei modelli da Ollama."""
+        """Recupera la lista dei modelli da Ollama, con l'indirizzo e i timeout scritti nel menu."""
         try:
-            response = requests.get('http://localhost:11434/api/tags')
-            response.raise_for_status()
-            data = response.json()
-            models = [model['name'] for model in data.get('models', [])]
-            return models
+            configure_client(self.get_settings())
+            return get_client().list_models()
         except Exception as e:
             logging.error(f"Impossibile recuperare i modelli da Ollama: {e}")
             raise
@@ -519,13 +623,19 @@ class ConfigurationDialog(QDialog):
 
     def load_settings(self):
         """Carica le impostazioni salvate"""
-        pass
+        # Indirizzo e timeout di Ollama restano quelli scelti l'ultima volta
+        self.ollama_url_input.setText(self.settings.get('ollama_url', OLLAMA_BASE_URL))
+        self.ollama_connect_timeout_slider.setValue(int(self.settings.get('ollama_connect_timeout', OLLAMA_CONNECT_TIMEOUT)))
+        self.ollama_read_timeout_slider.setValue(int(self.settings.get('ollama_read_timeout', OLLAMA_READ_TIMEOUT)))
 
     def get_settings(self):
         """Restituisce le impostazioni correnti."""
         return {
             'ai_trigger': self.ai_trigger_input.text(),
             'ollama_model': self.ollama_model_combo.currentText(),
+            'ollama_url': self.ollama_url_input.text().strip() or OLLAMA_BASE_URL,
+            'ollama_connect_timeout': self.ollama_connect_timeout_slider.value(),
+            'ollama_read_timeout': self.ollama_read_timeout_slider.value(),
             'language': self.language_combo.currentText(),
             'face_recognition': self.face_recognition_cb.isChecked(),
             'sound_enabled': self.sound_cb.isChecked(),
@@ -616,6 +726,7 @@ class MainWindow(QMainWindow):
         """Inizializza le impostazioni e tenta di connettersi a Ollama all'avvio."""
         dialog = ConfigurationDialog(self, self.settings)
         self.settings = dialog.get_settings()
+        configure_client(self.settings)
         logging.info("Impostazioni iniziali caricate.")
 
     def setup_ui(self):
@@ -822,6 +933,7 @@ class MainWindow(QMainWindow):
         dialog = ConfigurationDialog(self, self.settings)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             self.settings = dialog.get_settings()
+            configure_client(self.settings)
             logging.info("Impostazioni aggiornate")
 
     def add_text(self, text=None):
@@ -1145,17 +1257,13 @@ class OllamaThread(QThread):
     def run(self):
         try:
             logging.info(f"Invio prompt a Ollama. Modello: {self.model}, Prompt: {self.prompt}")
-            url = "http://localhost:11434/api/generate"
             payload = {
                 "model": self.model,
                 "prompt": self.prompt,
                 "stream": False
             }
 
-            response = requests.post(url, json=payload, timeout=60)
-            response.raise_for_status()
-
-            data = response.json()
+            data = get_client().post_json("api/generate", payload)
             full_response = data.get("response", "Nessuna risposta ricevuta.")
 
             self.ollama_response.emit(full_response.strip())
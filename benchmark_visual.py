@@ -0,0 +1,225 @@
+# benchmark_visual.py
+
+"""
+Benchmark da riga di comando per il percorso visivo di visual_background.py.
+
+Uso:
+    python benchmark_visual.py [video.mp4 | cartella_immagini | sintetica] [--frames N] [--fps F]
+                               [--json risultati.json]
+
+Senza argomenti usa frame sintetici, così il confronto si può ripetere anche
+senza webcam né registrazioni. Con --json i risultati vengono salvati per
+confrontare due versioni di visual_background.py sulla stessa registrazione.
+"""
+
+import argparse
+import json
+import threading
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from visual_background import FrameSource, SkinMaskLUT, VideoThread, open_frame_source, skin_mask
+
+DEFAULT_HAND_COLOR_RANGE = (np.array([0, 100, 100]), np.array([10, 255, 255]))
+
+
+def load_frames(path=None, max_frames=120):
+    """
+    Carica in memoria i frame di una sorgente (video, cartella di immagini o
+    "sintetica"), così i benchmark non misurano la decodifica.
+    :return: (frame, ms medi di lettura per frame)
+    """
+    source = open_frame_source(path or "sintetica")
+    frames = []
+    if not source.open():
+        return frames, 0.0
+    start = time.perf_counter()
+    while len(frames) < max_frames:
+        ret, frame = source.read()
+        if not ret:
+            break
+        frames.append(frame.copy())
+    read_ms = (time.perf_counter() - start) * 1000 / max(1, len(frames))
+    source.release()
+    return frames, read_ms
+
+
+def time_per_frame(function, frames, repeat=3):
+    """Restituisce il tempo medio per frame in millisecondi (miglior ripetizione)."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for frame in frames:
+            function(frame)
+        best = min(best, (time.perf_counter() - start) / len(frames))
+    return best * 1000
+
+
+def benchmark_skin_mask(frames, color_range=DEFAULT_HAND_COLOR_RANGE):
+    """Confronta la maschera HSV (cvtColor + inRange) con la SkinMaskLUT."""
+    height, width = frames[0].shape[:2]
+    hsv = np.empty((height, width, 3), dtype=np.uint8)
+    mask = np.empty((height, width), dtype=np.uint8)
+
+    def hsv_path(frame):
+        cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=hsv)
+        return skin_mask(hsv, color_range, dst=mask)
+
+    build_start = time.perf_counter()
+    lut = SkinMaskLUT(color_range)
+    build_ms = (time.perf_counter() - build_start) * 1000
+
+    def lut_path(frame):
+        return lut.apply(frame, dst=mask)
+
+    agreement = np.mean([np.mean(hsv_path(frame).copy() == lut_path(frame)) for frame in frames])
+    return {
+        'hsv_ms': time_per_frame(hsv_path, frames),
+        'lut_ms': time_per_frame(lut_path, frames),
+        'lut_build_ms': build_ms,
+        'agreement': agreement,
+    }
+
+
+def percentile(values, q):
+    """Percentile q (0-100) di una lista di valori."""
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+class PlaybackSource(FrameSource):
+    """
+    Riproduce come una registrazione i frame già caricati in memoria, così il
+    benchmark della pipeline non misura la lettura del file.
+    """
+
+    def __init__(self, frames, fps=None):
+        """
+        :param fps: Frequenza di riproduzione, come una webcam (None = alla massima velocità).
+        """
+        super().__init__("Registrazione", fps)
+        self.frames = frames
+        self._position = 0
+
+    def open(self):
+        self._position = 0
+        return bool(self.frames)
+
+    def frame_shape(self):
+        return self.frames[0].shape
+
+    def _read(self, dst):
+        if self._position >= len(self.frames):
+            return False, None
+        frame = self.frames[self._position]
+        self._position += 1
+        if dst is not None and dst.shape == frame.shape:
+            np.copyto(dst, frame)
+            return True, dst
+        return True, frame
+
+
+def benchmark_pipeline(frames, output_size=(1280, 720), fps=None):
+    """
+    Esegue la pipeline vera, senza GUI: un VideoThread con volto e mano
+    attivi legge i frame da una PlaybackSource e li passa al suo
+    AnalysisThread, mentre un thread consumatore preleva i frame dalla
+    mailbox come farebbe il VideoBackgroundWidget.
+    La latenza è il tempo dalla cattura al prelievo dalla mailbox.
+    """
+    video = VideoThread(face_detection_enabled=True, hand_detection_enabled=True,
+                        source=PlaybackSource(frames, fps))
+    video.set_output_size(*output_size)
+    latency = video.latency
+    producer_done = threading.Event()
+
+    def consume():
+        while True:
+            output = video.mailbox.take(timeout=0.05)
+            if output is None:
+                if producer_done.is_set():
+                    return
+                continue
+            taken = time.perf_counter()
+            latency.record('emissione', (taken - output.post_time) * 1000)
+            latency.record('totale', (taken - output.capture_time) * 1000)
+            video.mailbox.release(output)
+
+    consumer = threading.Thread(target=consume, name="consumatore", daemon=True)
+    tracemalloc.start()
+    total_start = time.perf_counter()
+    consumer.start()
+    video.start()
+    video.wait()
+    total_s = time.perf_counter() - total_start
+    producer_done.set()
+    consumer.join()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    summary = latency.summary()
+    totals = summary.pop('totale', {'p50': 0.0, 'p99': 0.0})
+    stats = video.mailbox.stats()
+    return {
+        'frames': stats['posted'],
+        'frames_analyzed': video.analysis_stage.frames_analyzed,
+        'stage_ms': {stage: values['mean'] for stage, values in summary.items()},
+        'fps': stats['posted'] / total_s,
+        'latency_p50_ms': totals['p50'],
+        'latency_p99_ms': totals['p99'],
+        'peak_memory_mb': peak_bytes / (1024 * 1024),
+        'buffer_allocations': video.pool.allocations + video.analyzer.pool.allocations + video.output_allocations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del percorso visivo")
+    parser.add_argument('source', nargs='?', help="Video, cartella di immagini registrate o \"sintetica\"")
+    parser.add_argument('--frames', type=int, default=120, help="Numero massimo di frame")
+    parser.add_argument('--fps', type=float, help="Riproduce i frame come una webcam a questa frequenza "
+                                                  "(predefinito: alla massima velocità)")
+    parser.add_argument('--json', help="File in cui salvare i risultati")
+    args = parser.parse_args()
+
+    frames, read_ms = load_frames(args.source, args.frames)
+    if not frames:
+        print("Nessun frame caricato.")
+        return
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frame {width}x{height}, OpenCV {cv2.__version__}, {cv2.getNumThreads()} thread")
+    print(f"Lettura sorgente: {read_ms:.2f} ms/frame")
+
+    result = benchmark_skin_mask(frames)
+    print("Maschera colore mano:")
+    print(f"  HSV (cvtColor + inRange): {result['hsv_ms']:.2f} ms/frame")
+    print(f"  SkinMaskLUT:              {result['lut_ms']:.2f} ms/frame "
+          f"(costruzione {result['lut_build_ms']:.1f} ms)")
+    print(f"  Pixel concordi:           {result['agreement'] * 100:.2f}%")
+
+    pipeline = benchmark_pipeline(frames, fps=args.fps)
+    print("Pipeline video (volto + mano):")
+    for stage, ms in pipeline['stage_ms'].items():
+        print(f"  {stage:<24}{ms:.2f} ms/frame")
+    print(f"  FPS:                      {pipeline['fps']:.1f} "
+          f"({pipeline['frames_analyzed']} di {pipeline['frames']} frame analizzati)")
+    print(f"  Latenza p50 / p99:        {pipeline['latency_p50_ms']:.2f} / {pipeline['latency_p99_ms']:.2f} ms")
+    print(f"  Memoria di picco:         {pipeline['peak_memory_mb']:.1f} MB "
+          f"({pipeline['buffer_allocations']} buffer allocati)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'source': args.source or "sintetica",
+                'frames': len(frames),
+                'size': [width, height],
+                'read_ms': read_ms,
+                'skin_mask': result,
+                'pipeline': pipeline,
+            }, f, indent=2)
+        print(f"Risultati salvati in {args.json}")
+
+
+if __name__ == '__main__':
+    main()
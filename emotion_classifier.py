@@ -0,0 +1,165 @@
+# emotion_classifier.py
+
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+# onnxruntime è facoltativo: senza, il riconoscimento delle emozioni resta disattivato.
+# L'avviso viene scritto solo quando la funzione viene attivata (vedi EmotionClassifier.load),
+# non all'import: altrimenti comparirebbe anche in ogni processo di analisi.
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+# Etichette nell'ordine delle uscite del modello FER+ (emotion-ferplus-8.onnx)
+EMOTION_LABELS = ["Neutrale", "Felice", "Sorpreso", "Triste", "Arrabbiato", "Disgustato", "Impaurito", "Disprezzo"]
+
+DEFAULT_MODEL_PATH = os.path.join("models", "emotion-ferplus-8.onnx")
+# Da dove scaricare il modello (ONNX Model Zoo), citato negli avvisi e nel README
+MODEL_URL = ("https://github.com/onnx/models/raw/main/validated/vision/body_analysis/"
+             "emotion_ferplus/model/emotion-ferplus-8.onnx")
+
+# Il motivo per cui le emozioni sono disattivate va scritto nel log una sola volta per processo
+_unavailable_logged = False
+
+def _log_unavailable(message):
+    global _unavailable_logged
+    if not _unavailable_logged:
+        _unavailable_logged = True
+        logging.warning(message)
+
+class EmotionClassifier:
+    """
+    Classificatore delle emozioni per il "genitore empatico", basato su un
+    piccolo modello ONNX eseguito sulla CPU. Il modello viene caricato una sola
+    volta, al primo uso. Tutti i volti di un frame vengono classificati con una
+    sola inferenza, e il risultato di ogni volto resta valido per
+    `cache_interval` secondi. Per ogni frame si classificano solo i volti che
+    stanno nel budget di `budget_ms`, partendo da quelli aggiornati da più tempo.
+    """
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, cache_interval=1.0, budget_ms=8.0):
+        """
+        :param cache_interval: Secondi per cui l'emozione di un volto viene riutilizzata.
+        :param budget_ms: Tempo massimo di inferenza per frame.
+        """
+        self.model_path = model_path
+        self.cache_interval = cache_interval
+        self.budget_ms = budget_ms
+        self._session = None
+        self._load_failed = False
+        self._input_name = None
+        self._input_size = (64, 64)
+        self._batchable = False
+        self._batch = None
+        # chiave del volto -> (etichetta, istante della classificazione)
+        self._cache = {}
+        # Stima (media mobile) del costo di inferenza per volto, in ms
+        self._ms_per_face = None
+        self.inferences = 0
+
+    @property
+    def available(self):
+        """True se il modello è (o può essere) caricato."""
+        return not self._load_failed
+
+    def load(self):
+        """
+        Carica il modello se non è ancora stato fatto.
+        :return: True se il modello è pronto.
+        """
+        if self._session is None and not self._load_failed:
+            self._load()
+        return self._session is not None
+
+    def _load(self):
+        """Carica il modello ONNX, con un solo thread per non sottrarre CPU alla GUI."""
+        if onnxruntime is None:
+            _log_unavailable("Modulo 'onnxruntime' non installato: il riconoscimento delle emozioni è disattivato "
+                             "(pip install onnxruntime).")
+            self._load_failed = True
+            return
+        if not os.path.exists(self.model_path):
+            _log_unavailable(f"Modello delle emozioni non trovato: {self.model_path}. "
+                             f"Scaricalo da {MODEL_URL}")
+            self._load_failed = True
+            return
+        try:
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = 1
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self._session = onnxruntime.InferenceSession(self.model_path, options,
+                                                         providers=["CPUExecutionProvider"])
+        except Exception as e:
+            logging.error(f"Errore nel caricare il modello delle emozioni: {e}")
+            self._load_failed = True
+            return
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        # Forma attesa (N, 1, altezza, larghezza); con N fisso a 1 si esegue un volto per chiamata
+        _, _, height, width = model_input.shape
+        if isinstance(height, int) and isinstance(width, int):
+            self._input_size = (height, width)
+        self._batchable = not isinstance(model_input.shape[0], int)
+        logging.info(f"Modello delle emozioni caricato: {self.model_path}")
+
+    def classify(self, gray, boxes, keys):
+        """
+        Restituisce l'emozione di ogni volto.
+        :param gray: Frame in scala di grigi.
+        :param boxes: Riquadri (x, y, w, h) dei volti.
+        :param keys: Identità stabili dei volti (ID delle tracce), usate come chiavi della cache:
+                     la posizione nella lista cambia quando i volti si scambiano di posto.
+        :return: Lista di etichette (None per i volti non ancora classificati).
+        """
+        if not boxes or not self.load():
+            return [None] * len(boxes)
+        keys = list(keys)
+        now = time.monotonic()
+
+        # Si dimenticano i volti spariti
+        self._cache = {key: value for key, value in self._cache.items() if key in keys}
+
+        # Volti da aggiornare, dal più vecchio; solo quanti ne stanno nel budget
+        stale = [i for i, key in enumerate(keys)
+                 if key not in self._cache or now - self._cache[key][1] >= self.cache_interval]
+        stale.sort(key=lambda i: self._cache.get(keys[i], (None, 0.0))[1])
+        if self._ms_per_face:
+            stale = stale[:max(1, int(self.budget_ms / self._ms_per_face))]
+        if stale:
+            self._infer(gray, [boxes[i] for i in stale], [keys[i] for i in stale], now)
+
+        return [self._cache[key][0] if key in self._cache else None for key in keys]
+
+    def _infer(self, gray, boxes, keys, now):
+        """Esegue il modello su tutti i volti indicati con una sola chiamata (se il modello lo consente)."""
+        height, width = self._input_size
+        if self._batch is None or self._batch.shape[0] < len(boxes):
+            self._batch = np.empty((len(boxes), 1, height, width), dtype=np.float32)
+        batch = self._batch[:len(boxes)]
+        frame_h, frame_w = gray.shape[:2]
+        for i, (x, y, w, h) in enumerate(boxes):
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(frame_w, x + w), min(frame_h, y + h)
+            if x1 <= x0 or y1 <= y0:
+                batch[i, 0] = 0
+                continue
+            batch[i, 0] = cv2.resize(gray[y0:y1, x0:x1], (width, height), interpolation=cv2.INTER_AREA)
+
+        start = time.perf_counter()
+        if self._batchable:
+            scores = self._session.run(None, {self._input_name: batch})[0]
+        else:
+            scores = np.concatenate([self._session.run(None, {self._input_name: batch[i:i + 1]})[0]
+                                     for i in range(len(boxes))])
+        ms_per_face = (time.perf_counter() - start) * 1000 / len(boxes)
+        self._ms_per_face = ms_per_face if self._ms_per_face is None else 0.8 * self._ms_per_face + 0.2 * ms_per_face
+        self.inferences += 1
+
+        for key, index in zip(keys, np.argmax(scores.reshape(len(boxes), -1), axis=1)):
+            label = EMOTION_LABELS[index] if index < len(EMOTION_LABELS) else None
+            self._cache[key] = (label, now)
@@ -21,7 +21,8 @@ from PyQt6.QtCore import (
     QThread, pyqtSignal, QTimer, Qt, QMimeData, QPoint, QObject, QSize,
     QPropertyAnimation, QRect, QEvent, QBuffer, QIODevice, QDir
 )
-from PyQt6.QtGui import QImage, QPixmap, QDrag, QCursor, QIcon, QPainter, QPen, QColor, QFont, QShortcut, QKeySequence
+from PyQt6.QtGui import (QImage, QPixmap, QDrag, QCursor, QIcon, QPainter, QPen, QColor, QFont, QShortcut, QKeySequence,
+                         QTextCursor)
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QSizePolicy,
     QLabel, QPushButton, QHBoxLayout, QComboBox, QLineEdit, QFrame, QGridLayout,
@@ -33,8 +34,11 @@ from PyQt6.QtWidgets import (
 
 # Importazione dei moduli
 # I tuoi moduli personalizzati
-from visual_background import VideoThread
-from ollama_manager import OllamaThread, OllamaModelsThread
+from visual_background import (VideoThread, VideoBackgroundWidget, DetectionOverlayWidget, PerformanceHUD,
+                               open_frame_source)
+from ollama_manager import (OllamaModelsThread, ModelJob, get_client, get_cache, get_scheduler,
+                            DEFAULT_BASE_URL, DEFAULT_KEEP_ALIVE, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT,
+                            PRIORITY_INTERACTIVE)
 from tts_manager import TTSThread, VOCI_DI_SISTEMA
 from speech_recognition_manager import SpeechRecognitionThread
 
@@ -275,6 +279,31 @@ class ConfigurationDialog(QDialog):
 
         ai_group = QGroupBox("Selezione AI")
         ai_layout = QVBoxLayout(ai_group)
+        ai_layout.addWidget(QLabel("Indirizzo del server Ollama:"))
+        self.ollama_url_input = QLineEdit(DEFAULT_BASE_URL)
+        ai_layout.addWidget(self.ollama_url_input)
+
+        timeout_layout = QGridLayout()
+        timeout_layout.addWidget(QLabel("Attesa massima della connessione (s):"), 0, 0)
+        self.ollama_connect_timeout_slider = QSlider(Qt.Orientation.Horizontal)
+        self.ollama_connect_timeout_slider.setRange(1, 30)
+        self.ollama_connect_timeout_slider.setValue(DEFAULT_CONNECT_TIMEOUT)
+        self.ollama_connect_timeout_label = QLabel(str(DEFAULT_CONNECT_TIMEOUT))
+        self.ollama_connect_timeout_slider.valueChanged.connect(lambda value: self.ollama_connect_timeout_label.setText(str(value)))
+        timeout_layout.addWidget(self.ollama_connect_timeout_slider, 0, 1)
+        timeout_layout.addWidget(self.ollama_connect_timeout_label, 0, 2)
+        # In streaming vale tra un frammento e l'altro della risposta
+        timeout_layout.addWidget(QLabel("Attesa massima della risposta (s):"), 1, 0)
+        self.ollama_read_timeout_slider = QSlider(Qt.Orientation.Horizontal)
+        self.ollama_read_timeout_slider.setRange(10, 600)
+        self.ollama_read_timeout_slider.setSingleStep(10)
+        self.ollama_read_timeout_slider.setValue(DEFAULT_READ_TIMEOUT)
+        self.ollama_read_timeout_label = QLabel(str(DEFAULT_READ_TIMEOUT))
+        self.ollama_read_timeout_slider.valueChanged.connect(lambda value: self.ollama_read_timeout_label.setText(str(value)))
+        timeout_layout.addWidget(self.ollama_read_timeout_slider, 1, 1)
+        timeout_layout.addWidget(self.ollama_read_timeout_label, 1, 2)
+        ai_layout.addLayout(timeout_layout)
+
         self.ollama_model_combo = QComboBox()
         self.ollama_model_combo.addItem("Caricamento modelli...")
         ai_layout.addWidget(QLabel("Modello Ollama:"))
@@ -287,8 +316,45 @@ class ConfigurationDialog(QDialog):
         self.ollama_status_label = QLabel("Stato: In attesa di caricamento...")
         self.ollama_status_label.setStyleSheet("color: #4a90e2;")
         ai_layout.addWidget(self.ollama_status_label)
+
+        self.ollama_stream_cb = QCheckBox("Mostra la risposta mentre viene generata")
+        ai_layout.addWidget(self.ollama_stream_cb)
+
+        keep_alive_layout = QHBoxLayout()
+        keep_alive_layout.addWidget(QLabel("Tieni il modello in memoria dopo l'ultima richiesta:"))
+        self.ollama_keep_alive_combo = QComboBox()
+        for label, keep_alive in (("5 minuti", "5m"), ("30 minuti", "30m"), ("2 ore", "2h"), ("Sempre", -1)):
+            self.ollama_keep_alive_combo.addItem(label, keep_alive)
+        keep_alive_layout.addWidget(self.ollama_keep_alive_combo)
+        ai_layout.addLayout(keep_alive_layout)
+
+        self.ollama_unload_on_exit_cb = QCheckBox("Libera la memoria del modello alla chiusura")
+        ai_layout.addWidget(self.ollama_unload_on_exit_cb)
+
+        parallel_layout = QHBoxLayout()
+        parallel_layout.addWidget(QLabel("Richieste contemporanee al server (OLLAMA_NUM_PARALLEL):"))
+        self.ollama_parallel_slider = QSlider(Qt.Orientation.Horizontal)
+        self.ollama_parallel_slider.setRange(1, 4)
+        self.ollama_parallel_slider.setValue(1)
+        self.ollama_parallel_label = QLabel("1")
+        self.ollama_parallel_slider.valueChanged.connect(lambda value: self.ollama_parallel_label.setText(str(value)))
+        parallel_layout.addWidget(self.ollama_parallel_slider)
+        parallel_layout.addWidget(self.ollama_parallel_label)
+        ai_layout.addLayout(parallel_layout)
         layout.addWidget(ai_group)
 
+        cache_group = QGroupBox("Cache delle risposte")
+        cache_layout = QVBoxLayout(cache_group)
+        self.ollama_cache_stats_label = QLabel()
+        cache_layout.addWidget(self.ollama_cache_stats_label)
+        self.ollama_cache_bypass_cb = QCheckBox("Ignora la cache (rigenera sempre la risposta)")
+        cache_layout.addWidget(self.ollama_cache_bypass_cb)
+        clear_cache_btn = QPushButton("Svuota Cache")
+        clear_cache_btn.clicked.connect(self.clear_ollama_cache)
+        cache_layout.addWidget(clear_cache_btn)
+        self.update_ollama_cache_stats()
+        layout.addWidget(cache_group)
+
         trigger_group = QGroupBox("Trigger per AI")
         trigger_layout = QVBoxLayout(trigger_group)
         trigger_layout.addWidget(QLabel("Imposta una parola d'ordine per inviare il testo all'AI:"))
@@ -417,11 +483,34 @@ class ConfigurationDialog(QDialog):
         hand_color_layout = QHBoxLayout(hand_color_group)
         self.hand_color_label = QLabel("Colore mano:")
         hand_color_layout.addWidget(self.hand_color_label)
+        self.hand_color_range = [[0, 100, 100], [10, 255, 255]]
         self.hand_color_picker_btn = QPushButton("Scegli Colore...")
         self.hand_color_picker_btn.clicked.connect(self.choose_hand_color)
         hand_color_layout.addWidget(self.hand_color_picker_btn)
         layout.addWidget(hand_color_group)
 
+        motion_group = QGroupBox("Risparmio CPU (gate di movimento)")
+        motion_layout = QGridLayout(motion_group)
+        motion_layout.addWidget(QLabel("Pixel cambiati per rilevare movimento, % (0 = analizza sempre):"), 0, 0)
+        self.motion_threshold_slider = QSlider(Qt.Orientation.Horizontal)
+        self.motion_threshold_slider.setRange(0, 100)
+        self.motion_threshold_slider.setValue(2)
+        self.motion_threshold_label = QLabel("0.2")
+        self.motion_threshold_slider.valueChanged.connect(lambda value: self.motion_threshold_label.setText(f"{value/10:.1f}"))
+        motion_layout.addWidget(self.motion_threshold_slider, 0, 1)
+        motion_layout.addWidget(self.motion_threshold_label, 0, 2)
+        self.process_analysis_cb = QCheckBox("Analisi video in processi separati (usa più core)")
+        motion_layout.addWidget(self.process_analysis_cb, 1, 0, 1, 3)
+        motion_layout.addWidget(QLabel("Webcam a basso consumo dopo minuti di inattività (0 = mai):"), 2, 0)
+        self.camera_idle_slider = QSlider(Qt.Orientation.Horizontal)
+        self.camera_idle_slider.setRange(0, 30)
+        self.camera_idle_slider.setValue(2)
+        self.camera_idle_label = QLabel("2")
+        self.camera_idle_slider.valueChanged.connect(lambda value: self.camera_idle_label.setText(str(value)))
+        motion_layout.addWidget(self.camera_idle_slider, 2, 1)
+        motion_layout.addWidget(self.camera_idle_label, 2, 2)
+        layout.addWidget(motion_group)
+
         layout.addStretch()
         self.tab_widget.addTab(gestures_widget, "Gesti & Suoni")
 
@@ -437,6 +526,47 @@ class ConfigurationDialog(QDialog):
         face_layout.addWidget(self.face_recognition_cb)
 
         layout.addWidget(face_recognition_group)
+
+        face_performance_group = QGroupBox("Prestazioni rilevamento volto")
+        face_performance_layout = QGridLayout(face_performance_group)
+
+        face_performance_layout.addWidget(QLabel("Rilevamento completo ogni N frame:"), 0, 0)
+        self.face_interval_slider = QSlider(Qt.Orientation.Horizontal)
+        self.face_interval_slider.setRange(1, 30)
+        self.face_interval_slider.setValue(5)
+        self.face_interval_label = QLabel("5")
+        self.face_interval_slider.valueChanged.connect(lambda value: self.face_interval_label.setText(str(value)))
+        face_performance_layout.addWidget(self.face_interval_slider, 0, 1)
+        face_performance_layout.addWidget(self.face_interval_label, 0, 2)
+
+        face_performance_layout.addWidget(QLabel("Riduzione del frame per il rilevamento:"), 1, 0)
+        self.face_scale_slider = QSlider(Qt.Orientation.Horizontal)
+        self.face_scale_slider.setRange(20, 100)
+        self.face_scale_slider.setValue(50)
+        self.face_scale_label = QLabel("50%")
+        self.face_scale_slider.valueChanged.connect(lambda value: self.face_scale_label.setText(f"{value}%"))
+        face_performance_layout.addWidget(self.face_scale_slider, 1, 1)
+        face_performance_layout.addWidget(self.face_scale_label, 1, 2)
+
+        face_performance_layout.addWidget(QLabel("Aggiorna l'emozione di ogni volto ogni (secondi):"), 2, 0)
+        self.emotion_interval_slider = QSlider(Qt.Orientation.Horizontal)
+        self.emotion_interval_slider.setRange(1, 50)
+        self.emotion_interval_slider.setValue(10)
+        self.emotion_interval_label = QLabel("1.0")
+        self.emotion_interval_slider.valueChanged.connect(lambda value: self.emotion_interval_label.setText(f"{value/10:.1f}"))
+        face_performance_layout.addWidget(self.emotion_interval_slider, 2, 1)
+        face_performance_layout.addWidget(self.emotion_interval_label, 2, 2)
+
+        face_performance_layout.addWidget(QLabel("Tempo massimo dei rilevatori per frame (ms):"), 3, 0)
+        self.analysis_budget_slider = QSlider(Qt.Orientation.Horizontal)
+        self.analysis_budget_slider.setRange(5, 100)
+        self.analysis_budget_slider.setValue(25)
+        self.analysis_budget_label = QLabel("25")
+        self.analysis_budget_slider.valueChanged.connect(lambda value: self.analysis_budget_label.setText(str(value)))
+        face_performance_layout.addWidget(self.analysis_budget_slider, 3, 1)
+        face_performance_layout.addWidget(self.analysis_budget_label, 3, 2)
+
+        layout.addWidget(face_performance_group)
         layout.addStretch()
         self.tab_widget.addTab(empathy_widget, "Genitore Empatico")
 
@@ -451,7 +581,9 @@ class ConfigurationDialog(QDialog):
         status['simpleaudio'] = self._check_import('simpleaudio')
 
         # Controlla i moduli personalizzati
+        status['onnxruntime'] = self._check_import('onnxruntime')
         status['visual_background'] = self._check_import('visual_background')
+        status['emotion_classifier'] = self._check_import('emotion_classifier')
         status['ollama_manager'] = self._check_import('ollama_manager')
         status['tts_manager'] = self._check_import('tts_manager')
         status['speech_recognition_manager'] = self._check_import('speech_recognition_manager')
@@ -483,7 +615,9 @@ class ConfigurationDialog(QDialog):
             "OpenCV": "cv2",
             "SpeechRecognition": "speech_recognition",
             "simpleaudio": "simpleaudio",
+            "onnxruntime": "onnxruntime",
             "visual_background": "visual_background",
+            "emotion_classifier": "emotion_classifier",
             "ollama_manager": "ollama_manager",
             "tts_manager": "tts_manager",
             "speech_recognition_manager": "speech_recognition_manager",
@@ -566,8 +700,25 @@ class ConfigurationDialog(QDialog):
     def update_ui_from_settings(self):
         """Aggiorna i widget del dialogo con le impostazioni caricate."""
         self.ollama_model_combo.setCurrentText(self.settings.get('ollama_model', 'llava:7b'))
+        self.ollama_stream_cb.setChecked(self.settings.get('ollama_stream', True))
+        self.ollama_url_input.setText(self.settings.get('ollama_url', DEFAULT_BASE_URL))
+        self.ollama_connect_timeout_slider.setValue(int(self.settings.get('ollama_connect_timeout', DEFAULT_CONNECT_TIMEOUT)))
+        self.ollama_read_timeout_slider.setValue(int(self.settings.get('ollama_read_timeout', DEFAULT_READ_TIMEOUT)))
+        self.ollama_cache_bypass_cb.setChecked(self.settings.get('ollama_cache_bypass', False))
+        self.ollama_parallel_slider.setValue(int(self.settings.get('ollama_parallel', 1)))
+        keep_alive_index = self.ollama_keep_alive_combo.findData(self.settings.get('ollama_keep_alive', DEFAULT_KEEP_ALIVE))
+        self.ollama_keep_alive_combo.setCurrentIndex(max(0, keep_alive_index))
+        self.ollama_unload_on_exit_cb.setChecked(self.settings.get('ollama_unload_on_exit', False))
         self.tts_voice_combo.setCurrentText(self.settings.get('tts_voice', 'Zephyr'))
         self.face_recognition_cb.setChecked(self.settings.get('face_recognition', False))
+        self.face_interval_slider.setValue(int(self.settings.get('face_detect_interval', 5)))
+        self.face_scale_slider.setValue(round(self.settings.get('face_detect_scale', 0.5) * 100))
+        self.emotion_interval_slider.setValue(round(self.settings.get('emotion_interval', 1.0) * 10))
+        self.analysis_budget_slider.setValue(round(self.settings.get('analysis_budget_ms', 25)))
+        self.hand_color_range = self.settings.get('hand_color_range', [[0, 100, 100], [10, 255, 255]])
+        self.motion_threshold_slider.setValue(round(self.settings.get('motion_changed_percent', 0.2) * 10))
+        self.process_analysis_cb.setChecked(self.settings.get('process_analysis', False))
+        self.camera_idle_slider.setValue(int(self.settings.get('camera_idle_minutes', 2)))
         self.timeout_input.setText(str(self.settings.get('timeout', 500)))
 
         lang_code = self.settings.get('language', 'it-IT')
@@ -599,10 +750,28 @@ class ConfigurationDialog(QDialog):
         """Restituisce le impostazioni correnti dai widget in modo robusto."""
         lang_map = {'Italiano': 'it-IT', 'English': 'en-US', 'Français': 'fr-FR', 'Deutsch': 'de-DE'}
 
-        settings = {
+        # Le chiavi non gestite dal dialogo (es. formato della webcam) vengono conservate
+        settings = dict(self.settings)
+        settings.update({
             'ollama_model': self.ollama_model_combo.currentText(),
+            'ollama_stream': self.ollama_stream_cb.isChecked(),
+            'ollama_url': self.ollama_url_input.text().strip() or DEFAULT_BASE_URL,
+            'ollama_connect_timeout': self.ollama_connect_timeout_slider.value(),
+            'ollama_read_timeout': self.ollama_read_timeout_slider.value(),
+            'ollama_cache_bypass': self.ollama_cache_bypass_cb.isChecked(),
+            'ollama_parallel': self.ollama_parallel_slider.value(),
+            'ollama_keep_alive': self.ollama_keep_alive_combo.currentData(),
+            'ollama_unload_on_exit': self.ollama_unload_on_exit_cb.isChecked(),
             'tts_voice': self.tts_voice_combo.currentText(),
             'face_recognition': self.face_recognition_cb.isChecked(),
+            'face_detect_interval': self.face_interval_slider.value(),
+            'face_detect_scale': self.face_scale_slider.value() / 100,
+            'emotion_interval': self.emotion_interval_slider.value() / 10,
+            'analysis_budget_ms': self.analysis_budget_slider.value(),
+            'hand_color_range': self.hand_color_range,
+            'motion_changed_percent': self.motion_threshold_slider.value() / 10,
+            'process_analysis': self.process_analysis_cb.isChecked(),
+            'camera_idle_minutes': self.camera_idle_slider.value(),
             'timeout': int(self.timeout_input.text()),
             'language': lang_map.get(self.language_combo.currentText(), 'it-IT'),
 
@@ -614,7 +783,7 @@ class ConfigurationDialog(QDialog):
             'options_btn_color': self._get_button_color(self.options_btn_color, '#4a90e2'),
             'log_btn_color': self._get_button_color(self.log_btn_color, '#4a90e2'),
             'voice_btn_color': self._get_button_color(self.voice_btn_color, '#4a90e2'),
-        }
+        })
         return settings
 
     def apply_changes(self):
@@ -651,6 +820,20 @@ class ConfigurationDialog(QDialog):
         tts_thread = TTSThread(text, voice, speed, pitch)
         tts_thread.start()
 
+    def update_ollama_cache_stats(self):
+        """Mostra i contatori della cache delle risposte di Ollama."""
+        stats = get_cache().stats()
+        hits = stats['memory_hits'] + stats['disk_hits']
+        self.ollama_cache_stats_label.setText(
+            f"Risposte dalla cache: {hits} su {hits + stats['misses']} richieste "
+            f"({stats['memory_hits']} in memoria, {stats['disk_hits']} dal disco)")
+
+    def clear_ollama_cache(self):
+        """Svuota la cache delle risposte di Ollama."""
+        get_cache().clear()
+        self.update_ollama_cache_stats()
+        QMessageBox.information(self, "Cache Svuotata", "Le risposte salvate sono state eliminate.")
+
     def test_ollama_connection(self):
         """Testa la connessione a Ollama."""
         QMessageBox.information(
@@ -693,12 +876,18 @@ class ConfigurationDialog(QDialog):
             button.setStyleSheet(f"background-color: {color.name()};")
 
     def choose_hand_color(self):
-        """Sceglie il colore della mano per il rilevamento."""
-        QMessageBox.information(
-            self,
-            "Selettore Colore Mano",
-            "Funzionalità da implementare per la calibrazione del colore."
-        )
+        """Sceglie il colore della mano e ne ricava l'intervallo HSV per il rilevamento."""
+        color = QColorDialog.getColor(parent=self, title="Colore della mano")
+        if color.isValid():
+            # OpenCV usa una tinta 0-179, Qt 0-359 (-1 per i grigi)
+            hue = max(0, color.hsvHue()) // 2
+            # Vicino al rosso l'intervallo passa per lo 0: la tinta minima resta maggiore della massima
+            # (es. 175-5), come si aspetta visual_background.skin_mask
+            self.hand_color_range = [
+                [(hue - 10) % 180, max(0, color.hsvSaturation() - 60), max(0, color.value() - 60)],
+                [(hue + 10) % 180, 255, 255],
+            ]
+            self.hand_color_picker_btn.setStyleSheet(f"background-color: {color.name()};")
 
     def handle_library_action(self, library, action):
         """Gestisce le azioni per le librerie."""
@@ -716,12 +905,25 @@ class MainWindow(QMainWindow):
     """
     La classe principale dell'applicazione, che gestisce l'interfaccia utente.
     """
+    # Attesa massima dello scaricamento del modello Ollama alla chiusura
+    MODEL_UNLOAD_EXIT_TIMEOUT_MS = 3000
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Assistente per Dislessia")
         self.setGeometry(100, 100, 1400, 800)
         self.settings = {}
-        self.ollama_thread = None
+        # Richiesta AI in corso (AIJob) e testo del pulsante da ripristinare al termine
+        self.ai_job = None
+        self.ai_button_text = ""
+        self.ai_response_streamed = False
+        # Modello Ollama già caricato (o in caricamento) in anticipo, con il suo stato nella barra di stato
+        self.warm_model = None
+        self.warmup_job = None
+        # True quando la chiusura sta aspettando lo scaricamento del modello
+        self.model_unload_started = False
+        self.ai_status_label = QLabel("AI: in attesa")
+        self.statusBar().addPermanentWidget(self.ai_status_label)
 
         # Configurazione logging
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -733,10 +935,11 @@ class MainWindow(QMainWindow):
         self.setStyleSheet(self.load_theme())
 
         # Widget per lo sfondo video
-        self.video_background_label = QLabel(self)
+        self.video_background_label = VideoBackgroundWidget(self)
         self.video_background_label.setGeometry(self.rect())
-        self.video_background_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.video_background_label.setStyleSheet("background-color: black;")
+        # Riquadri dei rilevamenti, disegnati sopra il video ma sotto l'interfaccia
+        self.detection_overlay = DetectionOverlayWidget(self)
+        self.detection_overlay.setGeometry(self.rect())
 
         self.central_widget = QWidget(self)
         self.central_widget.setStyleSheet("background-color: rgba(0, 0, 0, 0);")
@@ -887,11 +1090,34 @@ class MainWindow(QMainWindow):
         self.shortcut_log.activated.connect(self.toggle_log_visibility)
 
         # Thread per il video
-        self.video_thread = VideoThread()
-        self.video_thread.change_pixmap_signal.connect(self.update_video_frame)
+        # 'video_source' permette di riprodurre un file, una cartella di immagini o frame sintetici
+        # 'camera_format' viene determinato con una breve prova al primo avvio e poi riutilizzato
+        self.video_thread = VideoThread(source=open_frame_source(self.settings.get('video_source', 0),
+                                                                 loop=True, realtime=True,
+                                                                 capture_format=self.settings.get('camera_format')))
+        self.video_background_label.set_mailbox(self.video_thread.mailbox, self.video_thread.latency)
+        self.video_background_label.size_changed.connect(self.video_thread.set_output_size)
+        self.video_thread.frame_ready_signal.connect(self.video_background_label.on_frame_ready)
         self.video_thread.status_signal.connect(self.update_video_status)
+        self.video_thread.camera_format_signal.connect(self.save_camera_format)
+        self.video_thread.detections_signal.connect(self.detection_overlay.set_results)
+        self.video_thread.set_output_size(*self.video_background_label.pixel_size())
         self.video_thread.start()
 
+        # Pannello delle prestazioni video, sopra tutta l'interfaccia (F10)
+        self.performance_hud = PerformanceHUD(self.video_thread, self)
+        self.performance_hud.move(10, 10)
+        self.shortcut_hud = QShortcut(QKeySequence(Qt.Key.Key_F10), self)
+        self.shortcut_hud.activated.connect(self.performance_hud.toggle)
+
+        # Livello della webcam (spenta / sfondo / analisi) in base a funzioni attive,
+        # visibilità della finestra e inattività dell'utente
+        self.last_activity = time.monotonic()
+        QApplication.instance().installEventFilter(self)
+        self.camera_tier_timer = QTimer(self)
+        self.camera_tier_timer.timeout.connect(self.update_camera_tier)
+        self.camera_tier_timer.start(1000)
+
         # Thread per il riconoscimento vocale
         self.speech_rec_thread = None
 
@@ -901,8 +1127,45 @@ class MainWindow(QMainWindow):
     def resizeEvent(self, event):
         """Re-implementa resizeEvent per ridimensionare lo sfondo video."""
         self.video_background_label.setGeometry(self.rect())
+        self.detection_overlay.setGeometry(self.rect())
         super().resizeEvent(event)
 
+    def changeEvent(self, event):
+        """Spegne o riaccende subito la webcam quando la finestra viene ridotta a icona o ripristinata."""
+        if event.type() == QEvent.Type.WindowStateChange:
+            self.update_camera_tier()
+        super().changeEvent(event)
+
+    def eventFilter(self, obj, event):
+        """Registra l'attività dell'utente (mouse e tastiera) in tutta l'applicazione."""
+        if event.type() in (QEvent.Type.MouseMove, QEvent.Type.MouseButtonPress,
+                            QEvent.Type.KeyPress, QEvent.Type.Wheel):
+            was_idle = self.is_user_idle()
+            self.last_activity = time.monotonic()
+            if was_idle:
+                self.update_camera_tier()
+        return super().eventFilter(obj, event)
+
+    def is_user_idle(self):
+        """True se l'utente è inattivo da più dei minuti impostati."""
+        idle_minutes = self.settings.get('camera_idle_minutes', 2)
+        return bool(idle_minutes) and time.monotonic() - self.last_activity > idle_minutes * 60
+
+    def update_camera_tier(self):
+        """
+        Sceglie il livello della webcam: spenta se la finestra non è visibile,
+        analisi a piena frequenza se un rilevatore è attivo e l'utente sta
+        lavorando, altrimenti sfondo decorativo a pochi fps.
+        """
+        handle = self.windowHandle()
+        if self.isMinimized() or not self.isVisible() or (handle is not None and not handle.isExposed()):
+            tier = VideoThread.TIER_OFF
+        elif self.video_thread.analyzer.enabled and not self.is_user_idle():
+            tier = VideoThread.TIER_ANALYSIS
+        else:
+            tier = VideoThread.TIER_BACKGROUND
+        self.video_thread.set_tier(tier)
+
     def dragEnterEvent(self, event):
         """Permette il drop se i dati sono di tipo testo."""
         if event.mimeData().hasText():
@@ -935,6 +1198,23 @@ class MainWindow(QMainWindow):
         # Applica impostazioni al video thread
         self.video_thread.face_detection_enabled = self.settings.get('face_recognition', False)
         self.video_thread.hand_detection_enabled = self.settings.get('hand_recognition', False)
+        self.video_thread.analyzer.face_tracker.configure(self.settings.get('face_detect_interval', 5),
+                                                 self.settings.get('face_detect_scale', 0.5))
+        self.video_thread.analyzer.motion_gate.threshold = self.settings.get('motion_changed_percent', 0.2)
+        self.video_thread.analyzer.emotion_classifier.cache_interval = self.settings.get('emotion_interval', 1.0)
+        self.video_thread.analyzer.scheduler.budget_ms = self.settings.get('analysis_budget_ms', 25)
+        self.video_thread.set_process_analysis(self.settings.get('process_analysis', False))
+        hand_color_range = self.settings.get('hand_color_range')
+        if hand_color_range and hand_color_range != [r.tolist() for r in self.video_thread.analyzer.hand_color_range]:
+            self.video_thread.analyzer.set_hand_color_range(*hand_color_range)
+
+        # Tutte le richieste a Ollama passano dal client e dallo scheduler condivisi
+        get_client().configure(base_url=self.settings.get('ollama_url', DEFAULT_BASE_URL),
+                               connect_timeout=self.settings.get('ollama_connect_timeout', DEFAULT_CONNECT_TIMEOUT),
+                               read_timeout=self.settings.get('ollama_read_timeout', DEFAULT_READ_TIMEOUT),
+                               keep_alive=self.settings.get('ollama_keep_alive', DEFAULT_KEEP_ALIVE))
+        get_scheduler().set_concurrency(self.settings.get('ollama_parallel', 1))
+        self.warm_up_model()
 
         # Applica impostazioni ai pulsanti
         self.btn_add_widget.setStyleSheet(f"background-color: {self.settings.get('add_btn_color', '#4a90e2')}; color: white;")
@@ -1020,17 +1300,54 @@ class MainWindow(QMainWindow):
             self.draggable_widgets_layout.addWidget(new_widget)
             self.input_field.clear()
 
-    def update_video_frame(self, image):
-        """Aggiorna il frame del video con l'immagine passata."""
-        pixmap = QPixmap.fromImage(image)
-        scaled_pixmap = pixmap.scaled(
-            self.video_background_label.size(), Qt.AspectRatioMode.KeepAspectRatioByExpanding, Qt.TransformationMode.SmoothTransformation
-        )
-        self.video_background_label.setPixmap(scaled_pixmap)
+    def warm_up_model(self):
+        """
+        Carica in background il modello Ollama scelto nelle impostazioni, se
+        non è già stato fatto, così la prima richiesta non attende il caricamento.
+        Il modello usato in precedenza viene scaricato dalla memoria.
+        """
+        model = self.settings.get('ollama_model', 'llava:7b')
+        if model == self.warm_model:
+            return
+        previous_model, self.warm_model = self.warm_model, model
+        self.ai_status_label.setText(f"AI: caricamento di {model}...")
+        # Caricamento e scaricamento sono job di sfondo dello scheduler: non superano il limite di
+        # richieste contemporanee e la chiusura dell'app li annulla
+        scheduler = get_scheduler()
+        if self.warmup_job is not None:
+            self.warmup_job.cancel()
+        if previous_model:
+            scheduler.submit_model_job(ModelJob.UNLOAD, previous_model)
+        self.warmup_job = scheduler.submit_model_job(ModelJob.LOAD, model, on_ready=self.on_model_ready,
+                                                     on_error=self.on_model_error)
+
+    def on_model_ready(self, model, seconds):
+        """Mostra nella barra di stato che il modello è pronto."""
+        if model == self.warm_model:
+            self.ai_status_label.setText(f"AI: {model} pronto ({seconds:.1f} s)")
+
+    def on_model_error(self, model, message):
+        """Mostra nella barra di stato che il caricamento anticipato non è riuscito."""
+        if model == self.warm_model:
+            # Al prossimo cambio di impostazioni si riprova
+            self.warm_model = None
+            self.ai_status_label.setText(f"AI: {model} non caricato")
+            self.ai_status_label.setToolTip(message)
+            logging.warning(f"Caricamento anticipato di {model} non riuscito: {message}")
 
     def update_video_status(self, message):
         """Aggiorna lo stato del video."""
-        self.video_background_label.setText(message)
+        self.video_background_label.set_status(message)
+
+    def save_camera_format(self, camera_format):
+        """Salva in settings.json il formato della webcam scelto dalla prova all'avvio."""
+        logging.info(f"Formato webcam negoziato: {camera_format}")
+        self.settings['camera_format'] = camera_format
+        try:
+            with open("settings.json", "w") as f:
+                json.dump(self.settings, f, indent=4)
+        except Exception as e:
+            logging.error(f"Errore nel salvare il formato della webcam: {e}")
 
     def save_to_file(self):
         """
@@ -1117,20 +1434,51 @@ class MainWindow(QMainWindow):
         Gestisce il click del pulsante AI. Prende il testo dall'area principale,
         lo invia a Ollama e gestisce la risposta.
         """
+        # Un secondo click mentre la richiesta è in corso la annulla
+        if self.ai_job is not None:
+            self.cancel_ai_job()
+            return
+
         prompt = self.work_area_left_text_edit.toPlainText()
         if not prompt:
             QMessageBox.warning(self, "Attenzione", "L'area di lavoro è vuota. Inserisci del testo prima di usare l'AI.")
             return
 
-        self.btn_ai.setEnabled(False)
-        original_text = self.btn_ai.text()
-        self.btn_ai.setText("🧠 AI (In Caricamento...)")
-
-        self.ollama_thread = OllamaThread(prompt, model=self.settings.get('ollama_model', 'llava:7b'))
-        self.ollama_thread.ollama_response.connect(self.on_ollama_response)
-        self.ollama_thread.ollama_error.connect(self.on_ollama_error)
-        self.ollama_thread.finished.connect(lambda: self.on_ollama_finished(original_text))
-        self.ollama_thread.start()
+        self.ai_button_text = self.btn_ai.text()
+        self.btn_ai.setText("🧠 AI (In Caricamento... clicca per annullare)")
+
+        # La risposta in streaming viene scritta nell'area di lavoro man mano che arriva
+        self.ai_response_streamed = False
+        self.ai_job = get_scheduler().submit(prompt, self.settings.get('ollama_model', 'llava:7b'),
+                                             stream=self.settings.get('ollama_stream', True),
+                                             use_cache=not self.settings.get('ollama_cache_bypass', False),
+                                             priority=PRIORITY_INTERACTIVE,
+                                             on_chunk=self.on_ollama_chunk, on_response=self.on_ollama_response,
+                                             on_error=self.on_ollama_error, on_finished=self.on_ollama_finished)
+
+    def cancel_ai_job(self):
+        """Annulla la richiesta AI in corso e ripristina subito il pulsante."""
+        job = self.ai_job
+        job.ollama_chunk.disconnect(self.on_ollama_chunk)
+        job.ollama_response.disconnect(self.on_ollama_response)
+        job.ollama_error.disconnect(self.on_ollama_error)
+        job.finished.disconnect(self.on_ollama_finished)
+        job.cancel()
+        if self.ai_response_streamed:
+            self.work_area_main_text_edit.append("[Risposta interrotta]")
+        self.on_ollama_finished()
+
+    def on_ollama_chunk(self, chunk):
+        """Aggiunge all'area di lavoro principale un pezzo della risposta in streaming."""
+        if not self.ai_response_streamed:
+            self.ai_response_streamed = True
+            self.btn_ai.setText("🧠 AI (Sta scrivendo... clicca per annullare)")
+            self.work_area_main_text_edit.append("\n\n--- Risposta AI ---\n")
+            chunk = chunk.lstrip()
+        # Un cursore proprio, così la posizione del cursore dell'utente non cambia
+        cursor = QTextCursor(self.work_area_main_text_edit.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(chunk)
 
     def on_ollama_response(self, response):
         """Gestisce la risposta di Ollama."""
@@ -1139,19 +1487,20 @@ class MainWindow(QMainWindow):
         new_widget = DraggableTextWidget(summary_text, self.settings)
         self.draggable_widgets_layout.addWidget(new_widget)
 
-        # Aggiunge la risposta completa all'area di lavoro principale
-        self.work_area_main_text_edit.append("\n\n--- Risposta AI ---\n")
-        self.work_area_main_text_edit.append(response)
+        # Aggiunge la risposta completa all'area di lavoro principale, se non è già arrivata in streaming
+        if not self.ai_response_streamed:
+            self.work_area_main_text_edit.append("\n\n--- Risposta AI ---\n")
+            self.work_area_main_text_edit.append(response)
 
     def on_ollama_error(self, message):
         """Gestisce gli errori della richiesta a Ollama."""
         QMessageBox.critical(self, "Errore AI", message)
         logging.error(f"Errore Ollama: {message}")
 
-    def on_ollama_finished(self, original_text):
-        """Riabilita il pulsante e ripristina il testo originale quando il thread finisce."""
-        self.btn_ai.setEnabled(True)
-        self.btn_ai.setText(original_text)
+    def on_ollama_finished(self):
+        """Ripristina il testo originale del pulsante quando la richiesta finisce."""
+        self.ai_job = None
+        self.btn_ai.setText(self.ai_button_text)
 
     def handle_voice_button(self):
         """Avvia il riconoscimento vocale quando si clicca il pulsante voce."""
@@ -1179,11 +1528,13 @@ class MainWindow(QMainWindow):
         """Gestisce il click del pulsante Rilevamento Mani."""
         self.video_thread.hand_detection_enabled = not self.video_thread.hand_detection_enabled
         self.update_button_state(self.btn_hands, self.video_thread.hand_detection_enabled, "Mani")
+        self.update_camera_tier()
 
     def handle_face_button(self):
         """Gestisce il click del pulsante Rilevamento Faccia."""
         self.video_thread.face_detection_enabled = not self.video_thread.face_detection_enabled
         self.update_button_state(self.btn_face, self.video_thread.face_detection_enabled, "Faccia")
+        self.update_camera_tier()
 
     def handle_clean_button(self):
         """Pulisce il campo di input in basso e l'area di dettaglio (C)."""
@@ -1193,11 +1544,28 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         """Gestisce la chiusura dell'applicazione."""
+        if self.settings.get('ollama_unload_on_exit', False) and self.warm_model and not self.model_unload_started:
+            # La finestra sparisce subito; la chiusura vera avviene quando il modello è stato scaricato
+            # (o dopo MODEL_UNLOAD_EXIT_TIMEOUT_MS), senza bloccare l'interfaccia
+            self.model_unload_started = True
+            self.hide()
+            scheduler = get_scheduler()
+            scheduler.cancel_all()
+            scheduler.submit_model_job(ModelJob.UNLOAD, self.warm_model, on_finished=self.close)
+            QTimer.singleShot(self.MODEL_UNLOAD_EXIT_TIMEOUT_MS, self.close)
+            event.ignore()
+            return
         logging.getLogger().removeHandler(self.handler)
+        self.camera_tier_timer.stop()
+        QApplication.instance().removeEventFilter(self)
         self.video_thread.stop()
+        get_scheduler().shutdown()
         if self.speech_rec_thread and self.speech_rec_thread.isRunning():
             self.speech_rec_thread.stop()
         event.accept()
+        if self.model_unload_started:
+            # La finestra era già nascosta: Qt non chiude l'app da solo
+            QApplication.instance().quit()
 
 # ==============================================================================
 # Funzione Principale per l'Esecuzione
@@ -1,46 +1,771 @@
 # ollama_manager.py
+import collections
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import re
 import requests
+import socket
 import logging
-from PyQt6.QtCore import QThread, pyqtSignal
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
 
-class OllamaThread(QThread):
+DEFAULT_BASE_URL = "http://localhost:11434"
+# Per quanto tempo Ollama tiene il modello in memoria dopo l'ultima richiesta
+DEFAULT_KEEP_ALIVE = "30m"
+# Secondi di attesa per aprire la connessione e per ricevere la risposta
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 60
+
+# Per ogni thread, la funzione che riceve il socket della richiesta in corso (vedi OllamaClient.post)
+_socket_watch = threading.local()
+
+def _notify_socket(sock):
+    callback = getattr(_socket_watch, "callback", None)
+    if callback is not None:
+        callback(sock)
+
+class _WatchedHTTPConnection(HTTPConnection):
+    """Connessione che, appena inviata la richiesta, comunica il proprio socket a chi la attende."""
+
+    def request(self, *args, **kwargs):
+        super().request(*args, **kwargs)
+        _notify_socket(self.sock)
+
+class _WatchedHTTPSConnection(HTTPSConnection):
+    def request(self, *args, **kwargs):
+        super().request(*args, **kwargs)
+        _notify_socket(self.sock)
+
+class _WatchedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _WatchedHTTPConnection
+
+class _WatchedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _WatchedHTTPSConnection
+
+class _WatchedAdapter(HTTPAdapter):
+    """HTTPAdapter le cui connessioni espongono il socket, così una richiesta bloccata si può interrompere."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _WatchedHTTPConnectionPool,
+                                                   "https": _WatchedHTTPSConnectionPool}
+
+class OllamaClient:
+    """
+    Client HTTP per tutto il traffico verso Ollama. Una sola requests.Session
+    tiene aperto un pool di connessioni keep-alive verso il server, così le
+    richieste successive non pagano una nuova connessione TCP. URL di base e
+    timeout sono configurabili; i payload JSON vengono codificati con un
+    unico encoder riutilizzato.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, pool_size=4, keep_alive=DEFAULT_KEEP_ALIVE):
+        """
+        :param read_timeout: Secondi di attesa massima della risposta (tra un frammento e l'altro in streaming).
+        :param pool_size: Connessioni mantenute aperte verso il server.
+        :param keep_alive: Permanenza in memoria del modello dopo ogni richiesta (es. "30m", -1 = sempre).
+        """
+        self.session = requests.Session()
+        adapter = _WatchedAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        self.base_url = DEFAULT_BASE_URL
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+        self.configure(base_url=base_url)
+
+    def configure(self, base_url=None, connect_timeout=None, read_timeout=None, keep_alive=None):
+        """Cambia URL di base, timeout e keep_alive; i valori None restano invariati."""
+        if base_url:
+            self.base_url = base_url.rstrip("/")
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
+        if read_timeout is not None:
+            self.read_timeout = read_timeout
+        if keep_alive is not None:
+            self.keep_alive = keep_alive
+
+    def url(self, path):
+        """URL completo di un endpoint, es. url("api/tags")."""
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _timeout(self, read_timeout):
+        return (self.connect_timeout, self.read_timeout if read_timeout is None else read_timeout)
+
+    def get_json(self, path, read_timeout=None):
+        """Esegue una GET e restituisce il JSON della risposta."""
+        response = self.session.get(self.url(path), timeout=self._timeout(read_timeout))
+        response.raise_for_status()
+        return response.json()
+
+    def post(self, path, payload, stream=False, read_timeout=None, on_socket=None):
+        """
+        Esegue una POST con un payload JSON.
+        :param stream: Se True il corpo della risposta viene letto man mano (usare con `with`).
+        :param on_socket: Funzione chiamata con il socket della connessione appena la richiesta è
+                          inviata, prima di attendere la risposta; chiuderlo interrompe la richiesta.
+        :return: La requests.Response, già controllata con raise_for_status().
+        """
+        _socket_watch.callback = on_socket
+        try:
+            response = self.session.post(self.url(path), data=self._encoder.encode(payload).encode("utf-8"),
+                                         stream=stream, timeout=self._timeout(read_timeout))
+        finally:
+            _socket_watch.callback = None
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        return response
+
+    def post_json(self, path, payload, read_timeout=None, on_socket=None):
+        """Esegue una POST e restituisce il JSON della risposta."""
+        with self.post(path, payload, read_timeout=read_timeout, on_socket=on_socket) as response:
+            return response.json()
+
+    def list_models(self):
+        """Nomi dei modelli installati sul server."""
+        return [model.get('name') for model in self.get_json("api/tags", read_timeout=10).get('models', [])]
+
+    def load_model(self, model, read_timeout=300, on_socket=None):
+        """
+        Carica il modello in memoria senza generare token (richiesta senza
+        prompt), così la prima richiesta vera non paga il caricamento.
+        """
+        self.post_json("api/generate", {"model": model, "keep_alive": self.keep_alive}, read_timeout=read_timeout,
+                       on_socket=on_socket)
+
+    def unload_model(self, model, read_timeout=30, on_socket=None):
+        """Chiede a Ollama di liberare subito la memoria del modello."""
+        self.post_json("api/generate", {"model": model, "keep_alive": 0}, read_timeout=read_timeout,
+                       on_socket=on_socket)
+
+    def close(self):
+        """Chiude le connessioni del pool."""
+        self.session.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Client Ollama condiviso da tutto il processo, creato al primo uso."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
+
+class ResponseCache:
+    """
+    Cache persistente delle risposte di Ollama, per non rigenerare lo stesso
+    testo quando lo studente reinvia lo stesso prompt. La chiave è l'hash di
+    modello, prompt normalizzato e opzioni di generazione. Davanti al disco
+    c'è una LRU in memoria; su disco ogni risposta è un file JSON, le voci
+    più vecchie di `ttl` vengono ignorate e le meno recenti eliminate quando
+    la cartella supera `max_bytes`.
+    """
+
+    def __init__(self, directory=os.path.join("saved_data", "ollama_cache"), memory_entries=64,
+                 max_bytes=20 * 1024 * 1024, ttl=7 * 24 * 3600):
+        """
+        :param memory_entries: Risposte tenute in memoria.
+        :param max_bytes: Dimensione massima della cache su disco.
+        :param ttl: Secondi di validità di una risposta.
+        """
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model, prompt, options=None):
+        """Hash della richiesta; spazi iniziali, finali e ripetuti del prompt non contano."""
+        normalized = re.sub(r"\s+", " ", prompt).strip()
+        data = json.dumps([model, normalized, options or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """:return: La risposta salvata, o None se non c'è o è scaduta."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+            self._memory.pop(key, None)
+            entry = self._read(key, now)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._remember(key, entry)
+            self.disk_hits += 1
+            return entry[0]
+
+    def _read(self, key, now):
+        """Legge una voce dal disco, eliminandola se è scaduta o illeggibile."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Voce della cache di Ollama illeggibile, viene eliminata: {e}")
+            data = None
+        if data is not None and not self._valid_entry(data):
+            logging.warning(f"Voce della cache di Ollama incompleta, viene eliminata: {path}")
+            data = None
+        if data is None or now - data["created"] >= self.ttl:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        # Il file usato più di recente è l'ultimo a essere eliminato
+        os.utime(path)
+        return data["response"], data["created"]
+
+    @staticmethod
+    def _valid_entry(data):
+        """True se la voce letta dal disco ha una risposta e una data di creazione."""
+        return (isinstance(data, dict) and isinstance(data.get("response"), str)
+                and isinstance(data.get("created"), (int, float)))
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def put(self, key, response):
+        """Salva una risposta in memoria e su disco."""
+        entry = (response, time.time())
+        with self._lock:
+            self._remember(key, entry)
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self._path(key), "w", encoding="utf-8") as f:
+                    json.dump({"response": response, "created": entry[1]}, f, ensure_ascii=False)
+                self._evict()
+            except OSError as e:
+                logging.warning(f"Impossibile salvare la risposta nella cache di Ollama: {e}")
+
+    def _evict(self):
+        """Elimina i file meno usati di recente finché la cartella non rientra in max_bytes."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".json"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        """Svuota la cache, in memoria e su disco."""
+        with self._lock:
+            self._memory.clear()
+            if os.path.isdir(self.directory):
+                for entry in os.scandir(self.directory):
+                    if entry.is_file() and entry.name.endswith(".json"):
+                        os.remove(entry.path)
+
+    def stats(self):
+        """Contatori di successi (in memoria e su disco) e mancati."""
+        return {'memory_hits': self.memory_hits, 'disk_hits': self.disk_hits, 'misses': self.misses}
+
+_cache = None
+
+def get_cache():
+    """Cache delle risposte condivisa da tutto il processo, creata al primo uso."""
+    global _cache
+    with _client_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+# Classi di priorità delle richieste AI: quelle interattive passano prima di quelle di sfondo
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+class AIJob(QObject):
     """
-    Thread dedicato per l'interazione con il modello Ollama (LLM) per
-    evitare di bloccare l'interfaccia utente durante le richieste API.
+    Richiesta di generazione a Ollama, eseguita da un worker dell'AIScheduler.
+    In modalità streaming i frammenti NDJSON di /api/generate vengono letti
+    appena arrivano e inviati a gruppi, al massimo CHUNK_RATE volte al
+    secondo; al termine viene comunque emessa la risposta completa. Le
+    risposte già generate per lo stesso prompt arrivano subito dalla
+    ResponseCache. La richiesta a Ollama è sempre in streaming, anche quando
+    i pezzi non vengono inviati, così annullare il job chiude subito il
+    socket della connessione. I segnali vengono emessi dal thread del worker: i
+    chiamanti si collegano con subscribe() prima che il job possa partire.
     """
     ollama_response = pyqtSignal(str)
+    ollama_chunk = pyqtSignal(str)
     ollama_error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    # Aggiornamenti dell'interfaccia al secondo durante lo streaming
+    CHUNK_RATE = 15
 
-    def __init__(self, prompt, model="llava:7b", parent=None):
-        super().__init__(parent)
+    def __init__(self, prompt, model="llava:7b", stream=True, options=None, use_cache=True,
+                 priority=PRIORITY_INTERACTIVE):
+        """
+        :param stream: Se True la risposta viene inviata a pezzi (ollama_chunk) mentre viene generata.
+        :param options: Opzioni di generazione di Ollama (es. temperature).
+        :param use_cache: Se False la risposta viene sempre rigenerata (ma salvata comunque nella cache).
+        :param priority: PRIORITY_INTERACTIVE o PRIORITY_BACKGROUND.
+        """
+        super().__init__()
         self.prompt = prompt
         self.model = model
+        self.stream = stream
+        self.options = options
+        self.use_cache = use_cache
+        self.priority = priority
+        self.key = ResponseCache.key(model, prompt, options)
+        self.started = False
+        self.done = False
+        self.cancelled = False
+        # Chiamanti che condividono il job: la generazione si annulla solo quando tutti hanno annullato
+        self._subscribers = 0
+        # Testo già inviato con ollama_chunk, da ripetere a chi si unisce in ritardo
+        self._streamed = []
+        # Socket della richiesta HTTP in corso, da chiudere per annullarla
+        self._socket = None
+        # Rientrante: i destinatari collegati direttamente possono chiamare cancel() da un segnale
+        self._lock = threading.RLock()
+
+    def subscribe(self, on_chunk=None, on_response=None, on_error=None, on_finished=None):
+        """
+        Aggiunge un chiamante al job collegandone i segnali. Chi si unisce a
+        una generazione già in corso riceve subito, come primo pezzo, il
+        testo arrivato fino a quel momento.
+        :return: False se il job è già concluso o annullato (nessun segnale collegato).
+        """
+        with self._lock:
+            if self.done or self.cancelled:
+                return False
+            self._subscribers += 1
+            for signal, slot in ((self.ollama_chunk, on_chunk), (self.ollama_response, on_response),
+                                 (self.ollama_error, on_error), (self.finished, on_finished)):
+                if slot is not None:
+                    signal.connect(slot)
+            streamed = "".join(self._streamed)
+        if streamed and on_chunk is not None:
+            on_chunk(streamed)
+        return True
+
+    def _emit_chunk(self, text):
+        """Invia un pezzo della risposta, ricordandolo per i chiamanti che si uniranno dopo."""
+        with self._lock:
+            self._streamed.append(text)
+            self.ollama_chunk.emit(text)
+
+    def cancel(self):
+        """
+        Annulla la richiesta per un chiamante. Quando nessuno la aspetta più,
+        un job in coda viene scartato e uno in corso chiude il socket della
+        connessione HTTP: la lettura bloccata nel worker si interrompe subito,
+        anche prima che Ollama abbia inviato il primo token.
+        """
+        with self._lock:
+            if self.done or self.cancelled:
+                return
+            self._subscribers -= 1
+            if self._subscribers > 0:
+                return
+            self.cancelled = True
+            sock = self._socket
+        logging.info(f"Richiesta a Ollama annullata. Modello: {self.model}")
+        if sock is not None:
+            self._abort(sock)
+
+    def _set_socket(self, sock):
+        """Riceve il socket della richiesta appena inviata (dal thread del worker)."""
+        with self._lock:
+            self._socket = sock
+            cancelled = self.cancelled
+        if cancelled:
+            self._abort(sock)
+
+    @staticmethod
+    def _abort(sock):
+        """Interrompe una connessione: a differenza di close(), shutdown() sblocca una recv() in corso."""
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
 
     def run(self):
-        """Esegue la richiesta all'API di Ollama in un thread separato."""
+        """Esegue la richiesta nel thread di un worker."""
         try:
+            if self.cancelled:
+                return
+            cache = get_cache()
+            if self.use_cache:
+                cached = cache.get(self.key)
+                if cached is not None:
+                    logging.info(f"Risposta di Ollama dalla cache. Modello: {self.model}")
+                    self.ollama_response.emit(cached)
+                    return
+
             logging.info(f"Invio prompt a Ollama. Modello: {self.model}, Prompt: {self.prompt}")
-            url = "http://localhost:11434/api/generate"
             payload = {
                 "model": self.model,
                 "prompt": self.prompt,
-                "stream": False
+                "stream": True
             }
+            if self.options:
+                payload["options"] = self.options
+            # Ogni richiesta rinnova la permanenza in memoria del modello
+            payload["keep_alive"] = get_client().keep_alive
 
-            response = requests.post(url, json=payload, timeout=60)
-            response.raise_for_status()
+            full_response = self._generate(payload)
+            if full_response is None or self.cancelled:
+                return
+
+            full_response = full_response.strip()
+            if not full_response:
+                self.ollama_response.emit("Nessuna risposta ricevuta.")
+                return
+            cache.put(self.key, full_response)
+            self.ollama_response.emit(full_response)
+
+        except Exception as e:
+            # Chiudere il socket di un job annullato interrompe la lettura con un'eccezione
+            if not self.cancelled:
+                self.ollama_error.emit(self._error_message(e))
+        finally:
+            self._finish()
+
+    def _finish(self):
+        """Segna il job come concluso e avvisa i chiamanti."""
+        with self._lock:
+            self.done = True
+            self._socket = None
+        self.finished.emit()
+
+    @staticmethod
+    def _error_message(error):
+        """Messaggio per l'utente corrispondente a un errore della richiesta."""
+        if isinstance(error, requests.exceptions.ConnectionError):
+            return "Errore di connessione: Il server Ollama non è raggiungibile. Assicurati che sia in esecuzione."
+        if isinstance(error, requests.exceptions.RequestException):
+            return f"Errore nella richiesta Ollama: {error}"
+        return f"Si è verificato un errore inaspettato: {error}"
+
+    def _generate(self, payload):
+        """
+        Legge la risposta NDJSON riga per riga; in modalità streaming emette
+        i token accumulati a intervalli di almeno 1/CHUNK_RATE secondi.
+        :return: La risposta completa, o None se Ollama ha restituito un errore, se la richiesta è stata
+                 annullata o se lo stream si è chiuso prima della riga finale con "done".
+        """
+        start = time.perf_counter()
+        first_token_time = None
+        complete = False
+        parts = []
+        pending = []
+        last_emit = 0.0
+        # Il timeout di lettura vale tra un frammento e l'altro, non per l'intera generazione
+        with get_client().post("api/generate", payload, stream=True, on_socket=self._set_socket) as response:
+            for line in response.iter_lines():
+                if self.cancelled:
+                    return None
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    self.ollama_error.emit(f"Errore nella richiesta Ollama: {data['error']}")
+                    return None
+                token = data.get("response", "")
+                if token:
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter()
+                        logging.info(f"Ollama: primo token dopo {first_token_time - start:.2f} s")
+                    parts.append(token)
+                    if self.stream:
+                        pending.append(token)
+                now = time.perf_counter()
+                if pending and now - last_emit >= 1.0 / self.CHUNK_RATE:
+                    self._emit_chunk("".join(pending))
+                    pending.clear()
+                    last_emit = now
+                if data.get("done"):
+                    complete = True
+                    break
+        if self.cancelled:
+            return None
+        if pending:
+            self._emit_chunk("".join(pending))
+        if not complete:
+            # Una risposta troncata non va in cache come se fosse completa
+            logging.warning(f"Lo stream di Ollama si è chiuso prima della fine. Modello: {self.model}")
+            self.ollama_error.emit("Errore nella richiesta Ollama: la risposta si è interrotta prima della fine.")
+            return None
+        logging.info(f"Ollama: risposta completa in {time.perf_counter() - start:.2f} s")
+        return "".join(parts)
+
+class AIWorker(threading.Thread):
+    """
+    Worker di lunga durata dell'AIScheduler: esegue un job alla volta. È un
+    thread daemon, così una richiesta bloccata non impedisce di chiudere l'app.
+    """
+
+    def __init__(self, scheduler):
+        super().__init__(name="ai-worker", daemon=True)
+        self.scheduler = scheduler
+
+    def run(self):
+        while True:
+            job = self.scheduler.next_job(self)
+            if job is None:
+                return
+            job.run()
+            self.scheduler.job_finished(job)
+
+class ModelJob(AIJob):
+    """
+    Caricamento anticipato o scaricamento di un modello, eseguito da un
+    worker dell'AIScheduler come le generazioni: rispetta il limite di
+    richieste contemporanee e si annulla chiudendo il socket. Un modello
+    non viene scaricato finché un altro job lo sta usando o aspetta di farlo.
+    """
+    model_ready = pyqtSignal(str, float)
+    model_error = pyqtSignal(str, str)
+
+    LOAD = "load"
+    UNLOAD = "unload"
 
-            data = response.json()
-            full_response = data.get("response", "Nessuna risposta ricevuta.")
+    def __init__(self, action, model, scheduler, priority=PRIORITY_BACKGROUND):
+        """
+        :param action: ModelJob.LOAD o ModelJob.UNLOAD.
+        :param scheduler: AIScheduler che esegue il job, per sapere quali modelli sono in uso.
+        """
+        super().__init__("", model, stream=False, use_cache=False, priority=priority)
+        self.action = action
+        self.key = self.job_key(action, model)
+        self._scheduler = scheduler
 
-            self.ollama_response.emit(full_response.strip())
+    @staticmethod
+    def job_key(action, model):
+        """Chiave del job, per unire le richieste identiche (non si confonde con le chiavi della cache)."""
+        return f"{action}:{model}"
 
+    def subscribe(self, on_ready=None, on_error=None, on_finished=None):
+        """Come AIJob.subscribe, con i segnali model_ready e model_error."""
+        with self._lock:
+            if not super().subscribe(on_finished=on_finished):
+                return False
+            if on_ready is not None:
+                self.model_ready.connect(on_ready)
+            if on_error is not None:
+                self.model_error.connect(on_error)
+            return True
+
+    def run(self):
+        """Carica o scarica il modello nel thread di un worker."""
+        client = get_client()
+        try:
+            if self.cancelled:
+                return
+            if self.action == self.UNLOAD:
+                if self._scheduler.model_in_use(self.model, exclude=self):
+                    logging.info(f"Modello Ollama non scaricato perché ancora in uso: {self.model}")
+                    return
+                client.unload_model(self.model, on_socket=self._set_socket)
+                logging.info(f"Modello Ollama scaricato dalla memoria: {self.model}")
+                return
+            start = time.perf_counter()
+            client.load_model(self.model, on_socket=self._set_socket)
+            seconds = time.perf_counter() - start
+            logging.info(f"Modello Ollama pronto: {self.model} ({seconds:.1f} s, keep_alive {client.keep_alive})")
+            self.model_ready.emit(self.model, seconds)
         except requests.exceptions.ConnectionError:
-            self.ollama_error.emit("Errore di connessione: Il server Ollama non è raggiungibile. Assicurati che sia in esecuzione.")
+            if not self.cancelled:
+                self.model_error.emit(self.model, "Il server Ollama non è raggiungibile.")
         except requests.exceptions.RequestException as e:
-            self.ollama_error.emit(f"Errore nella richiesta Ollama: {e}")
+            if not self.cancelled:
+                self.model_error.emit(self.model, f"Errore nel caricamento del modello: {e}")
         except Exception as e:
-            self.ollama_error.emit(f"Si è verificato un errore inaspettato: {e}")
+            if not self.cancelled:
+                self.model_error.emit(self.model, f"Si è verificato un errore inaspettato: {e}")
+        finally:
+            self._finish()
+
+class AIScheduler:
+    """
+    Unico punto da cui partono le generazioni di Ollama. Un gruppo fisso di
+    AIWorker, tanti quante le richieste che il server esegue in parallelo,
+    preleva i job da una coda a priorità: le richieste interattive passano
+    prima di quelle di sfondo. Una richiesta identica a una ancora in corso
+    (stesso modello, prompt e opzioni) non genera un nuovo job ma si unisce
+    a quello esistente. Anche caricamento e scaricamento dei modelli passano
+    di qui, come job di sfondo (submit_model_job).
+    """
+
+    def __init__(self, max_concurrency=1):
+        """
+        :param max_concurrency: Richieste inviate contemporaneamente al server.
+        """
+        self.max_concurrency = 0
+        self._condition = threading.Condition()
+        # Heap di (priorità, numero progressivo, job)
+        self._queue = []
+        self._sequence = itertools.count()
+        # chiave -> job non ancora concluso, per unire le richieste identiche
+        self._in_flight = {}
+        self._workers = []
+        self._running = True
+        self.submitted = 0
+        self.coalesced = 0
+        self.set_concurrency(max_concurrency)
+
+    def set_concurrency(self, max_concurrency):
+        """Cambia il numero di worker; quelli in più terminano dopo il job in corso."""
+        with self._condition:
+            self.max_concurrency = max(1, max_concurrency)
+            while self._running and len(self._workers) < self.max_concurrency:
+                worker = AIWorker(self)
+                self._workers.append(worker)
+                worker.start()
+            self._condition.notify_all()
+
+    def submit(self, prompt, model, stream=True, options=None, use_cache=True, priority=PRIORITY_INTERACTIVE,
+               on_chunk=None, on_response=None, on_error=None, on_finished=None):
+        """
+        Accoda una richiesta di generazione. I destinatari vengono collegati
+        ai segnali del job prima che un worker possa eseguirlo, così nemmeno
+        una risposta immediata dalla cache va persa.
+        :return: L'AIJob (già esistente se la stessa richiesta è in corso), da usare per annullare.
+        """
+        key = ResponseCache.key(model, prompt, options)
+        slots = dict(on_chunk=on_chunk, on_response=on_response, on_error=on_error, on_finished=on_finished)
+        with self._condition:
+            self.submitted += 1
+            job = self._in_flight.get(key)
+            if job is not None and job.subscribe(**slots):
+                self.coalesced += 1
+                if priority < job.priority and not job.started:
+                    # Il job sale di priorità; la voce precedente nella coda verrà ignorata
+                    job.priority = priority
+                    heapq.heappush(self._queue, (priority, next(self._sequence), job))
+                    self._condition.notify()
+                logging.info(f"Richiesta a Ollama unita a una identica già in corso. Modello: {model}")
+                return job
+            job = AIJob(prompt, model, stream, options, use_cache, priority)
+            job.subscribe(**slots)
+            self._enqueue(job)
+            return job
+
+    def submit_model_job(self, action, model, on_ready=None, on_error=None, on_finished=None):
+        """
+        Accoda il caricamento o lo scaricamento di un modello con priorità di sfondo.
+        :param action: ModelJob.LOAD o ModelJob.UNLOAD.
+        :return: Il ModelJob (già esistente se la stessa operazione è in attesa o in corso).
+        """
+        slots = dict(on_ready=on_ready, on_error=on_error, on_finished=on_finished)
+        with self._condition:
+            job = self._in_flight.get(ModelJob.job_key(action, model))
+            if job is not None and job.subscribe(**slots):
+                return job
+            job = ModelJob(action, model, self)
+            job.subscribe(**slots)
+            self._enqueue(job)
+            return job
+
+    def _enqueue(self, job):
+        """Registra un job nuovo e sveglia un worker (chiamare con il lock preso)."""
+        self._in_flight[job.key] = job
+        heapq.heappush(self._queue, (job.priority, next(self._sequence), job))
+        self._condition.notify()
+
+    def model_in_use(self, model, exclude=None):
+        """True se un job non annullato, in coda o in corso, usa il modello (scaricamenti esclusi)."""
+        with self._condition:
+            return any(job is not exclude and job.model == model and not (job.cancelled or job.done)
+                       and not (isinstance(job, ModelJob) and job.action == ModelJob.UNLOAD)
+                       for job in self._in_flight.values())
+
+    def next_job(self, worker):
+        """Attende il prossimo job da eseguire. :return: None se il worker deve terminare."""
+        with self._condition:
+            while True:
+                if not self._running or len(self._workers) > self.max_concurrency:
+                    self._workers.remove(worker)
+                    return None
+                while self._queue:
+                    _, _, job = heapq.heappop(self._queue)
+                    if not job.started:
+                        job.started = True
+                        return job
+                self._condition.wait()
+
+    def job_finished(self, job):
+        """Toglie un job concluso dalle richieste in corso."""
+        with self._condition:
+            if self._in_flight.get(job.key) is job:
+                del self._in_flight[job.key]
+
+    def queue_length(self):
+        """Job in attesa di un worker."""
+        with self._condition:
+            return sum(1 for _, _, job in self._queue if not job.started)
+
+    def cancel_all(self):
+        """Annulla tutti i job in coda o in corso, per tutti i chiamanti."""
+        with self._condition:
+            jobs = list(self._in_flight.values())
+        for job in jobs:
+            while not (job.cancelled or job.done):
+                job.cancel()
+
+    def shutdown(self, timeout=2.0):
+        """Annulla tutti i job e ferma i worker."""
+        with self._condition:
+            self._running = False
+            workers = list(self._workers)
+            self._condition.notify_all()
+        self.cancel_all()
+        for worker in workers:
+            worker.join(timeout)
+        if self.submitted:
+            logging.info(f"Richieste AI: {self.submitted} inviate, {self.coalesced} unite a richieste identiche.")
+
+_scheduler = None
+
+def get_scheduler():
+    """Scheduler delle richieste AI condiviso da tutto il processo, creato al primo uso."""
+    global _scheduler
+    with _client_lock:
+        if _scheduler is None:
+            _scheduler = AIScheduler()
+        return _scheduler
 
 class OllamaModelsThread(QThread):
     """
@@ -51,12 +776,7 @@ class OllamaModelsThread(QThread):
 
     def run(self):
         try:
-            url = "http://localhost:11434/api/tags"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            models_data = response.json().get('models', [])
-            model_names = [model.get('name') for model in models_data]
-            self.models_list.emit(model_names)
+            self.models_list.emit(get_client().list_models())
         except requests.exceptions.ConnectionError:
             self.error_occurred.emit("Errore di connessione: Il server Ollama non è raggiungibile.")
         except requests.exceptions.RequestException as e:
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import emotion_classifier
+from emotion_classifier import EMOTION_LABELS, EmotionClassifier
+
+class FakeSession:
+    """Sessione ONNX finta: l'emozione di ogni volto è la luminosità media della ROI divisa per 32."""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, outputs, feeds):
+        batch, = feeds.values()
+        self.batches.append(len(batch))
+        scores = np.zeros((len(batch), len(EMOTION_LABELS)), np.float32)
+        scores[np.arange(len(batch)), (batch.mean(axis=(1, 2, 3)) // 32).astype(int)] = 1
+        return [scores]
+
+@pytest.fixture
+def classifier():
+    classifier = EmotionClassifier(cache_interval=60.0, budget_ms=1000.0)
+    classifier._session = FakeSession()
+    classifier._input_name = 'Input3'
+    classifier._batchable = True
+    return classifier
+
+def faces_frame(*values):
+    """Frame in scala di grigi con un volto 40x40 di luminosità uniforme per ogni valore."""
+    gray = np.zeros((100, 60 * len(values)), np.uint8)
+    boxes = []
+    for i, value in enumerate(values):
+        gray[30:70, 60 * i + 10:60 * i + 50] = value
+        boxes.append((60 * i + 10, 30, 40, 40))
+    return gray, boxes
+
+def test_all_faces_of_a_frame_are_classified_in_one_inference(classifier):
+    gray, boxes = faces_frame(10, 40, 100)
+    assert classifier.classify(gray, boxes, keys=[1, 2, 3]) == ["Neutrale", "Felice", "Triste"]
+    assert classifier._session.batches == [3]
+
+def test_labels_are_cached_per_track_id(classifier):
+    gray, boxes = faces_frame(10, 40)
+    classifier.classify(gray, boxes, keys=[1, 2])
+    # I volti si scambiano di posto: ogni traccia tiene la propria emozione senza nuove inferenze
+    assert classifier.classify(gray, boxes[::-1], keys=[2, 1]) == ["Felice", "Neutrale"]
+    assert classifier._session.batches == [2]
+    # Solo il volto nuovo viene classificato
+    gray, boxes = faces_frame(10, 40, 100)
+    assert classifier.classify(gray, boxes, keys=[1, 2, 7]) == ["Neutrale", "Felice", "Triste"]
+    assert classifier._session.batches == [2, 1]
+
+def test_stale_labels_are_refreshed_after_the_cache_interval(classifier):
+    classifier.cache_interval = 0.0
+    gray, boxes = faces_frame(10)
+    classifier.classify(gray, boxes, keys=[1])
+    gray, _ = faces_frame(40)
+    assert classifier.classify(gray, boxes, keys=[1]) == ["Felice"]
+    assert classifier._session.batches == [1, 1]
+
+def test_only_the_faces_that_fit_in_the_budget_are_classified(classifier):
+    classifier.budget_ms = 2.0
+    classifier._ms_per_face = 1.0
+    gray, boxes = faces_frame(10, 40, 100, 130)
+    assert classifier.classify(gray, boxes, keys=[1, 2, 3, 4]) == ["Neutrale", "Felice", None, None]
+    # Al frame successivo tocca ai volti rimasti indietro
+    assert classifier.classify(gray, boxes, keys=[1, 2, 3, 4]) == ["Neutrale", "Felice", "Triste", "Arrabbiato"]
+
+def test_faces_outside_the_frame_do_not_break_the_batch(classifier):
+    gray, boxes = faces_frame(40)
+    assert classifier.classify(gray, boxes + [(500, 500, 40, 40)], keys=[1, 2]) == ["Felice", "Neutrale"]
+
+def test_without_a_model_every_face_is_unclassified(monkeypatch, tmp_path):
+    monkeypatch.setattr(emotion_classifier, '_unavailable_logged', True)
+    classifier = EmotionClassifier(model_path=str(tmp_path / "assente.onnx"))
+    gray, boxes = faces_frame(40, 100)
+    assert classifier.classify(gray, boxes, keys=[1, 2]) == [None, None]
+    assert not classifier.available and not classifier.load()
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from Versione_1.gesture_engine import GestureEngine, landmarks_to_array
+
+# Posizioni (x, y) del pollice: articolazione IP e punta
+THUMB_FOLDED = ((0.45, 0.68), (0.50, 0.68))
+THUMB_UP = ((0.36, 0.60), (0.36, 0.50))
+THUMB_DOWN = ((0.36, 0.80), (0.36, 0.90))
+# Pollice che tocca la punta dell'indice esteso
+THUMB_PINCH = ((0.40, 0.58), (0.43, 0.50))
+
+def make_hand(extended=(), thumb=THUMB_FOLDED):
+    """
+    Mano sintetica (21, 3) con il polso in basso e le nocche a y = 0.7.
+    :param extended: Dita lunghe estese (1 = indice ... 4 = mignolo); le altre sono chiuse verso il polso.
+    """
+    hand = np.zeros((21, 3), dtype=np.float32)
+    hand[0, :2] = (0.5, 0.8)
+    hand[1, :2] = (0.42, 0.74)
+    hand[2, :2] = (0.43, 0.71)
+    hand[3, :2], hand[4, :2] = thumb
+    for finger in range(1, 5):
+        x = 0.38 + finger * 0.06
+        base = finger * 4 + 1
+        hand[base, :2] = (x, 0.70)
+        hand[base + 1, :2] = (x, 0.63)
+        if finger in extended:
+            hand[base + 2, :2] = (x, 0.56)
+            hand[base + 3, :2] = (x, 0.49)
+        else:
+            hand[base + 2, :2] = (x, 0.68)
+            hand[base + 3, :2] = (x, 0.72)
+    return hand
+
+@pytest.mark.parametrize('hand, gestures', [
+    (make_hand(), ["Pugno Chiuso"]),
+    (make_hand((1, 2, 3, 4), THUMB_UP), ["Mano Aperta"]),
+    (make_hand((1,)), ["Indice Alzato"]),
+    (make_hand((1, 2)), ["Vittoria"]),
+    (make_hand(thumb=THUMB_UP), ["Pollice in Su"]),
+    (make_hand(thumb=THUMB_DOWN), ["Pollice in Giù"]),
+    (make_hand((1, 2, 3, 4), THUMB_PINCH), ["OK"]),
+    # Corna: nessuna riga della tabella
+    (make_hand((1, 4)), []),
+])
+def test_classify_recognizes_each_gesture(hand, gestures):
+    assert GestureEngine().classify(hand[np.newaxis]) == [gestures]
+
+def test_classify_handles_all_hands_of_the_frame_at_once():
+    hands = np.stack([make_hand(), make_hand((1, 2)), make_hand(thumb=THUMB_UP)])
+    assert GestureEngine().classify(hands) == [["Pugno Chiuso"], ["Vittoria"], ["Pollice in Su"]]
+    assert GestureEngine().classify(np.empty((0, 21, 3), np.float32)) == []
+
+def test_classify_does_not_depend_on_the_hand_distance():
+    hand = make_hand((1, 2))
+    wrist = hand[0].copy()
+    # Mano più lontana dalla webcam: metà delle dimensioni attorno al polso
+    far = (hand - wrist) * 0.5 + wrist
+    assert GestureEngine().classify(far[np.newaxis]) == [["Vittoria"]]
+
+def test_landmarks_to_array_keeps_the_landmark_order():
+    landmarks = SimpleNamespace(landmark=[SimpleNamespace(x=i, y=i + 0.5, z=-i) for i in range(21)])
+    array = landmarks_to_array(landmarks)
+    assert array.shape == (21, 3) and array.dtype == np.float32
+    assert array[20].tolist() == [20.0, 20.5, -20.0]
@@ -0,0 +1,362 @@
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+from PyQt6.QtCore import QCoreApplication
+
+import ollama_manager
+from ollama_manager import (AIJob, AIScheduler, ModelJob, OllamaClient, ResponseCache, PRIORITY_BACKGROUND,
+                            PRIORITY_INTERACTIVE)
+
+# --- ResponseCache ---
+
+def test_cache_key_ignores_whitespace_but_not_model_or_options():
+    key = ResponseCache.key("llama3", "  ciao   mondo \n")
+    assert key == ResponseCache.key("llama3", "ciao mondo")
+    assert key != ResponseCache.key("llava:7b", "ciao mondo")
+    assert key != ResponseCache.key("llama3", "ciao mondo", {"temperature": 0.2})
+
+def test_cache_hits_memory_then_disk(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path))
+    key = ResponseCache.key("llama3", "prompt")
+    assert cache.get(key) is None
+    cache.put(key, "risposta")
+    assert cache.get(key) == "risposta"
+
+    # Una nuova istanza (nuova sessione dell'app) trova la risposta su disco
+    reopened = ResponseCache(directory=str(tmp_path))
+    assert reopened.get(key) == "risposta"
+    assert reopened.get(key) == "risposta"
+    assert reopened.stats() == {'memory_hits': 1, 'disk_hits': 1, 'misses': 0}
+    assert cache.stats() == {'memory_hits': 1, 'disk_hits': 0, 'misses': 1}
+
+def test_cache_entries_expire_after_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ollama_manager.time, "time", lambda: now[0])
+    cache = ResponseCache(directory=str(tmp_path), ttl=60)
+    key = ResponseCache.key("llama3", "prompt")
+    cache.put(key, "risposta")
+
+    now[0] += 59
+    assert cache.get(key) == "risposta"
+    now[0] += 1
+    assert cache.get(key) is None
+    # La voce scaduta viene eliminata anche dal disco
+    assert not os.path.exists(tmp_path / f"{key}.json")
+
+def test_cache_memory_is_lru(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path), memory_entries=2)
+    a, b, c = (ResponseCache.key("llama3", prompt) for prompt in "abc")
+    cache.put(a, "A")
+    cache.put(b, "B")
+    cache.get(a)  # a diventa la più recente, b la prossima da togliere
+    cache.put(c, "C")
+    assert list(cache._memory) == [a, c]
+
+    # b non è più in memoria ma resta su disco
+    assert cache.get(b) == "B"
+    assert cache.stats()['disk_hits'] == 1
+
+def test_cache_evicts_least_recently_used_files(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path), max_bytes=10 ** 6)
+    keys = [ResponseCache.key("llama3", str(i)) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, "x" * 100)
+        # mtime distinti e crescenti, senza dipendere dalla risoluzione del filesystem
+        os.utime(tmp_path / f"{key}.json", (i, i))
+
+    # Spazio per tre voci e mezza: le voci differiscono di qualche byte (la data di creazione)
+    entry_size = os.path.getsize(tmp_path / f"{keys[0]}.json")
+    cache.max_bytes = entry_size * 7 // 2
+    cache.put(ResponseCache.key("llama3", "nuovo"), "x" * 100)
+    assert not os.path.exists(tmp_path / f"{keys[0]}.json")
+    assert all(os.path.exists(tmp_path / f"{key}.json") for key in keys[1:])
+
+def test_cache_deletes_corrupt_entries(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path))
+    unreadable, incomplete = ResponseCache.key("llama3", "a"), ResponseCache.key("llama3", "b")
+    (tmp_path / f"{unreadable}.json").write_text("{non è json", encoding="utf-8")
+    (tmp_path / f"{incomplete}.json").write_text(json.dumps({"response": "senza data"}), encoding="utf-8")
+
+    assert cache.get(unreadable) is None
+    assert cache.get(incomplete) is None
+    assert os.listdir(tmp_path) == []
+
+def test_cache_clear(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path))
+    key = ResponseCache.key("llama3", "prompt")
+    cache.put(key, "risposta")
+    cache.clear()
+    assert cache.get(key) is None
+    assert os.listdir(tmp_path) == []
+
+# --- AIScheduler ---
+
+@pytest.fixture(scope="module")
+def qt_app():
+    """I segnali emessi dai worker arrivano ai destinatari con il ciclo degli eventi di Qt."""
+    return QCoreApplication.instance() or QCoreApplication([])
+
+@pytest.fixture
+def scheduler(monkeypatch, qt_app):
+    """
+    Scheduler con un solo worker i cui job non contattano Ollama: ogni job
+    registra il proprio prompt e quello con prompt "blocca" tiene occupato
+    il worker finché il test non apre `gate`.
+    """
+    ran = []
+    gate = threading.Event()
+    blocked = threading.Event()
+
+    def run(job):
+        try:
+            if job.cancelled:
+                return
+            ran.append(job.prompt)
+            if job.prompt == "blocca":
+                blocked.set()
+                gate.wait(5)
+        finally:
+            job._finish()
+
+    monkeypatch.setattr(AIJob, "run", run)
+    scheduler = AIScheduler(max_concurrency=1)
+    scheduler.ran, scheduler.gate, scheduler.blocked = ran, gate, blocked
+    yield scheduler
+    gate.set()
+    scheduler.shutdown()
+
+def wait_until(condition, timeout=5.0):
+    """Consegna i segnali dei worker finché la condizione non è vera."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        QCoreApplication.processEvents()
+        time.sleep(0.01)
+
+def test_scheduler_runs_interactive_jobs_before_background(scheduler):
+    scheduler.submit("blocca", "llama3")
+    assert scheduler.blocked.wait(5)
+    background = scheduler.submit("sfondo", "llama3", priority=PRIORITY_BACKGROUND)
+    first = scheduler.submit("primo", "llama3", priority=PRIORITY_INTERACTIVE)
+    second = scheduler.submit("secondo", "llama3", priority=PRIORITY_INTERACTIVE)
+    assert scheduler.queue_length() == 3
+
+    scheduler.gate.set()
+    wait_until(lambda: background.done and first.done and second.done)
+    assert scheduler.ran == ["blocca", "primo", "secondo", "sfondo"]
+
+def test_scheduler_coalesces_identical_requests(scheduler):
+    scheduler.submit("blocca", "llama3")
+    assert scheduler.blocked.wait(5)
+    responses = []
+    job = scheduler.submit("domanda", "llama3", priority=PRIORITY_BACKGROUND, on_finished=lambda: responses.append(1))
+    same = scheduler.submit("  domanda ", "llama3", on_finished=lambda: responses.append(2))
+    other_model = scheduler.submit("domanda", "llava:7b")
+    assert same is job
+    assert other_model is not job
+    assert scheduler.coalesced == 1
+    # La richiesta unita porta il job alla priorità interattiva
+    assert job.priority == PRIORITY_INTERACTIVE
+
+    scheduler.gate.set()
+    wait_until(lambda: len(responses) == 2 and other_model.done)
+    assert scheduler.ran.count("domanda") == 2
+    assert sorted(responses) == [1, 2]
+
+def test_scheduler_cancel_waits_for_every_subscriber(scheduler):
+    scheduler.submit("blocca", "llama3")
+    assert scheduler.blocked.wait(5)
+    job = scheduler.submit("domanda", "llama3")
+    scheduler.submit("domanda", "llama3")
+    job.cancel()
+    assert not job.cancelled
+    job.cancel()
+    assert job.cancelled
+    # Un job annullato non accetta nuovi chiamanti: la stessa richiesta ne crea uno nuovo
+    assert scheduler.submit("domanda", "llama3") is not job
+
+    scheduler.gate.set()
+    last = scheduler.submit("fine", "llama3")
+    wait_until(lambda: last.done)
+    assert scheduler.ran == ["blocca", "domanda", "fine"]
+
+def test_scheduler_cancel_all(scheduler):
+    running = scheduler.submit("blocca", "llama3")
+    assert scheduler.blocked.wait(5)
+    queued = scheduler.submit("domanda", "llama3")
+    queued.subscribe()
+    scheduler.cancel_all()
+    assert running.cancelled and queued.cancelled
+
+    scheduler.gate.set()
+    last = scheduler.submit("fine", "llama3")
+    wait_until(lambda: last.done)
+    assert scheduler.ran == ["blocca", "fine"]
+
+# --- AIJob contro un server Ollama finto ---
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    # Senza Content-Length la risposta finisce con la chiusura della connessione, come lo stream di Ollama
+    protocol_version = "HTTP/1.0"
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(payload)
+        self.server.reply(self, payload)
+
+    def send_lines(self, *lines, status=200):
+        """Risponde con una riga NDJSON per ogni dizionario, inviandole una alla volta."""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for line in lines:
+            self.wfile.write(json.dumps(line).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def ollama(monkeypatch, tmp_path, qt_app):
+    """
+    Server HTTP locale al posto di Ollama: registra i payload ricevuti in
+    `requests` e risponde con `reply(handler, payload)`, che i test
+    sostituiscono. Client e cache condivisi puntano al server e a tmp_path.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.reply = lambda handler, payload: handler.send_lines({"response": "ok", "done": True})
+    # Sblocca le risposte che restano appese
+    server.release = threading.Event()
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    client = OllamaClient(base_url=f"http://127.0.0.1:{server.server_port}", read_timeout=5)
+    monkeypatch.setattr(ollama_manager, "_client", client)
+    monkeypatch.setattr(ollama_manager, "_cache", ResponseCache(directory=str(tmp_path)))
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+    client.close()
+
+def run_job(job):
+    """Esegue il job nel thread del test e raccoglie i segnali emessi."""
+    signals = SimpleNamespace(chunks=[], responses=[], errors=[])
+    job.subscribe(on_chunk=signals.chunks.append, on_response=signals.responses.append,
+                  on_error=signals.errors.append)
+    job.run()
+    QCoreApplication.processEvents()
+    return signals
+
+def test_job_streams_ndjson_and_caches_the_response(ollama):
+    ollama.reply = lambda handler, payload: handler.send_lines(
+        {"response": "Ciao"}, {"response": ", "}, {"response": "mondo"}, {"response": "", "done": True})
+    signals = run_job(AIJob("saluta", "llama3"))
+    assert signals.responses == ["Ciao, mondo"] and signals.errors == []
+    assert "".join(signals.chunks) == "Ciao, mondo"
+    payload, = ollama.requests
+    assert payload["stream"] is True and payload["prompt"] == "saluta"
+    assert payload["keep_alive"] == ollama_manager.DEFAULT_KEEP_ALIVE
+
+    # La stessa domanda trova la risposta nella cache senza contattare il server
+    assert run_job(AIJob("saluta", "llama3")).responses == ["Ciao, mondo"]
+    assert len(ollama.requests) == 1
+
+def test_job_without_streaming_sends_no_chunks(ollama):
+    signals = run_job(AIJob("saluta", "llama3", stream=False))
+    assert signals.responses == ["ok"] and signals.chunks == []
+    # Anche senza pezzi la richiesta a Ollama resta in streaming, per poterla annullare
+    assert ollama.requests[0]["stream"] is True
+
+def test_truncated_stream_is_an_error_and_is_not_cached(ollama):
+    ollama.reply = lambda handler, payload: handler.send_lines({"response": "Risposta a m"})
+    signals = run_job(AIJob("domanda", "llama3"))
+    assert signals.responses == []
+    assert signals.errors == ["Errore nella richiesta Ollama: la risposta si è interrotta prima della fine."]
+    assert ollama_manager.get_cache().get(ResponseCache.key("llama3", "domanda")) is None
+
+def test_error_line_is_not_cached(ollama):
+    ollama.reply = lambda handler, payload: handler.send_lines({"error": "modello non trovato"})
+    signals = run_job(AIJob("domanda", "llama3"))
+    assert signals.errors == ["Errore nella richiesta Ollama: modello non trovato"]
+    assert signals.responses == []
+
+    # Riprovando, la richiesta arriva di nuovo al server
+    ollama.reply = lambda handler, payload: handler.send_lines({"response": "ok", "done": True})
+    assert run_job(AIJob("domanda", "llama3")).responses == ["ok"]
+    assert len(ollama.requests) == 2
+
+def test_http_error_is_not_cached(ollama):
+    ollama.reply = lambda handler, payload: handler.send_lines(status=500)
+    signals = run_job(AIJob("domanda", "llama3"))
+    error, = signals.errors
+    assert error.startswith("Errore nella richiesta Ollama: 500")
+    assert ollama_manager.get_cache().get(ResponseCache.key("llama3", "domanda")) is None
+
+def test_unreachable_server_is_a_connection_error(ollama, monkeypatch):
+    with socket.socket() as free:
+        free.bind(("127.0.0.1", 0))
+        port = free.getsockname()[1]
+    monkeypatch.setattr(ollama_manager, "_client", OllamaClient(base_url=f"http://127.0.0.1:{port}"))
+    error, = run_job(AIJob("domanda", "llama3")).errors
+    assert error.startswith("Errore di connessione")
+
+def test_cancel_closes_the_socket_before_the_first_token(ollama, tmp_path):
+    # Ollama sta ancora caricando il modello: nessuna risposta finché il test non finisce
+    ollama.reply = lambda handler, payload: ollama.release.wait(5)
+    errors, finished = [], []
+    job = AIJob("domanda", "llama3")
+    job.subscribe(on_error=errors.append, on_finished=lambda: finished.append(True))
+    worker = threading.Thread(target=job.run)
+    worker.start()
+    wait_until(lambda: job._socket is not None and ollama.requests)
+
+    start = time.monotonic()
+    job.cancel()
+    worker.join(5)
+    assert time.monotonic() - start < 1.0
+    wait_until(lambda: finished)
+    assert job.cancelled and job.done
+    assert errors == []
+    assert os.listdir(tmp_path) == []
+
+# --- ModelJob ---
+
+def run_model_job(action, in_use=False):
+    """Esegue un ModelJob con uno scheduler finto che dichiara il modello in uso o libero."""
+    signals = SimpleNamespace(ready=[], errors=[])
+    scheduler = SimpleNamespace(model_in_use=lambda model, exclude=None: in_use)
+    job = ModelJob(action, "llama3", scheduler)
+    job.subscribe(on_ready=lambda model, seconds: signals.ready.append(model),
+                  on_error=lambda model, error: signals.errors.append(error))
+    job.run()
+    QCoreApplication.processEvents()
+    return signals
+
+def test_load_warms_up_the_model_without_a_prompt(ollama):
+    ollama_manager.get_client().configure(keep_alive="1h")
+    ollama.reply = lambda handler, payload: handler.send_lines({"model": "llama3", "response": "", "done": True})
+    signals = run_model_job(ModelJob.LOAD)
+    assert signals.ready == ["llama3"] and signals.errors == []
+    assert ollama.requests == [{"model": "llama3", "keep_alive": "1h"}]
+
+def test_unload_frees_the_model_memory(ollama):
+    signals = run_model_job(ModelJob.UNLOAD)
+    assert ollama.requests == [{"model": "llama3", "keep_alive": 0}]
+    assert signals.ready == [] and signals.errors == []
+
+def test_unload_is_skipped_while_the_model_is_in_use(ollama):
+    run_model_job(ModelJob.UNLOAD, in_use=True)
+    assert ollama.requests == []
+
+def test_load_failure_is_reported(ollama):
+    ollama.reply = lambda handler, payload: handler.send_lines(status=404)
+    signals = run_model_job(ModelJob.LOAD)
+    error, = signals.errors
+    assert error.startswith("Errore nel caricamento del modello: 404") and signals.ready == []
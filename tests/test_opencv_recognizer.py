@@ -0,0 +1,120 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+from PyQt6.QtCore import QCoreApplication
+
+import emotion_classifier
+from Versione_1.opencv_recognizer import OpenCVRecognizer
+from Versione_1.recognition_events import RecognitionEventBus
+
+@pytest.fixture(scope='module')
+def qt_app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+@pytest.fixture
+def recognizer(qt_app, monkeypatch):
+    # La cascata di Haar non serve alla forma della mano (e non esiste in tutte le build di OpenCV)
+    monkeypatch.setattr(cv2, 'CascadeClassifier', lambda path: None, raising=False)
+    monkeypatch.setattr(cv2, 'data', SimpleNamespace(haarcascades=''), raising=False)
+    return OpenCVRecognizer()
+
+def largest_contour(mask):
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return max(contours, key=cv2.contourArea)
+
+def fan_hand(fingers):
+    """Palmo rotondo con `fingers` dita a ventaglio, dalla sinistra verso destra."""
+    mask = np.zeros((400, 400), np.uint8)
+    cv2.circle(mask, (200, 280), 70, 255, -1)
+    for angle in np.radians(np.linspace(-50, 50, 5)[:fingers]):
+        tip = (int(200 + 190 * np.sin(angle)), int(280 - 190 * np.cos(angle)))
+        cv2.line(mask, (200, 280), tip, 255, 22)
+    return largest_contour(mask)
+
+def pointing_hand():
+    """Palmo rettangolare con un solo dito alto e stretto."""
+    mask = np.zeros((400, 400), np.uint8)
+    cv2.rectangle(mask, (100, 220), (200, 330), 255, -1)
+    cv2.rectangle(mask, (140, 40), (160, 225), 255, -1)
+    return largest_contour(mask)
+
+@pytest.mark.parametrize('fingers, count, gesture', [
+    (0, 0, "Pugno Chiuso"),
+    (2, 2, "Vittoria"),
+    (3, 3, "Tre Dita"),
+    (4, 4, "Mano Aperta"),
+    (5, 5, "Mano Aperta"),
+])
+def test_hand_shape_features_count_the_fingers(recognizer, fingers, count, gesture):
+    contour = fan_hand(fingers)
+    assert recognizer.hand_shape_features(contour)['finger_count'] == count
+    assert recognizer.recognize_gesture_from_contour(contour) == gesture
+
+def test_hand_shape_features_describe_the_shape(recognizer):
+    fist = recognizer.hand_shape_features(fan_hand(0))
+    assert fist['solidity'] > 0.95 and not fist['depth_profile'].any()
+    open_hand = recognizer.hand_shape_features(fan_hand(5))
+    assert open_hand['solidity'] < 0.6
+    # Profondità delle valli relative all'altezza della mano, dalla più profonda
+    profile = open_hand['depth_profile']
+    assert profile.shape == (4,) and np.all(np.diff(profile) <= 0) and 0 < profile[0] < 1
+
+def test_a_single_tall_finger_is_the_raised_index(recognizer):
+    features = recognizer.hand_shape_features(pointing_hand())
+    assert features['finger_count'] == 0 and features['aspect_ratio'] < 0.6
+    assert recognizer.recognize_gesture_from_contour(pointing_hand()) == "Indice Alzato"
+
+def test_degenerate_contours_have_no_gesture(recognizer):
+    triangle = np.array([[[0, 0]], [[10, 0]], [[0, 10]]], np.int32)
+    assert recognizer.hand_shape_features(triangle) is None
+    assert recognizer.recognize_gesture_from_contour(triangle) == "Nessun Gesto"
+
+class FakeCascade:
+    def __init__(self, faces):
+        self.faces = faces
+
+    def detectMultiScale(self, gray, scale, neighbors):
+        return self.faces
+
+class FixedEmotionSession:
+    """Sessione ONNX finta che vede ogni volto felice e conta le inferenze."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def run(self, outputs, feeds):
+        self.calls += 1
+        batch, = feeds.values()
+        scores = np.zeros((len(batch), 8), np.float32)
+        scores[:, 1] = 1
+        return [scores]
+
+def published_faces(recognizer, monkeypatch):
+    published = []
+    monkeypatch.setattr(recognizer.events, 'publish_faces', lambda ids, emotions: published.append((ids, emotions)))
+    return published
+
+def test_faces_are_unknown_without_an_emotion_model(recognizer, monkeypatch, tmp_path):
+    monkeypatch.setattr(emotion_classifier, '_unavailable_logged', True)
+    recognizer.emotion_classifier.model_path = str(tmp_path / "assente.onnx")
+    recognizer.face_cascade = FakeCascade(np.array([[10, 10, 40, 40], [100, 10, 40, 40]]))
+    published = published_faces(recognizer, monkeypatch)
+    recognizer.detect_face_and_emotion(np.zeros((120, 160, 3), np.uint8))
+    (ids, emotions), = published
+    assert len(set(ids)) == 2
+    assert emotions == [RecognitionEventBus.UNKNOWN_EMOTION] * 2
+
+def test_faces_of_a_frame_share_one_inference_and_are_cached_per_track(recognizer, monkeypatch):
+    session = FixedEmotionSession()
+    classifier = recognizer.emotion_classifier
+    classifier._session, classifier._input_name, classifier._batchable = session, 'Input3', True
+    recognizer.face_cascade = FakeCascade(np.array([[10, 10, 40, 40], [100, 10, 40, 40]]))
+    published = published_faces(recognizer, monkeypatch)
+    frame = np.zeros((120, 160, 3), np.uint8)
+    recognizer.detect_face_and_emotion(frame)
+    recognizer.detect_face_and_emotion(frame)
+    assert [emotions for _, emotions in published] == [["Felice", "Felice"]] * 2
+    assert published[0][0] == published[1][0]
+    assert session.calls == 1
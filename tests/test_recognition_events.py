@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+from PyQt6.QtCore import QCoreApplication
+
+from Versione_1.recognition_events import RecognitionEventBus, StateFilter
+
+# --- StateFilter ---
+
+def test_state_filter_needs_consecutive_confirmations():
+    state = StateFilter(confirm=3)
+    assert [state.observe("Pugno") for _ in range(3)] == [False, False, True]
+    assert state.stable == "Pugno"
+    # Lo stato stabile non genera altri cambi
+    assert not state.observe("Pugno")
+
+def test_state_filter_ignores_flicker():
+    state = StateFilter(confirm=2)
+    state.observe("Pugno")
+    state.observe("Pugno")
+    # Un frame diverso isolato non cambia lo stato e azzera il conteggio
+    assert not state.observe("Vittoria")
+    assert not state.observe("Pugno")
+    assert not state.observe("Vittoria")
+    assert state.stable == "Pugno"
+    assert state.observe("Vittoria")
+
+def test_state_filter_restarts_count_on_new_candidate():
+    state = StateFilter(confirm=2)
+    assert not state.observe("a")
+    assert not state.observe("b")
+    assert state.observe("b")
+    assert state.stable == "b"
+
+# --- RecognitionEventBus ---
+
+@pytest.fixture(scope="module")
+def qt_app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+@pytest.fixture
+def bus(qt_app):
+    bus = RecognitionEventBus(refresh_rate=1000, gesture_confirm_frames=2, emotion_confirm_frames=2)
+    bus.received = []
+    bus.hand_position_signal.connect(lambda position: bus.received.append(position))
+    bus.hand_gesture_signal.connect(lambda gesture: bus.received.append(gesture))
+    bus.face_emotion_signal.connect(lambda emotion: bus.received.append(emotion))
+    yield bus
+    bus.stop()
+
+def test_bus_sends_last_position_and_stable_changes(bus):
+    bus.publish_hands([7], [(1, 1)], [["Vittoria"]])
+    bus.publish_hands([7], [(2, 2)], [["Vittoria"]])
+    bus.publish_faces([3], ["Felice"])
+    bus.publish_faces([3], ["Felice"])
+    bus.flush()
+    assert bus.received == [(2, 2), "Vittoria", "Felice"]
+
+def test_bus_keys_hands_by_track_id(bus):
+    for _ in range(2):
+        bus.publish_hands([1, 2], [(0, 0), (9, 9)], [["Vittoria"], []])
+    bus.flush()
+    bus.received.clear()
+    # Le stesse mani in ordine inverso: nessun cambio di gesto
+    for _ in range(2):
+        bus.publish_hands([2, 1], [(9, 9), (0, 0)], [[], ["Vittoria"]])
+    bus.flush()
+    assert sorted(bus.received) == [(0, 0), (9, 9)]
+
+def test_bus_timer_runs_only_with_queued_events(bus):
+    assert not bus._timer.isActive()
+    # Il primo frame di un gesto non è ancora un cambio, ma la posizione va inviata
+    bus.publish_hands([1], [(4, 4)], [["Pugno Chiuso"]])
+    QCoreApplication.processEvents()
+    assert bus._timer.isActive()
+    bus.flush()
+    bus._timer.stop()
+    bus.publish_faces([1], [None])
+    QCoreApplication.processEvents()
+    assert not bus._timer.isActive()
+
+def test_bus_sends_no_gesture_when_a_hand_stops_gesturing(bus):
+    for gestures in (["Vittoria"], ["Vittoria"], [], []):
+        bus.publish_hands([1], [(0, 0)], [gestures])
+    bus.flush()
+    assert bus.received == [(0, 0), "Vittoria", RecognitionEventBus.NO_GESTURE]
+
+def test_bus_delivers_events_published_from_another_thread(bus):
+    def recognizer():
+        for _ in range(2):
+            bus.publish_faces([5], ["Triste"])
+
+    thread = threading.Thread(target=recognizer)
+    thread.start()
+    thread.join()
+    # Il timer viene avviato nel thread del bus e invia gli eventi da solo
+    deadline = time.monotonic() + 1.0
+    while not bus.received and time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+    assert bus.received == ["Triste"]
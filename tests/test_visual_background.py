@@ -0,0 +1,548 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+from PyQt6.QtCore import QCoreApplication
+
+import visual_background
+from visual_background import (CaptureSource, Detector, DetectorScheduler, FaceTracker, FrameAnalyzer, FrameBufferPool, FrameMailbox, FrameSource, HandDetector,
+                               HandTracker, IdentityTracker, ImageFolderSource, LatencyStats, MotionGate, SkinMaskLUT,
+                               SyntheticSource, VideoThread, open_frame_source, skin_mask)
+
+# --- FrameMailbox ---
+
+def test_mailbox_keeps_only_the_latest_frame():
+    mailbox = FrameMailbox()
+    first, second = np.zeros((2, 2, 3), np.uint8), np.ones((2, 2, 3), np.uint8)
+    assert mailbox.post(first)
+    assert not mailbox.post(second)
+    assert mailbox.take() is second
+    assert mailbox.take() is None
+    assert mailbox.stats() == {'posted': 2, 'dropped': 1, 'shown': 1}
+
+def test_mailbox_recycles_dropped_and_released_buffers():
+    mailbox = FrameMailbox()
+    dropped, shown = np.zeros((4, 4, 3), np.uint8), np.zeros((4, 4, 3), np.uint8)
+    mailbox.post(dropped)
+    mailbox.post(shown)
+    assert mailbox.acquire((4, 4, 3)) is dropped
+    assert mailbox.acquire((4, 4, 3)) is None
+
+    mailbox.release(mailbox.take())
+    # I buffer di forma diversa (es. dopo un ridimensionamento) vengono scartati
+    assert mailbox.acquire((8, 8, 3)) is None
+    assert mailbox.acquire((4, 4, 3)) is None
+
+def test_mailbox_take_waits_for_a_frame():
+    mailbox = FrameMailbox()
+    frame = np.zeros((2, 2, 3), np.uint8)
+    assert mailbox.take(timeout=0.01) is None
+
+    timer = threading.Timer(0.05, mailbox.post, args=(frame,))
+    timer.start()
+    assert mailbox.take(block=True) is frame
+    timer.join()
+
+def test_mailbox_interrupt_wakes_a_blocked_consumer():
+    mailbox = FrameMailbox()
+    taken = []
+    consumer = threading.Thread(target=lambda: taken.append(mailbox.take(block=True)))
+    consumer.start()
+    mailbox.interrupt()
+    consumer.join(5)
+    assert not consumer.is_alive()
+    assert taken == [None]
+    # Dopo interrupt() nemmeno le attese successive si bloccano
+    assert mailbox.take(block=True) is None
+
+# --- FaceTracker ---
+
+class FakeCascade:
+    """Cascata finta: restituisce i riquadri indicati dal test e conta le chiamate."""
+
+    def __init__(self):
+        self.faces = []
+        self.calls = 0
+
+    def detectMultiScale(self, image, scale_factor, min_neighbors):
+        self.calls += 1
+        return list(self.faces)
+
+def face_frame(x, y, size=80, shape=(240, 320)):
+    """Frame grigio uniforme con un "volto" a trama casuale (sempre la stessa) in (x, y)."""
+    frame = np.full(shape, 90, np.uint8)
+    frame[y:y + size, x:x + size] = np.random.default_rng(0).integers(0, 255, (size, size), dtype=np.uint8)
+    return frame
+
+@pytest.fixture
+def cascade(monkeypatch):
+    fake = FakeCascade()
+    monkeypatch.setattr(visual_background, "face_cascade", fake)
+    return fake
+
+def test_face_tracker_runs_cascade_every_interval_and_tracks_between(cascade):
+    tracker = FaceTracker(detect_interval=5, downscale=0.5)
+    # Riquadro del volto nel frame ridotto a metà
+    cascade.faces = [(20, 20, 40, 40)]
+    boxes = [tracker.update(face_frame(40 + 2 * i, 40)) for i in range(10)]
+    assert cascade.calls == 2
+    assert tracker.tracked_frames == 8
+    # Nei frame intermedi il template segue il volto che si sposta di 2 px per frame
+    (x, y, w, h), = boxes[3]
+    assert abs(x - 46) <= 2 and y == 40 and (w, h) == (80, 80)
+
+def test_face_tracker_without_faces_keeps_the_interval(cascade):
+    tracker = FaceTracker(detect_interval=4)
+    for _ in range(12):
+        assert tracker.update(face_frame(40, 40)) == []
+    assert cascade.calls == 3
+
+def test_face_tracker_redetects_on_lost_track_reset_and_rescale(cascade):
+    tracker = FaceTracker(detect_interval=100, downscale=0.5)
+    cascade.faces = [(20, 20, 40, 40)]
+    tracker.update(face_frame(40, 40))
+    tracker.update(face_frame(40, 40))
+    assert cascade.calls == 1
+
+    # Il volto sparisce: il template non trova più nulla e la cascata riparte subito
+    tracker.update(np.full((240, 320), 90, np.uint8))
+    assert cascade.calls == 2
+
+    tracker.reset()
+    tracker.update(face_frame(40, 40))
+    assert cascade.calls == 3
+    tracker.configure(100, 0.25)
+    cascade.faces = [(10, 10, 20, 20)]
+    assert tracker.update(face_frame(40, 40)) == [(40, 40, 80, 80)]
+    assert cascade.calls == 4
+
+# --- HandTracker ---
+
+RED_RANGE = (np.array([0, 100, 100]), np.array([10, 255, 255]))
+
+def hand_frame(x, y, size=100, color=(0, 0, 200), shape=(480, 640, 3)):
+    """Frame grigio con una "mano" quadrata del colore indicato (BGR) in (x, y)."""
+    frame = np.full(shape, 120, np.uint8)
+    frame[y:y + size, x:x + size] = color
+    return frame
+
+def test_hand_tracker_searches_once_then_follows_with_camshift():
+    tracker, pool = HandTracker(), FrameBufferPool()
+    assert tracker.update(hand_frame(100, 100), pool, RED_RANGE) == (100, 100, 100, 100)
+    for step in range(1, 6):
+        x, y, w, h = tracker.update(hand_frame(100 + 10 * step, 100), pool, RED_RANGE)
+        # CamShift adatta anche la dimensione: conta che il centro segua la mano
+        assert abs(x + w / 2 - (150 + 10 * step)) <= 2 and abs(y + h / 2 - 150) <= 2
+    assert (tracker.full_searches, tracker.roi_frames) == (1, 5)
+
+def test_hand_tracker_falls_back_to_full_search_when_the_hand_is_lost():
+    tracker, pool = HandTracker(), FrameBufferPool()
+    tracker.update(hand_frame(100, 100), pool, RED_RANGE)
+    assert tracker.update(np.full((480, 640, 3), 120, np.uint8), pool, RED_RANGE) is None
+    assert tracker.window is None
+    # La mano ricompare lontano dalla vecchia finestra: la trova la ricerca completa
+    assert tracker.update(hand_frame(500, 300), pool, RED_RANGE) == (500, 300, 100, 100)
+    assert tracker.full_searches == 3
+
+def test_hand_tracker_ignores_small_blobs():
+    tracker = HandTracker(min_area=5000)
+    assert tracker.update(hand_frame(100, 100, size=50), FrameBufferPool(), RED_RANGE) is None
+
+def test_skin_mask_handles_hue_ranges_that_wrap_around():
+    hsv = np.zeros((1, 4, 3), np.uint8)
+    hsv[0, :, 0] = (175, 2, 90, 8)
+    hsv[0, :, 1:] = 200
+    wrap = (np.array([170, 100, 100]), np.array([5, 255, 255]))
+    assert skin_mask(hsv, wrap)[0].tolist() == [255, 255, 0, 0]
+
+# --- SkinMaskLUT e HandDetector ---
+
+def bin_center_frame(bits=5, seed=0):
+    """Frame casuale con i soli centri dei livelli quantizzati, dove la LUT è esatta."""
+    step = 256 >> bits
+    levels = np.random.default_rng(seed).integers(0, 1 << bits, (60, 80, 3))
+    return (levels * step + step // 2).astype(np.uint8)
+
+@pytest.mark.parametrize('color_range', [RED_RANGE, (np.array([170, 80, 60]), np.array([8, 255, 255]))])
+def test_skin_mask_lut_matches_hsv_mask_on_bin_centers(color_range):
+    frame = bin_center_frame()
+    expected = skin_mask(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV), color_range)
+    assert np.array_equal(SkinMaskLUT(color_range).apply(frame), expected)
+
+def test_skin_mask_lut_numpy_fallback_matches_back_projection():
+    frame = np.random.default_rng(1).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+    lut = SkinMaskLUT(RED_RANGE)
+    expected = lut.apply(frame).copy()
+    lut._hist = None
+    assert np.array_equal(lut.apply(frame), expected)
+
+def test_hand_detector_measures_the_lut_only_in_setup(monkeypatch):
+    calls = []
+    monkeypatch.setattr(SkinMaskLUT, 'is_faster', classmethod(lambda cls: calls.append(1) or True))
+    detector = HandDetector(RED_RANGE)
+    detector.set_color_range(RED_RANGE)
+    # Costruzione e cambio di intervallo avvengono nel thread della GUI: nessuna misura
+    assert calls == []
+    detector.setup()
+    assert calls == [1] and detector.use_lut
+
+def test_hand_detector_rebuilds_the_lut_when_the_range_changes():
+    detector = HandDetector(RED_RANGE)
+    detector.use_lut = True
+    first = detector._current_lut(detector.color_range)
+    assert detector._current_lut(detector.color_range) is first
+    green = (np.array([50, 100, 100]), np.array([70, 255, 255]))
+    detector.set_color_range(green)
+    lut = detector._current_lut(detector.color_range)
+    assert lut is not first and lut.color_range is green
+
+# --- MotionGate ---
+
+def scene(box_x=None, size=24, shape=(480, 640, 3)):
+    """Sfondo grigio con rumore fisso e, se indicato, un piccolo quadrato chiaro."""
+    frame = np.random.default_rng(0).integers(100, 110, shape, dtype=np.uint8)
+    if box_x is not None:
+        frame[200:200 + size, box_x:box_x + size] = 240
+    return frame
+
+def test_motion_gate_skips_a_static_scene():
+    gate = MotionGate()
+    assert gate.update(scene(300))
+    assert not gate.update(scene(300))
+    assert not gate.update(scene(300))
+
+def test_motion_gate_detects_a_small_moving_object():
+    gate = MotionGate()
+    gate.update(scene(300))
+    # Il quadrato copre meno dello 0.2% del frame: la differenza media resterebbe sotto 1 livello
+    assert gate.update(scene(340))
+
+def test_motion_gate_ignores_noise_below_the_pixel_threshold():
+    gate = MotionGate()
+    gate.update(scene())
+    assert not gate.update(scene() + 5)
+
+def test_motion_gate_forces_an_analysis_after_max_static_frames():
+    gate = MotionGate(max_static_frames=3)
+    results = [gate.update(scene()) for _ in range(6)]
+    assert results == [True, False, False, False, True, False]
+
+def test_motion_gate_with_zero_threshold_always_analyzes():
+    gate = MotionGate(threshold=0)
+    assert all(gate.update(scene()) for _ in range(3))
+
+# --- Sorgenti di frame ---
+
+def test_synthetic_source_is_repeatable_and_reuses_the_buffer():
+    first, second = SyntheticSource(size=(160, 120), frames=3), SyntheticSource(size=(160, 120), frames=3)
+    assert first.open() and second.open()
+    assert first.frame_shape() == (120, 160, 3)
+    dst = np.empty((120, 160, 3), np.uint8)
+    for _ in range(3):
+        ret, frame = first.read(dst)
+        assert ret and frame is dst
+        assert np.array_equal(frame, second.read()[1])
+    assert first.read() == (False, None)
+
+def test_image_folder_source_reads_in_order_skips_unreadable_files_and_loops(tmp_path):
+    for i, value in enumerate((10, 20, 30)):
+        cv2.imwrite(str(tmp_path / f"{i}.png"), np.full((40, 60, 3), value, np.uint8))
+    (tmp_path / "1b.txt").write_text("non un'immagine")
+    source = ImageFolderSource(str(tmp_path), loop=True)
+    assert source.open() and source.frame_shape() == (40, 60, 3)
+    values = [source.read()[1][0, 0, 0] for _ in range(4)]
+    assert values == [10, 20, 30, 10]
+
+def test_image_folder_source_ends_without_loop(tmp_path):
+    cv2.imwrite(str(tmp_path / "0.png"), np.zeros((8, 8, 3), np.uint8))
+    source = ImageFolderSource(str(tmp_path))
+    assert source.open()
+    assert source.read()[0]
+    assert source.read() == (False, None)
+
+def test_empty_image_folder_does_not_open(tmp_path):
+    assert not ImageFolderSource(str(tmp_path)).open()
+
+def test_frame_source_paces_reads_at_the_requested_fps():
+    source = SyntheticSource(size=(32, 24), fps=100)
+    source.open()
+    start = time.perf_counter()
+    for _ in range(6):
+        source.read()
+    # Il primo frame è immediato, i cinque successivi arrivano ogni 10 ms
+    assert time.perf_counter() - start >= 0.045
+    assert source.decode_ms < 10
+
+def test_open_frame_source_picks_the_source_from_the_spec(tmp_path):
+    assert isinstance(open_frame_source("sintetica"), SyntheticSource)
+    assert open_frame_source("synthetic", realtime=True).fps == 30
+    assert isinstance(open_frame_source(str(tmp_path)), ImageFolderSource)
+    webcam = open_frame_source("1", capture_format={'fps': 30})
+    assert isinstance(webcam, CaptureSource) and webcam.live and webcam.target == 1
+    assert webcam.capture_format == {'fps': 30}
+    video = open_frame_source(str(tmp_path / "video.mp4"), loop=True)
+    assert isinstance(video, CaptureSource) and not video.live and video.loop
+    source = SyntheticSource()
+    assert open_frame_source(source) is source
+
+# --- Livelli della webcam ---
+
+@pytest.fixture(scope='module')
+def qt_app():
+    # I QThread hanno bisogno di un'applicazione Qt viva per tutto il modulo
+    return QCoreApplication.instance() or QCoreApplication([])
+
+class CountingSource(FrameSource):
+    """Sorgente finita che conta letture, grab e richieste di frequenza."""
+
+    def __init__(self, frames, honours_fps=True):
+        super().__init__("Prova")
+        self.frames = frames
+        self.honours_fps = honours_fps
+        self.opened = self.reads = self.grabs = 0
+        self.requested = []
+
+    def open(self):
+        self.opened += 1
+        return True
+
+    def frame_shape(self):
+        return (24, 32, 3)
+
+    def request_fps(self, fps):
+        self.requested.append(fps)
+        return self.honours_fps
+
+    def grab(self):
+        if self.frames == 0:
+            return False
+        self.frames -= 1
+        self.grabs += 1
+        return True
+
+    def _read(self, dst):
+        if self.frames == 0:
+            return False, None
+        self.frames -= 1
+        self.reads += 1
+        return True, np.zeros((24, 32, 3), np.uint8)
+
+def test_analysis_tier_decodes_every_frame(qt_app):
+    source = CountingSource(5)
+    video = VideoThread(source=source)
+    assert video._capture(source)
+    assert source.requested == [None]
+    assert (source.reads, source.grabs, video.frames_grabbed_only) == (5, 0, 0)
+
+def test_background_tier_grabs_frames_without_decoding_when_the_source_throttles(qt_app):
+    source = CountingSource(5)
+    video = VideoThread(source=source)
+    video.set_tier(VideoThread.TIER_BACKGROUND)
+    assert video._capture(source)
+    assert source.requested == [VideoThread.BACKGROUND_FPS]
+    # Solo il primo frame viene decodificato: gli altri arrivano prima del periodo dello sfondo
+    assert (source.reads, source.grabs, video.frames_grabbed_only) == (1, 4, 4)
+
+def test_background_tier_sleeps_when_the_source_ignores_the_fps_request(qt_app):
+    source = CountingSource(2, honours_fps=False)
+    video = VideoThread(source=source)
+    video.set_tier(VideoThread.TIER_BACKGROUND)
+    start = time.perf_counter()
+    assert video._capture(source)
+    # Nessun frame prelevato in anticipo: si attende il periodo dello sfondo
+    assert source.grabs == 0 and source.reads == 2
+    assert time.perf_counter() - start >= 0.9 / VideoThread.BACKGROUND_FPS
+
+def test_off_tier_keeps_the_source_closed_until_the_tier_changes(qt_app):
+    source = CountingSource(3)
+    video = VideoThread(source=source)
+    video.set_tier(VideoThread.TIER_OFF)
+    video.start()
+    time.sleep(0.05)
+    assert source.opened == 0
+    video.set_tier(VideoThread.TIER_ANALYSIS)
+    assert video.wait(2000)
+    assert source.opened == 1 and source.reads == 3
+
+class FakeCapture:
+    """cv2.VideoCapture finto: accetta solo le frequenze in `supported`."""
+
+    def __init__(self, supported):
+        self.supported = supported
+        self.props = {}
+
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_FPS or value in self.supported:
+            self.props[prop] = value
+        return True
+
+    def get(self, prop):
+        return self.props.get(prop, 0)
+
+def test_capture_source_requests_the_fps_from_the_driver():
+    source = CaptureSource(0, capture_format={'fps': 30})
+    source.cap = FakeCapture(supported=(5, 30))
+    assert source.request_fps(5)
+    assert source.cap.get(cv2.CAP_PROP_FPS) == 5
+    # None ripristina la frequenza del formato negoziato
+    assert source.request_fps(None)
+    assert source.cap.get(cv2.CAP_PROP_FPS) == 30
+
+def test_capture_source_reports_when_the_driver_ignores_the_fps():
+    source = CaptureSource(0, capture_format={'fps': 30})
+    source.cap = FakeCapture(supported=(30,))
+    source.cap.set(cv2.CAP_PROP_FPS, 30)
+    assert not source.request_fps(5)
+    assert not CaptureSource("video.mp4").request_fps(5)
+
+# --- LatencyStats ---
+
+def test_latency_stats_summary_keeps_only_the_last_window():
+    stats = LatencyStats(window=100)
+    for ms in range(200):
+        stats.record('analisi', float(ms))
+    summary = stats.summary()['analisi']
+    assert summary['mean'] == pytest.approx(149.5)
+    assert summary['p50'] == pytest.approx(149.5)
+    assert 197 <= summary['p99'] <= 199
+
+def test_latency_stats_histogram_uses_the_fixed_edges_and_an_open_last_class():
+    stats = LatencyStats()
+    for ms in (0.5, 0.5, 3.0, 20.0, 500.0):
+        stats.record('cattura', ms)
+    assert stats.histogram('cattura') == [2, 0, 1, 0, 0, 1, 0, 0, 1]
+    assert stats.histogram('assente') == []
+    assert stats.summary().keys() == {'cattura'}
+
+def test_latency_stats_is_thread_safe():
+    stats = LatencyStats(window=10_000)
+
+    def writer():
+        for _ in range(1000):
+            stats.record('disegno', 1.0)
+
+    threads = [threading.Thread(target=writer) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for _ in range(50):
+        stats.summary()
+    for thread in threads:
+        thread.join()
+    assert sum(stats.histogram('disegno')) == 4000
+
+# --- IdentityTracker ---
+
+def test_tracker_keeps_ids_when_boxes_move_or_swap_order():
+    tracker = IdentityTracker()
+    left, right = tracker.update([(0, 0, 50, 50), (200, 0, 50, 50)])
+    assert (left.id, right.id) == (1, 2)
+
+    # Stesso frame con l'ordine invertito e un piccolo spostamento
+    tracks = tracker.update([(205, 5, 50, 50), (5, 0, 50, 50)])
+    assert [track.id for track in tracks] == [2, 1]
+    assert all(track.hits == 2 for track in tracks)
+
+def test_tracker_matches_fast_moves_by_center_distance():
+    tracker = IdentityTracker()
+    track, = tracker.update([(100, 100, 40, 40)])
+    # I riquadri si sovrappongono poco (IoU ≈ 0.23, sotto la soglia di 0.3):
+    # l'abbinamento avviene per distanza dei centri, spostati di meno di 0.75 riquadri
+    moved, = tracker.update([(125, 100, 40, 40)])
+    assert moved is track
+    far, = tracker.update([(400, 400, 40, 40)])
+    assert far.id != track.id
+
+def test_tracker_smooths_boxes():
+    tracker = IdentityTracker(smoothing=0.5)
+    tracker.update([(0, 0, 40, 40)])
+    track, = tracker.update([(10, 0, 40, 40)])
+    assert track.box == (5, 0, 40, 40)
+
+def test_tracker_forgets_tracks_after_max_missed():
+    tracker = IdentityTracker(max_missed=2)
+    track, = tracker.update([(0, 0, 40, 40)])
+    for _ in range(2):
+        tracker.update([])
+    assert tracker.tracks == [track]
+    tracker.update([])
+    assert tracker.tracks == []
+    again, = tracker.update([(0, 0, 40, 40)])
+    assert again.id != track.id
+
+def test_tracker_reset():
+    tracker = IdentityTracker()
+    tracker.update([(0, 0, 40, 40)])
+    tracker.reset()
+    assert tracker.tracks == []
+
+# --- DetectorScheduler ---
+
+class FakeDetector(Detector):
+    """Rilevatore di prova che conta i frame elaborati."""
+
+    def __init__(self, name, target_fps=15.0, min_fps=2.0):
+        super().__init__()
+        self.name = name
+        self.target_fps = target_fps
+        self.min_fps = min_fps
+        self.enabled = True
+        self.processed = 0
+
+    def process(self, context):
+        self.processed += 1
+
+    def results(self):
+        return {}
+
+def test_scheduler_runs_each_detector_at_its_own_rate():
+    scheduler = DetectorScheduler()
+    fast, slow = FakeDetector('veloce', target_fps=10), FakeDetector('lento', target_fps=2.5)
+    ran = {'veloce': 0, 'lento': 0}
+    for frame in range(30):
+        now = frame / 10
+        for detector in scheduler.plan([fast, slow], now):
+            scheduler.record(detector.name, 1.0, now)
+            ran[detector.name] += 1
+        scheduler.finish(2.0)
+    # Frame ogni 100 ms: il lento (periodo 400 ms) è in attesa un frame su quattro
+    assert ran == {'veloce': 30, 'lento': 8}
+
+def test_scheduler_defers_what_does_not_fit_in_the_budget_latest_first():
+    scheduler = DetectorScheduler(budget_ms=10.0)
+    first, second = FakeDetector('primo'), FakeDetector('secondo')
+    scheduler.cost_ms = {'primo': 8.0, 'secondo': 8.0}
+    scheduler._last_run = {'primo': 0.9, 'secondo': 0.5}
+    # Il secondo è più in ritardo: passa avanti, il primo aspetta il frame successivo
+    assert scheduler.plan([first, second], 1.0) == [second]
+    assert scheduler.deferred == {'primo': 1}
+    # Da solo un rilevatore viene sempre eseguito, anche se supera il budget
+    assert scheduler.plan([first], 1.0) == [first]
+
+def test_scheduler_slows_the_costliest_detector_and_recovers():
+    scheduler = DetectorScheduler(budget_ms=10.0)
+    cheap, costly = FakeDetector('economico'), FakeDetector('costoso', target_fps=15, min_fps=5)
+    scheduler.plan([cheap, costly], 0.0)
+    scheduler.record('economico', 1.0, 0.0)
+    scheduler.record('costoso', 20.0, 0.0)
+    for _ in range(10):
+        scheduler.finish(21.0)
+    assert scheduler.fps == {'economico': 15.0, 'costoso': 5.0}
+    for _ in range(20):
+        scheduler.finish(1.0)
+    assert scheduler.fps['costoso'] == 15.0
+
+def test_analyzer_records_only_the_detectors_that_ran():
+    analyzer = FrameAnalyzer(analysis_budget_ms=10.0)
+    first, second = FakeDetector('primo'), FakeDetector('secondo')
+    analyzer.detectors = [first, second]
+    analyzer.scheduler.cost_ms = {'primo': 8.0, 'secondo': 8.0}
+    analyzer.analyze(scene(300))
+    # Un solo rilevatore sta nel budget: l'altro è rinviato, non eseguito
+    assert first.processed + second.processed == 1
+    assert sum(analyzer.motion_gate.runs.values()) == 1
+    assert analyzer.motion_gate.skips == {}
+    # Scena ferma: il gate salta entrambi
+    analyzer.analyze(scene(300))
+    assert analyzer.motion_gate.skips == {'primo': 1, 'secondo': 1}
@@ -1,99 +1,2061 @@
 # visual_background.py
 
+import abc
 import cv2
 import numpy as np
+import collections
+import glob
 import logging
-from PyQt6.QtCore import QThread, pyqtSignal
-from PyQt6.QtGui import QImage
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from PyQt6.QtCore import QThread, QTimer, pyqtSignal, Qt
+from PyQt6.QtGui import QImage, QPainter, QColor, QPen
+from PyQt6.QtWidgets import QLabel, QWidget
+
+from emotion_classifier import EmotionClassifier
 
 # ==============================================================================
 # Inizializzazione e Configurazione per il Rilevamento Visivo
 # ==============================================================================
 
-# Inizializzazione del classificatore a cascata di Haar per il rilevamento del volto.
+# Classificatore a cascata di Haar per il rilevamento del volto.
 # Il codice per il rilevamento del volto è stato spostato in questo file per
-# incapsulare la logica visiva e renderla un modulo separato.
+# incapsulare la logica visiva e renderla un modulo separato. Viene caricato
+# da load_face_cascade() solo quando il rilevamento del volto viene usato.
 face_cascade = None
-try:
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    logging.info("Classificatore viso caricato correttamente")
-except Exception as e:
-    logging.error(f"Errore nel caricare il classificatore di cascata: {e}")
+_face_cascade_failed = False
+
+def load_face_cascade():
+    """
+    Carica il classificatore a cascata del volto, una sola volta.
+    :return: True se il classificatore è disponibile.
+    """
+    global face_cascade, _face_cascade_failed
+    if face_cascade is None and not _face_cascade_failed:
+        try:
+            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            logging.info("Classificatore viso caricato correttamente")
+        except Exception as e:
+            logging.error(f"Errore nel caricare il classificatore di cascata: {e}")
+            _face_cascade_failed = True
+    return face_cascade is not None
+
+class FaceTracker:
+    """
+    Rilevamento del volto in modalità "rileva e insegui".
+    La cascata di Haar gira su un frame ridotto ogni `detect_interval` frame
+    (o quando l'inseguimento perde confidenza); nei frame intermedi ogni volto
+    viene cercato con template matching solo in una finestra attorno
+    all'ultima posizione nota.
+    """
+
+    def __init__(self, detect_interval=5, downscale=0.5, min_confidence=0.6):
+        self.detect_interval = detect_interval
+        self.downscale = downscale
+        self.min_confidence = min_confidence
+        # Ogni traccia è (box nel frame ridotto, template ridotto del volto)
+        self._tracks = []
+        # Fattore di riduzione con cui sono stati creati i template delle tracce
+        self._tracks_downscale = downscale
+        # Il primo frame esegue subito la cascata
+        self._frames_since_detection = detect_interval
+        self._reset_requested = False
+        self._small = None
+        self.detections = 0
+        self.tracked_frames = 0
+
+    def configure(self, detect_interval, downscale):
+        """
+        Aggiorna intervallo di rilevamento e fattore di riduzione. Può essere
+        chiamato da un altro thread: le tracce non vengono toccate qui, ma
+        scartate all'inizio del prossimo update() se la scala è cambiata.
+        """
+        self.detect_interval = max(1, int(detect_interval))
+        self.downscale = min(1.0, max(0.1, float(downscale)))
+
+    def reset(self):
+        """Dimentica i volti inseguiti, forzando un rilevamento al prossimo frame (da qualunque thread)."""
+        self._reset_requested = True
+
+    def update(self, gray):
+        """
+        Aggiorna i volti sul frame in scala di grigi.
+        :return: Lista di box (x, y, w, h) in coordinate del frame originale.
+        """
+        downscale = self.downscale
+        if self._reset_requested or downscale != self._tracks_downscale:
+            # I template sono nella vecchia scala (o sono stati dimenticati): serve un nuovo rilevamento
+            self._reset_requested = False
+            self._tracks = []
+            self._tracks_downscale = downscale
+            self._frames_since_detection = self.detect_interval
+
+        height, width = gray.shape
+        small_size = (max(1, round(width * downscale)), max(1, round(height * downscale)))
+        if self._small is None or self._small.shape[::-1] != small_size:
+            self._small = np.empty(small_size[::-1], dtype=np.uint8)
+        small = cv2.resize(gray, small_size, dst=self._small, interpolation=cv2.INTER_AREA)
+
+        # Anche senza volti in vista la cascata gira solo ogni detect_interval frame
+        self._frames_since_detection += 1
+        if self._frames_since_detection >= self.detect_interval:
+            self._detect(small)
+        elif self._tracks:
+            if self._track(small):
+                self.tracked_frames += 1
+            else:
+                # Confidenza troppo bassa: si torna subito alla cascata
+                self._detect(small)
+
+        scale = 1.0 / downscale
+        return [(int(x * scale), int(y * scale), int(w * scale), int(h * scale))
+                for (x, y, w, h), _ in self._tracks]
+
+    def _detect(self, small):
+        """Esegue la cascata di Haar sul frame ridotto e rinnova i template."""
+        self._frames_since_detection = 0
+        self.detections += 1
+        faces = face_cascade.detectMultiScale(small, 1.1, 4)
+        self._tracks = [((x, y, w, h), small[y:y + h, x:x + w].copy())
+                        for (x, y, w, h) in faces]
+
+    def _track(self, small):
+        """
+        Cerca ogni template in una finestra attorno alla sua ultima posizione.
+        :return: False se almeno un volto è stato perso.
+        """
+        height, width = small.shape
+        tracks = []
+        for (x, y, w, h), template in self._tracks:
+            margin = max(w, h) // 2
+            x0, y0 = max(0, x - margin), max(0, y - margin)
+            x1, y1 = min(width, x + w + margin), min(height, y + h + margin)
+            if x1 - x0 < w or y1 - y0 < h:
+                return False
+            scores = cv2.matchTemplate(small[y0:y1, x0:x1], template, cv2.TM_CCOEFF_NORMED)
+            _, confidence, _, (dx, dy) = cv2.minMaxLoc(scores)
+            if confidence < self.min_confidence:
+                return False
+            tracks.append(((x0 + dx, y0 + dy, w, h), template))
+        self._tracks = tracks
+        return True
+
+def skin_mask(hsv, color_range, dst=None, scratch=None):
+    """
+    Maschera (0/255) dei pixel HSV nell'intervallo del colore della mano.
+    Se la tinta minima è maggiore di quella massima l'intervallo passa per lo
+    0 (es. il rosso, 170-10) e viene diviso in due inRange uniti.
+    :param scratch: Buffer per la seconda metà di un intervallo che passa per lo 0.
+    """
+    lower, upper = color_range
+    if lower[0] <= upper[0]:
+        return cv2.inRange(hsv, lower, upper, dst=dst)
+    mask = cv2.inRange(hsv, lower, np.array([179, upper[1], upper[2]]), dst=dst)
+    low = cv2.inRange(hsv, np.array([0, lower[1], lower[2]]), upper, dst=scratch)
+    return cv2.bitwise_or(mask, low, dst=mask)
+
+class SkinMaskLUT:
+    """
+    Tabella di lookup BGR quantizzato -> maschera del colore della mano.
+    Viene costruita una sola volta per ogni hand_color_range (convertendo in
+    HSV i centri di tutti i livelli BGR quantizzati e applicando skin_mask), così
+    per ogni frame basta una singola lookup al posto di
+    cvtColor(COLOR_BGR2HSV) + inRange. Non è sempre più veloce: is_faster()
+    lo misura una volta sulla macchina in uso.
+    """
+
+    # Risultato del confronto con la maschera HSV, misurato al primo uso
+    _faster = None
+
+    def __init__(self, color_range, bits=5):
+        self.color_range = color_range
+        self.bits = bits
+        levels = 1 << bits
+        step = 256 >> bits
+        centers = np.arange(levels, dtype=np.uint8) * step + step // 2
+        b, g, r = np.meshgrid(centers, centers, centers, indexing='ij')
+        cube = np.stack([b, g, r], axis=-1).reshape(levels * levels, levels, 3)
+        hsv = cv2.cvtColor(cube, cv2.COLOR_BGR2HSV)
+        self.table = skin_mask(hsv, color_range).reshape(levels, levels, levels)
+        # La lookup vera e propria è una back-projection su un istogramma 3D
+        # binario, eseguita interamente da OpenCV. cv2.Mat serve a non far
+        # interpretare l'ultima dimensione come canali (OpenCV >= 4.6).
+        self._hist = None
+        if hasattr(cv2, 'Mat'):
+            self._hist = cv2.Mat(self.table.astype(np.float32), wrap_channels=False)
+        # Senza cv2.Mat: indice piatto della tabella calcolato in buffer riutilizzati
+        self._flat = self.table.reshape(-1)
+        self._index = None
+        self._scratch = None
+        self._mask = None
+
+    @classmethod
+    def is_faster(cls, shape=(480, 640, 3), repeats=10):
+        """
+        Confronta una volta per processo la lookup con cvtColor + inRange su un
+        frame casuale della risoluzione indicata.
+        :return: True se la lookup è più veloce della maschera HSV.
+        """
+        if cls._faster is None:
+            color_range = (np.array([0, 100, 100]), np.array([10, 255, 255]))
+            frame = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+            hsv = np.empty(shape, dtype=np.uint8)
+            mask = np.empty(shape[:2], dtype=np.uint8)
+            lut = cls(color_range)
+
+            def best_ms(step):
+                step()
+                best = float('inf')
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    step()
+                    best = min(best, time.perf_counter() - start)
+                return best * 1000
+
+            hsv_ms = best_ms(lambda: skin_mask(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=hsv), color_range, dst=mask))
+            lut_ms = best_ms(lambda: lut.apply(frame, dst=mask))
+            cls._faster = lut_ms < hsv_ms
+            logging.info(f"Maschera della mano: HSV {hsv_ms:.2f} ms, lookup {lut_ms:.2f} ms "
+                         f"-> uso {'la lookup' if cls._faster else 'HSV'}")
+        return cls._faster
+
+    def apply(self, frame, dst=None):
+        """Restituisce la maschera (0/255) dei pixel BGR che rientrano nell'intervallo."""
+        if self._hist is not None:
+            return cv2.calcBackProject([frame], [0, 1, 2], self._hist, [0, 256, 0, 256, 0, 256], 1, dst=dst)
+        shape = frame.shape[:2]
+        if self._index is None or self._index.shape != shape:
+            self._index = np.empty(shape, dtype=np.intp)
+            self._scratch = np.empty(shape, dtype=np.intp)
+        if dst is None or dst.shape != shape:
+            if self._mask is None or self._mask.shape != shape:
+                self._mask = np.empty(shape, dtype=np.uint8)
+            dst = self._mask
+        shift = 8 - self.bits
+        index, scratch = self._index, self._scratch
+        np.right_shift(frame[..., 0], shift, out=index)
+        np.left_shift(index, 2 * self.bits, out=index)
+        np.right_shift(frame[..., 1], shift, out=scratch)
+        np.left_shift(scratch, self.bits, out=scratch)
+        np.bitwise_or(index, scratch, out=index)
+        np.right_shift(frame[..., 2], shift, out=scratch)
+        np.bitwise_or(index, scratch, out=index)
+        return np.take(self._flat, index, out=dst, mode='clip')
+
+class HandTracker:
+    """
+    Rilevamento della mano basato sul colore con inseguimento CamShift.
+    Finché la mano non è stata trovata si cerca su tutto il frame (HSV,
+    inRange, contorno più grande; oppure la SkinMaskLUT, se su questa macchina
+    è più veloce); poi si lavora solo su una finestra allargata attorno
+    all'ultimo riquadro, con back-projection dell'istogramma della tinta della
+    mano e CamShift. La ricerca completa riparte solo quando la mano viene persa.
+    """
+
+    # Criterio di arresto di CamShift: 10 iterazioni o spostamento inferiore a 1 pixel
+    TERM_CRITERIA = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 1)
+
+    def __init__(self, min_area=5000, search_margin=0.5):
+        self.min_area = min_area
+        self.search_margin = search_margin
+        self.window = None
+        self._hist = None
+        self.full_searches = 0
+        self.roi_frames = 0
+
+    def reset(self):
+        """Dimentica la mano inseguita: il prossimo frame userà la ricerca completa."""
+        self.window = None
+        self._hist = None
+
+    def update(self, frame, pool, color_range, skin_lut=None):
+        """
+        Aggiorna la posizione della mano.
+        :param pool: FrameBufferPool da cui prendere i buffer della ricerca completa.
+        :param skin_lut: SkinMaskLUT da usare al posto di HSV + inRange nella ricerca completa (opzionale).
+        :return: Box (x, y, w, h) della mano o None.
+        """
+        if self.window is not None:
+            box = self._track(frame, color_range)
+            if box is not None:
+                self.roi_frames += 1
+                return box
+            self.reset()
+        return self._full_search(frame, pool, color_range, skin_lut)
+
+    def _full_search(self, frame, pool, color_range, skin_lut=None):
+        """Cerca la mano su tutto il frame e prepara l'istogramma per CamShift."""
+        self.full_searches += 1
+        mask = pool.get('mask', frame.shape[:2])
+        hsv = None
+        if skin_lut is not None:
+            mask = skin_lut.apply(frame, dst=mask)
+        else:
+            hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=pool.get('hsv', frame.shape))
+            scratch = pool.get('mask_wrap', frame.shape[:2]) if color_range[0][0] > color_range[1][0] else None
+            mask = skin_mask(hsv, color_range, dst=mask, scratch=scratch)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return None
+        max_contour = max(contours, key=cv2.contourArea)
+        if cv2.contourArea(max_contour) <= self.min_area:
+            return None
+
+        x, y, w, h = cv2.boundingRect(max_contour)
+        hsv_box = hsv[y:y + h, x:x + w] if hsv is not None else cv2.cvtColor(frame[y:y + h, x:x + w],
+                                                                               cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv_box], [0], mask[y:y + h, x:x + w], [180], [0, 180])
+        self._hist = cv2.normalize(hist, hist, 0, 255, cv2.NORM_MINMAX)
+        self.window = (x, y, w, h)
+        return self.window
+
+    def _track(self, frame, color_range):
+        """
+        Insegue la mano con CamShift in una finestra attorno all'ultimo riquadro.
+        :return: Il nuovo box, o None se la mano è stata persa.
+        """
+        height, width = frame.shape[:2]
+        x, y, w, h = self.window
+        margin_x, margin_y = int(w * self.search_margin), int(h * self.search_margin)
+        x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+        x1, y1 = min(width, x + w + margin_x), min(height, y + h + margin_y)
+
+        hsv_roi = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2HSV)
+        mask_roi = skin_mask(hsv_roi, color_range)
+        back_projection = cv2.calcBackProject([hsv_roi], [0], self._hist, [0, 180], 1)
+        cv2.bitwise_and(back_projection, mask_roi, dst=back_projection)
+
+        _, (tx, ty, tw, th) = cv2.CamShift(back_projection, (x - x0, y - y0, w, h), self.TERM_CRITERIA)
+        if tw <= 0 or th <= 0 or cv2.countNonZero(mask_roi[ty:ty + th, tx:tx + tw]) <= self.min_area:
+            return None
+        self.window = (x0 + tx, y0 + ty, tw, th)
+        return self.window
+
+class MotionGate:
+    """
+    Gate di movimento a basso costo: confronta una versione molto ridotta del
+    frame con quella dell'ultima analisi e conta i pixel cambiati di più di
+    `pixel_threshold` livelli di grigio. Contare i pixel, invece di fare la
+    media della differenza, fa scattare il gate anche per oggetti piccoli
+    (una mano lontana) che sulla media peserebbero quasi nulla. Se i pixel
+    cambiati restano sotto la soglia, i rilevatori possono riutilizzare i
+    risultati precedenti.
+    """
+
+    def __init__(self, threshold=0.2, width=80, max_static_frames=90, pixel_threshold=15):
+        """
+        :param threshold: Percentuale di pixel cambiati (0-100) oltre la quale c'è movimento.
+                          Con 0 il gate è disattivato e si analizza ogni frame.
+        :param max_static_frames: Dopo quanti frame fermi si forza comunque un'analisi.
+        :param pixel_threshold: Differenza (livelli di grigio, 0-255) oltre la quale un pixel è cambiato;
+                                sopra il rumore della webcam, che la riduzione del frame attenua.
+        """
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.width = width
+        self.max_static_frames = max_static_frames
+        self._small = None
+        self._gray = None
+        self._reference = None
+        self._diff = None
+        self._has_reference = False
+        self._static_frames = 0
+        self.runs = {}
+        self.skips = {}
+
+    def reset(self):
+        """Forza un'analisi al prossimo frame."""
+        self._has_reference = False
+
+    def update(self, frame):
+        """
+        :return: True se la scena è cambiata dall'ultima analisi (o se il gate è disattivato).
+        """
+        if self.threshold <= 0:
+            return True
+        frame_h, frame_w = frame.shape[:2]
+        size = (self.width, max(1, round(self.width * frame_h / frame_w)))
+        if self._small is None or self._small.shape[1::-1] != size:
+            self._small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self._gray = np.empty((size[1], size[0]), dtype=np.uint8)
+            self._reference = np.empty((size[1], size[0]), dtype=np.uint8)
+            self._diff = np.empty((size[1], size[0]), dtype=np.uint8)
+            self._has_reference = False
+        cv2.resize(frame, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+        if self._has_reference and self._static_frames < self.max_static_frames:
+            cv2.absdiff(self._gray, self._reference, dst=self._diff)
+            cv2.threshold(self._diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self._diff)
+            if cv2.countNonZero(self._diff) * 100 < self.threshold * self._diff.size:
+                self._static_frames += 1
+                return False
+        self._static_frames = 0
+        np.copyto(self._reference, self._gray)
+        self._has_reference = True
+        return True
+
+    def record(self, detector, ran):
+        """Conta se un rilevatore è stato eseguito o saltato in questo frame."""
+        counter = self.runs if ran else self.skips
+        counter[detector] = counter.get(detector, 0) + 1
+
+    def skip_ratios(self):
+        """Restituisce, per ogni rilevatore, la frazione di frame saltati."""
+        ratios = {}
+        for detector in set(self.runs) | set(self.skips):
+            runs, skips = self.runs.get(detector, 0), self.skips.get(detector, 0)
+            ratios[detector] = skips / (runs + skips)
+        return ratios
+
+    def log_skip_ratios(self):
+        """Scrive nel log le percentuali di frame saltati per ogni rilevatore."""
+        ratios = self.skip_ratios()
+        if ratios:
+            summary = ", ".join(f"{name} {ratio * 100:.0f}%" for name, ratio in sorted(ratios.items()))
+            logging.info(f"Gate di movimento, frame saltati: {summary}")
+
+class Track:
+    """
+    Oggetto inseguito con un'identità stabile. `box` è il riquadro levigato
+    mostrato all'utente; `state` contiene i risultati costosi calcolati una
+    volta per traccia (es. l'emozione) e riutilizzati nei frame successivi.
+    """
+
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = tuple(int(v) for v in box)
+        self._smoothed = np.array(box, dtype=np.float32)
+        self.hits = 1
+        self.missed = 0
+        self.state = {}
+
+class IdentityTracker:
+    """
+    Assegna identità stabili ai riquadri rilevati frame dopo frame: prima per
+    sovrapposizione (IoU), poi per vicinanza dei centri per i riquadri che si
+    sono spostati molto. Le tracce non più viste per `max_missed` analisi
+    vengono eliminate. I riquadri vengono levigati con una media mobile
+    esponenziale per ridurre il tremolio.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_center_distance=0.75, max_missed=5, smoothing=0.5):
+        """
+        :param max_center_distance: Distanza massima tra i centri, in frazioni della dimensione del riquadro.
+        :param smoothing: Peso del nuovo riquadro nella media mobile (1 = nessuna levigatura).
+        """
+        self.iou_threshold = iou_threshold
+        self.max_center_distance = max_center_distance
+        self.max_missed = max_missed
+        self.smoothing = smoothing
+        self.tracks = []
+        self._next_id = 1
+
+    def reset(self):
+        """Dimentica tutte le tracce."""
+        self.tracks = []
+
+    @staticmethod
+    def _iou(tracks, boxes):
+        """Matrice (tracce, riquadri) delle sovrapposizioni IoU."""
+        a = np.array([track.box for track in tracks], dtype=np.float32)[:, np.newaxis, :]
+        b = np.array(boxes, dtype=np.float32)[np.newaxis, :, :]
+        x0 = np.maximum(a[..., 0], b[..., 0])
+        y0 = np.maximum(a[..., 1], b[..., 1])
+        x1 = np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2])
+        y1 = np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3])
+        intersection = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+        union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - intersection
+        return intersection / np.maximum(union, 1e-6)
+
+    @staticmethod
+    def _center_distance(tracks, boxes):
+        """Matrice (tracce, riquadri) delle distanze tra i centri, relative alla dimensione della traccia."""
+        a = np.array([track.box for track in tracks], dtype=np.float32)[:, np.newaxis, :]
+        b = np.array(boxes, dtype=np.float32)[np.newaxis, :, :]
+        distance = np.hypot((a[..., 0] + a[..., 2] / 2) - (b[..., 0] + b[..., 2] / 2),
+                            (a[..., 1] + a[..., 3] / 2) - (b[..., 1] + b[..., 3] / 2))
+        return distance / np.maximum(np.maximum(a[..., 2], a[..., 3]), 1.0)
+
+    def update(self, boxes):
+        """
+        Associa i riquadri del frame alle tracce esistenti.
+        :return: Lista di Track nello stesso ordine di `boxes`.
+        """
+        boxes = [tuple(box) for box in boxes]
+        assigned = [None] * len(boxes)
+        unmatched_tracks = list(range(len(self.tracks)))
+        if self.tracks and boxes:
+            # Associazione golosa: prima le coppie più sovrapposte, poi le più vicine
+            for scores, better_is_higher, threshold in (
+                    (self._iou(self.tracks, boxes), True, self.iou_threshold),
+                    (self._center_distance(self.tracks, boxes), False, self.max_center_distance)):
+                order = np.argsort(-scores if better_is_higher else scores, axis=None)
+                for t, b in zip(*np.unravel_index(order, scores.shape)):
+                    score = scores[t, b]
+                    if (score < threshold) if better_is_higher else (score > threshold):
+                        break
+                    if assigned[b] is None and t in unmatched_tracks:
+                        assigned[b] = self.tracks[t]
+                        unmatched_tracks.remove(t)
+
+        for index, track in enumerate(assigned):
+            if track is None:
+                track = assigned[index] = Track(self._next_id, boxes[index])
+                self._next_id += 1
+                self.tracks.append(track)
+            else:
+                track._smoothed += self.smoothing * (np.array(boxes[index], dtype=np.float32) - track._smoothed)
+                track.box = tuple(int(round(v)) for v in track._smoothed)
+                track.hits += 1
+                track.missed = 0
+
+        for t in unmatched_tracks:
+            self.tracks[t].missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        return assigned
+
+class FrameSource(abc.ABC):
+    """
+    Sorgente di frame BGR per il VideoThread e per i benchmark. Le sottoclassi
+    implementano _read; con `fps` indicato la lettura viene cadenzata come una
+    webcam, altrimenti i frame vengono restituiti il più velocemente possibile.
+    """
+
+    # True per le sorgenti dal vivo (webcam), che non terminano mai
+    live = False
+
+    def __init__(self, name, fps=None):
+        self.name = name
+        self.fps = fps
+        self._next_frame_time = None
+        # Millisecondi spesi a decodificare l'ultimo frame letto, senza l'attesa del frame
+        self.decode_ms = 0.0
+
+    def open(self):
+        """Prepara la sorgente. :return: False se non è disponibile."""
+        return True
+
+    def frame_shape(self):
+        """Forma (altezza, larghezza, 3) annunciata dei frame, o None se non è nota."""
+        return None
+
+    def read(self, dst=None):
+        """
+        Legge il frame successivo, se possibile dentro `dst`.
+        :return: (ret, frame) come cv2.VideoCapture.read.
+        """
+        if self.fps:
+            now = time.perf_counter()
+            if self._next_frame_time is not None and now < self._next_frame_time:
+                time.sleep(self._next_frame_time - now)
+            self._next_frame_time = max(now, self._next_frame_time or now) + 1.0 / self.fps
+        if not self._wait():
+            return False, None
+        start = time.perf_counter()
+        ret, frame = self._read(dst)
+        self.decode_ms = (time.perf_counter() - start) * 1000
+        return ret, frame
+
+    def _wait(self):
+        """Attende che il prossimo frame sia disponibile. :return: False se non ci sono altri frame."""
+        return True
+
+    @abc.abstractmethod
+    def _read(self, dst):
+        """Legge il frame successivo (già disponibile dopo _wait), se possibile dentro `dst`."""
+
+    def grab(self):
+        """
+        Avanza di un frame senza restituirlo, per i frame che verrebbero comunque scartati.
+        :return: False se non ci sono altri frame.
+        """
+        return self.read()[0]
+
+    def request_fps(self, fps):
+        """
+        Chiede alla sorgente di produrre `fps` frame al secondo (None = la frequenza normale).
+        :return: True se la sorgente rispetterà da sola la frequenza richiesta.
+        """
+        return False
+
+    def release(self):
+        """Rilascia le risorse della sorgente."""
+
+class CaptureSource(FrameSource):
+    """
+    Webcam (indice intero) o file video letti con cv2.VideoCapture.
+    Per la webcam il formato di cattura (risoluzione, FOURCC, fps e profondità
+    del buffer del driver) viene negoziato esplicitamente invece di lasciare i
+    valori predefiniti, che spesso significano YUYV alla massima risoluzione e
+    diversi frame di ritardo accumulati nel driver.
+    """
+
+    # Formati provati da probe(), in ordine di preferenza
+    CAPTURE_CANDIDATES = (
+        {'width': 1280, 'height': 720, 'fourcc': 'MJPG', 'fps': 30, 'buffer_size': 1},
+        {'width': 640, 'height': 480, 'fourcc': 'MJPG', 'fps': 30, 'buffer_size': 1},
+        {'width': 640, 'height': 480, 'fourcc': 'YUYV', 'fps': 30, 'buffer_size': 1},
+    )
+
+    def __init__(self, target=0, loop=False, realtime=False, capture_format=None):
+        """
+        :param loop: Per i file video, ricomincia dall'inizio alla fine del file.
+        :param realtime: Per i file video, riproduce alla frequenza del file invece che alla massima velocità.
+        :param capture_format: Per la webcam, dizionario con width, height, fourcc, fps e buffer_size
+                               (None = da determinare con probe()).
+        """
+        super().__init__("Webcam" if isinstance(target, int) else os.path.basename(target))
+        self.target = target
+        self.live = isinstance(target, int)
+        self.loop = loop
+        self.realtime = realtime
+        self.capture_format = capture_format
+        self.cap = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.target)
+        if not self.cap.isOpened():
+            return False
+        if self.live and self.capture_format:
+            self._apply_format(self.capture_format)
+        if self.realtime and not self.live:
+            self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        return True
+
+    def _apply_format(self, capture_format):
+        """Richiede al driver il formato indicato; i valori non supportati vengono ignorati."""
+        # Il FOURCC va impostato prima della risoluzione: alcuni driver la limitano in base al formato
+        if capture_format.get('fourcc'):
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*capture_format['fourcc']))
+        if capture_format.get('width') and capture_format.get('height'):
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, capture_format['width'])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, capture_format['height'])
+        if capture_format.get('fps'):
+            self.cap.set(cv2.CAP_PROP_FPS, capture_format['fps'])
+        if capture_format.get('buffer_size'):
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, capture_format['buffer_size'])
+
+    def negotiated_format(self):
+        """Restituisce il formato effettivamente accettato dal driver."""
+        code = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        fourcc = "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip("\x00 ")
+        return {
+            'width': int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fourcc': fourcc,
+            'fps': round(self.cap.get(cv2.CAP_PROP_FPS)),
+            'buffer_size': int(self.cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+        }
+
+    def probe(self, frames=20, warmup=5):
+        """
+        Prova brevemente i CAPTURE_CANDIDATES sulla webcam aperta e sceglie il
+        primo che raggiunge almeno il 90% degli fps richiesti (o, se nessuno ci
+        riesce, il più veloce). Il formato scelto resta applicato.
+        :return: Il formato negoziato, da salvare in settings.json.
+        """
+        best, best_fps = None, 0.0
+        for candidate in self.CAPTURE_CANDIDATES:
+            self._apply_format(candidate)
+            for _ in range(warmup):
+                self.cap.grab()
+            start = time.perf_counter()
+            read = 0
+            for _ in range(frames):
+                if self.cap.read()[0]:
+                    read += 1
+            measured_fps = read / (time.perf_counter() - start)
+            negotiated = self.negotiated_format()
+            logging.info(f"Webcam: {negotiated['fourcc']} {negotiated['width']}x{negotiated['height']} "
+                         f"-> {measured_fps:.1f} fps misurati")
+            if read and measured_fps >= 0.9 * candidate['fps']:
+                best = candidate
+                break
+            if measured_fps > best_fps:
+                best, best_fps = candidate, measured_fps
+        self.capture_format = best or self.CAPTURE_CANDIDATES[-1]
+        self._apply_format(self.capture_format)
+        return self.negotiated_format()
+
+    def request_fps(self, fps):
+        """Per la webcam, cambia la frequenza del driver (CAP_PROP_FPS) senza riaprirla."""
+        if not self.live or self.cap is None:
+            return False
+        target = fps or (self.capture_format or {}).get('fps')
+        if not target:
+            return False
+        self.cap.set(cv2.CAP_PROP_FPS, target)
+        return round(self.cap.get(cv2.CAP_PROP_FPS)) == round(target)
+
+    def grab(self):
+        if self.fps:
+            return self.read()[0]
+        ret = self.cap.grab()
+        if not ret and self.loop and not self.live:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret = self.cap.grab()
+        return ret
+
+    def frame_shape(self):
+        return (int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+
+    def _wait(self):
+        # grab() attende il frame dal driver; la decodifica avviene solo in retrieve()
+        ret = self.cap.grab()
+        if not ret and self.loop and not self.live:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret = self.cap.grab()
+        return ret
+
+    def _read(self, dst):
+        return self.cap.retrieve(dst)
+
+    def release(self):
+        if self.cap:
+            self.cap.release()
+
+class ImageFolderSource(FrameSource):
+    """Cartella di immagini registrate, lette in ordine alfabetico."""
+
+    def __init__(self, path, loop=False, fps=None):
+        super().__init__(os.path.basename(os.path.normpath(path)), fps)
+        self.path = path
+        self.loop = loop
+        self.files = []
+        self._position = 0
+
+    def open(self):
+        self.files = sorted(f for f in glob.glob(os.path.join(self.path, '*')) if os.path.isfile(f))
+        self._position = 0
+        return bool(self.files)
+
+    def frame_shape(self):
+        frame = cv2.imread(self.files[0]) if self.files else None
+        return frame.shape if frame is not None else None
+
+    def _read(self, dst):
+        while self._position < len(self.files) or (self.loop and self.files):
+            if self._position >= len(self.files):
+                self._position = 0
+            frame = cv2.imread(self.files[self._position])
+            self._position += 1
+            if frame is None:
+                continue
+            if dst is not None and dst.shape == frame.shape:
+                np.copyto(dst, frame)
+                return True, dst
+            return True, frame
+        return False, None
+
+class SyntheticSource(FrameSource):
+    """
+    Frame sintetici ripetibili: sfondo a rumore sfocato con una macchia del
+    colore della mano che si muove, così anche i rilevatori hanno lavoro da
+    fare senza webcam né registrazioni.
+    """
+
+    def __init__(self, size=(1280, 720), frames=None, fps=None, seed=0):
+        """
+        :param size: (larghezza, altezza) dei frame.
+        :param frames: Numero di frame da generare (None = infiniti).
+        """
+        super().__init__("Sintetica", fps)
+        self.size = size
+        self.frames = frames
+        self.seed = seed
+        self._background = None
+        self._count = 0
+
+    def open(self):
+        width, height = self.size
+        rng = np.random.default_rng(self.seed)
+        noise = rng.integers(0, 256, (max(1, height // 20), max(1, width // 20), 3), dtype=np.uint8)
+        self._background = cv2.resize(noise, self.size, interpolation=cv2.INTER_CUBIC)
+        self._count = 0
+        return True
+
+    def frame_shape(self):
+        return (self.size[1], self.size[0], 3)
+
+    def _read(self, dst):
+        if self.frames is not None and self._count >= self.frames:
+            return False, None
+        frame = dst if dst is not None and dst.shape == self._background.shape else np.empty_like(self._background)
+        np.copyto(frame, self._background)
+        width, height = self.size
+        angle = self._count * 0.05
+        center = (int(width * (0.5 + 0.3 * np.cos(angle))), int(height * (0.5 + 0.3 * np.sin(angle))))
+        cv2.ellipse(frame, center, (width // 12, height // 7), 0, 0, 360, (40, 40, 200), -1)
+        self._count += 1
+        return True, frame
+
+def open_frame_source(spec=0, loop=False, realtime=False, capture_format=None):
+    """
+    Crea la sorgente di frame indicata da `spec`: un indice di webcam (intero
+    o stringa numerica), "sintetica", una cartella di immagini o un file video.
+    :param capture_format: Formato di cattura salvato per la webcam (vedi CaptureSource).
+    """
+    if isinstance(spec, FrameSource):
+        return spec
+    if isinstance(spec, str) and spec.isdigit():
+        spec = int(spec)
+    if isinstance(spec, int):
+        return CaptureSource(spec, capture_format=capture_format)
+    if spec in ("sintetica", "synthetic"):
+        return SyntheticSource(fps=30 if realtime else None)
+    if os.path.isdir(spec):
+        return ImageFolderSource(spec, loop=loop, fps=30 if realtime else None)
+    return CaptureSource(spec, loop=loop, realtime=realtime)
+
+def expanding_crop(frame_w, frame_h, out_w, out_h):
+    """
+    Ritaglio centrale del frame con le stesse proporzioni della destinazione
+    (equivalente a KeepAspectRatioByExpanding).
+    :return: (x0, y0, larghezza, altezza) del ritaglio in pixel del frame.
+    """
+    scale = max(out_w / frame_w, out_h / frame_h)
+    crop_w = min(frame_w, max(1, round(out_w / scale)))
+    crop_h = min(frame_h, max(1, round(out_h / scale)))
+    return (frame_w - crop_w) // 2, (frame_h - crop_h) // 2, crop_w, crop_h
+
+class LatencyStats:
+    """
+    Latenze recenti (ms) di ogni stadio della pipeline video, dalla cattura al
+    disegno sullo schermo. Ogni stadio tiene gli ultimi `window` campioni, da
+    cui si ricavano media, percentili e istogramma. Thread-safe: scrivono il
+    thread video, quello di analisi e la GUI.
+    """
+
+    # Limiti (ms) delle classi dell'istogramma; l'ultima classe è aperta
+    HISTOGRAM_EDGES_MS = (0, 1, 2, 4, 8, 16, 33, 66, 133)
+
+    def __init__(self, window=300):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, stage, ms):
+        """Aggiunge un campione (ms) allo stadio indicato."""
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = collections.deque(maxlen=self.window)
+            samples.append(ms)
+
+    def _snapshot(self):
+        with self._lock:
+            return {stage: np.array(samples) for stage, samples in self._samples.items() if samples}
+
+    def summary(self):
+        """Restituisce, per ogni stadio, media, p50 e p99 in ms."""
+        return {stage: {'mean': float(samples.mean()),
+                        'p50': float(np.percentile(samples, 50)),
+                        'p99': float(np.percentile(samples, 99))}
+                for stage, samples in self._snapshot().items()}
+
+    def histogram(self, stage):
+        """Conteggi dei campioni di `stage` nelle classi di HISTOGRAM_EDGES_MS."""
+        samples = self._snapshot().get(stage)
+        if samples is None:
+            return []
+        edges = list(self.HISTOGRAM_EDGES_MS) + [max(self.HISTOGRAM_EDGES_MS[-1], samples.max()) + 1]
+        return np.histogram(samples, bins=edges)[0].tolist()
+
+    def log_summary(self):
+        """Scrive nel log le latenze di ogni stadio."""
+        for stage, values in self.summary().items():
+            logging.info(f"Latenza {stage}: media {values['mean']:.1f} ms, "
+                         f"p50 {values['p50']:.1f} ms, p99 {values['p99']:.1f} ms, "
+                         f"istogramma {self.histogram(stage)}")
+
+class PooledFrame:
+    """
+    Buffer di uscita riutilizzabile: l'array BGR e il QImage che lo avvolge
+    vengono creati una sola volta, così il QImage vive quanto il buffer e
+    nessun frame viene copiato per essere disegnato.
+    """
+
+    def __init__(self, height, width):
+        self.pixels = np.empty((height, width, 3), dtype=np.uint8)
+        self.image = QImage(self.pixels.data, width, height, self.pixels.strides[0],
+                            QImage.Format.Format_BGR888)
+        # Istanti (time.perf_counter) di cattura e di deposito nella mailbox del frame contenuto
+        self.capture_time = 0.0
+        self.post_time = 0.0
+
+    @property
+    def shape(self):
+        return self.pixels.shape
+
+class FrameBufferPool:
+    """
+    Buffer di lavoro preallocati per il ciclo di elaborazione video, dimensionati
+    sulla risoluzione negoziata con la webcam. Ogni passo OpenCV scrive nel
+    proprio buffer tramite dst=, così a regime non si alloca nulla.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self.allocations = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        """Restituisce il buffer `name`, (ri)allocandolo solo se la forma è cambiata."""
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != tuple(shape):
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buffer
+            self.allocations += 1
+            logging.info(f"Buffer video '{name}' allocato: {shape[1]}x{shape[0]}")
+        return buffer
+
+class FrameMailbox:
+    """
+    Casella a slot singolo ("vince l'ultimo frame") tra due stadi della pipeline
+    video, ad esempio tra il VideoThread e la GUI. Chi produce sovrascrive il
+    frame in attesa invece di accodarlo, mentre chi consuma lo preleva solo
+    quando è pronto: in questo modo la latenza resta di un frame anche sotto carico.
+    """
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._frame = None
+        # Buffer già allocati e non più in uso, riutilizzati dal produttore
+        self._spare = []
+        self._interrupted = False
+        self.frames_posted = 0
+        self.frames_dropped = 0
+        self.frames_shown = 0
+
+    def post(self, frame):
+        """
+        Deposita un nuovo frame, scartando quello eventualmente non ancora letto.
+        :return: True se lo slot era vuoto, cioè se il consumatore va notificato.
+        """
+        with self._lock:
+            was_empty = self._frame is None
+            if not was_empty:
+                self.frames_dropped += 1
+                self._spare.append(self._frame)
+            self._frame = frame
+            self.frames_posted += 1
+            self._lock.notify()
+            return was_empty
+
+    def take(self, timeout=None, block=False):
+        """
+        Preleva il frame in attesa (o None se non ce ne sono di nuovi).
+        :param timeout: Se indicato, attende al massimo questi secondi un nuovo frame.
+        :param block: Se True attende senza limiti un nuovo frame o una chiamata a interrupt().
+        """
+        with self._lock:
+            if block:
+                while self._frame is None and not self._interrupted:
+                    self._lock.wait()
+            elif self._frame is None and timeout is not None:
+                self._lock.wait(timeout)
+            frame, self._frame = self._frame, None
+            if frame is not None:
+                self.frames_shown += 1
+            return frame
+
+    def interrupt(self):
+        """Sveglia per sempre il consumatore in attesa in take(block=True), ad esempio per fermarlo."""
+        with self._lock:
+            self._interrupted = True
+            self._lock.notify_all()
+
+    def has_pending(self):
+        """True se c'è un frame depositato e non ancora prelevato."""
+        with self._lock:
+            return self._frame is not None
+
+    def acquire(self, shape):
+        """
+        Restituisce un buffer libero della forma richiesta, o None se non ce ne sono.
+        I buffer di dimensione diversa (es. dopo un ridimensionamento) vengono scartati.
+        """
+        with self._lock:
+            while self._spare:
+                buffer = self._spare.pop()
+                if buffer.shape == tuple(shape):
+                    return buffer
+            return None
+
+    def release(self, frame):
+        """Restituisce alla mailbox un frame che il consumatore ha smesso di usare."""
+        with self._lock:
+            self._spare.append(frame)
+
+    def stats(self):
+        """Restituisce i contatori di frame inviati, scartati e mostrati."""
+        with self._lock:
+            return {
+                'posted': self.frames_posted,
+                'dropped': self.frames_dropped,
+                'shown': self.frames_shown,
+            }
+
+class DetectionResults:
+    """
+    Risultati di un'analisi, pubblicati dallo stadio di analisi e inviati
+    all'overlay della GUI. L'oggetto non viene mai modificato dopo la pubblicazione.
+    I riquadri sono in pixel del frame (già specchiato) di dimensione frame_size.
+    """
+
+    def __init__(self, faces=(), hand=None, frame_index=0, frame_size=None, emotions=(), face_ids=(), hand_id=None):
+        self.faces = [tuple(face) for face in faces]
+        # Identità stabile ed emozione di ogni volto (stesso ordine di faces; None se non note)
+        self.face_ids = list(face_ids) + [None] * (len(self.faces) - len(face_ids))
+        self.emotions = list(emotions) + [None] * (len(self.faces) - len(emotions))
+        self.hand = tuple(hand) if hand is not None else None
+        self.hand_id = hand_id
+        self.frame_index = frame_index
+        # (larghezza, altezza) del frame analizzato
+        self.frame_size = frame_size
+
+    def same_boxes(self, other):
+        """True se `other` contiene gli stessi riquadri (l'overlay non va ridisegnato)."""
+        return (other is not None and self.faces == other.faces and self.hand == other.hand
+                and self.emotions == other.emotions and self.frame_size == other.frame_size)
+
+class FrameContext:
+    """
+    Dati di un frame condivisi dai rilevatori che lo elaborano, calcolati solo
+    la prima volta che servono (es. la conversione in scala di grigi).
+    """
+
+    def __init__(self, frame, pool):
+        self.frame = frame
+        self.pool = pool
+        self._gray = None
+
+    def gray(self):
+        """Frame in scala di grigi, in un buffer del pool."""
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY,
+                                      dst=self.pool.get('gray', self.frame.shape[:2]))
+        return self._gray
+
+class Detector(abc.ABC):
+    """
+    Interfaccia comune dei rilevatori della pipeline video. Ogni rilevatore
+    dichiara il proprio nome, le chiavi dei risultati che produce
+    (RESULT_SCHEMA, con i valori usati quando è spento), la frequenza
+    desiderata e il gruppo, cioè il processo in cui gira nell'analisi
+    multiprocesso. Modelli e risorse vengono caricati da setup() solo al
+    primo frame elaborato.
+    """
+
+    name = None
+    group = None
+    RESULT_SCHEMA = {}
+    # Analisi al secondo desiderate e minime a cui il DetectorScheduler può scendere
+    target_fps = 15.0
+    min_fps = 2.0
+
+    def __init__(self):
+        self.enabled = False
+        self.is_set_up = False
+
+    @property
+    def available(self):
+        """False se il rilevatore non può funzionare (es. modello mancante)."""
+        return True
+
+    def ensure_setup(self):
+        """Esegue setup() la prima volta. :return: True se il rilevatore è disponibile."""
+        if not self.is_set_up:
+            start = time.perf_counter()
+            self.setup()
+            self.is_set_up = True
+            logging.info(f"Rilevatore '{self.name}' pronto in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return self.available
+
+    def setup(self):
+        """Carica modelli e risorse del rilevatore."""
+
+    @abc.abstractmethod
+    def process(self, context):
+        """
+        Elabora un frame aggiornando lo stato del rilevatore.
+        :param context: FrameContext del frame.
+        """
+
+    def results(self):
+        """Ultimi risultati come valori semplici, con le chiavi di RESULT_SCHEMA."""
+        return dict(self.RESULT_SCHEMA)
+
+    def reset(self):
+        """Dimentica lo stato, ad esempio quando il rilevatore viene spento."""
+
+    def log_stats(self):
+        """Scrive nel log le statistiche proprie del rilevatore."""
+
+class FaceDetector(Detector):
+    """Volti con il FaceTracker (rileva e insegui) e identità stabili per ogni volto."""
+
+    name = "volto"
+    group = "volto"
+    RESULT_SCHEMA = {'faces': [], 'face_ids': []}
+
+    def __init__(self, detect_interval=5, downscale=0.5):
+        super().__init__()
+        self.tracker = FaceTracker(detect_interval, downscale)
+        self.identities = IdentityTracker()
+        self.tracks = []
+
+    @property
+    def available(self):
+        return not _face_cascade_failed
+
+    def setup(self):
+        load_face_cascade()
+
+    def process(self, context):
+        self.tracks = self.identities.update(self.tracker.update(context.gray()))
+
+    def results(self):
+        return {'faces': [track.box for track in self.tracks],
+                'face_ids': [track.id for track in self.tracks]}
+
+    def reset(self):
+        self.tracker.reset()
+        self.identities.reset()
+        self.tracks = []
+
+    def log_stats(self):
+        if self.tracker.detections:
+            logging.info(f"Volto: {self.tracker.detections} rilevamenti con la cascata, "
+                         f"{self.tracker.tracked_frames} frame inseguiti.")
+
+class EmotionDetector(Detector):
+    """
+    Emozione di ogni volto inseguito dal FaceDetector. L'etichetta resta nello
+    stato della traccia, così vale anche nei frame in cui non viene ricalcolata.
+    """
+
+    name = "emozioni"
+    group = "volto"
+    RESULT_SCHEMA = {'emotions': []}
+    target_fps = 5.0
+    min_fps = 0.5
+
+    def __init__(self, face_detector, cache_interval=1.0):
+        super().__init__()
+        self.face_detector = face_detector
+        self.classifier = EmotionClassifier(cache_interval=cache_interval)
+
+    @property
+    def available(self):
+        return self.classifier.available
+
+    def setup(self):
+        self.classifier.load()
+
+    def process(self, context):
+        tracks = self.face_detector.tracks
+        labels = self.classifier.classify(context.gray(), [track.box for track in tracks],
+                                          keys=[track.id for track in tracks])
+        for track, label in zip(tracks, labels):
+            if label is not None:
+                track.state['emozione'] = label
+
+    def results(self):
+        return {'emotions': [track.state.get('emozione') for track in self.face_detector.tracks]}
+
+class HandDetector(Detector):
+    """Mano basata sul colore, con inseguimento CamShift e identità stabile."""
+
+    name = "mano"
+    group = "mano"
+    RESULT_SCHEMA = {'hand': None, 'hand_id': None}
+
+    def __init__(self, hand_color_range):
+        super().__init__()
+        self.tracker = HandTracker()
+        self.identities = IdentityTracker()
+        self.track = None
+        # Deciso da setup() nel thread (o processo) di analisi, non alla costruzione
+        self.use_lut = False
+        self.skin_lut = None
+        self.set_color_range(hand_color_range)
+
+    def setup(self):
+        # Il confronto LUT/HSV è misurato una sola volta per processo e mai nel thread della GUI
+        self.use_lut = SkinMaskLUT.is_faster()
+
+    def set_color_range(self, hand_color_range):
+        """
+        Cambia l'intervallo HSV del colore della mano. Può essere chiamato dal
+        thread della GUI: si assegna solo l'intervallo, mentre la tabella di
+        lookup viene ricostruita dal thread di analisi al frame successivo.
+        """
+        self.color_range = hand_color_range
+        self.tracker.reset()
+
+    def _current_lut(self, color_range):
+        """Tabella di lookup per `color_range`, ricostruita solo quando l'intervallo cambia."""
+        if not self.use_lut:
+            return None
+        if self.skin_lut is None or self.skin_lut.color_range is not color_range:
+            self.skin_lut = SkinMaskLUT(color_range)
+        return self.skin_lut
+
+    def process(self, context):
+        # Una sola lettura dell'intervallo: tabella e maschera HSV usano sempre lo stesso
+        color_range = self.color_range
+        hand = self.tracker.update(context.frame, context.pool, color_range, self._current_lut(color_range))
+        tracks = self.identities.update([hand] if hand is not None else [])
+        self.track = tracks[0] if tracks else None
+
+    def results(self):
+        if self.track is None:
+            return dict(self.RESULT_SCHEMA)
+        return {'hand': self.track.box, 'hand_id': self.track.id}
+
+    def reset(self):
+        self.tracker.reset()
+        self.identities.reset()
+        self.track = None
+
+    def log_stats(self):
+        if self.tracker.full_searches:
+            logging.info(f"Mano: {self.tracker.full_searches} ricerche complete, "
+                         f"{self.tracker.roi_frames} frame inseguiti con CamShift.")
+
+class DetectorScheduler:
+    """
+    Decide quali rilevatori eseguire su ogni frame. Ogni rilevatore gira alla
+    propria frequenza; se un frame costa più di `budget_ms`, la frequenza del
+    rilevatore che pesa di più viene ridotta (fino alla sua minima) e risale
+    gradualmente quando torna il margine. Se i rilevatori in attesa non stanno
+    tutti nel budget, i più in ritardo hanno la precedenza e gli altri passano
+    al frame successivo.
+    """
+
+    # Moltiplicatori della frequenza quando il budget viene superato o c'è margine
+    BACKOFF = 0.7
+    RECOVERY = 1.1
+    # Frazione del budget sotto la quale le frequenze possono risalire
+    HEADROOM = 0.6
+    # Un rilevatore è in attesa quando è passato almeno questo multiplo del suo periodo
+    DUE_TOLERANCE = 0.8
+
+    def __init__(self, budget_ms=25.0):
+        """
+        :param budget_ms: Tempo massimo dei rilevatori per ogni frame analizzato.
+        """
+        self.budget_ms = budget_ms
+        # nome -> frequenza attuale, (minima, desiderata), ultima esecuzione, costo medio in ms
+        self.fps = {}
+        self._limits = {}
+        self._last_run = {}
+        self.cost_ms = {}
+        self.runs = {}
+        self.deferred = {}
+        self._ran = []
+
+    def plan(self, detectors, now):
+        """
+        :param detectors: Rilevatori abilitati, nell'ordine in cui vanno eseguiti.
+        :return: Rilevatori da eseguire su questo frame, nello stesso ordine.
+        """
+        due = []
+        for index, detector in enumerate(detectors):
+            name = detector.name
+            self._limits[name] = (detector.min_fps, detector.target_fps)
+            fps = self.fps.setdefault(name, detector.target_fps)
+            last_run = self._last_run.get(name)
+            lateness = float('inf') if last_run is None else (now - last_run) * fps
+            if lateness >= self.DUE_TOLERANCE:
+                due.append((lateness, index, detector))
+
+        planned, estimate = [], 0.0
+        for _, index, detector in sorted(due, key=lambda item: (-item[0], item[1])):
+            cost = self.cost_ms.get(detector.name, 0.0)
+            if planned and estimate + cost > self.budget_ms:
+                self.deferred[detector.name] = self.deferred.get(detector.name, 0) + 1
+                continue
+            planned.append((index, detector))
+            estimate += cost
+        self._ran = []
+        return [detector for _, detector in sorted(planned, key=lambda item: item[0])]
+
+    def record(self, name, ms, now):
+        """Registra il costo di un'esecuzione."""
+        self._last_run[name] = now
+        cost = self.cost_ms.get(name)
+        self.cost_ms[name] = ms if cost is None else 0.8 * cost + 0.2 * ms
+        self.runs[name] = self.runs.get(name, 0) + 1
+        self._ran.append(name)
+
+    def finish(self, spent_ms):
+        """Adatta le frequenze al tempo speso dai rilevatori nel frame."""
+        if not self._ran:
+            return
+        if spent_ms > self.budget_ms:
+            # Si rallenta il rilevatore che costa di più al secondo
+            name = max(self._ran, key=lambda ran: self.cost_ms[ran] * self.fps[ran])
+            min_fps = self._limits[name][0]
+            if self.fps[name] > min_fps:
+                self.fps[name] = max(min_fps, self.fps[name] * self.BACKOFF)
+                logging.debug(f"Budget di analisi superato ({spent_ms:.1f} ms): "
+                              f"'{name}' rallentato a {self.fps[name]:.1f} fps")
+        elif spent_ms < self.budget_ms * self.HEADROOM:
+            for name in self._ran:
+                self.fps[name] = min(self._limits[name][1], self.fps[name] * self.RECOVERY)
+
+    def log_stats(self):
+        """Scrive nel log il costo reale e la frequenza attuale di ogni rilevatore."""
+        if not self.runs:
+            return
+        summary = ", ".join(f"{name} {self.cost_ms[name]:.1f} ms a {self.fps[name]:.1f}/"
+                            f"{self._limits[name][1]:.0f} fps ({self.runs[name]} esecuzioni, "
+                            f"{self.deferred.get(name, 0)} rinviate)" for name in sorted(self.runs))
+        logging.info(f"Rilevatori (budget {self.budget_ms:.0f} ms per frame): {summary}")
+
+class FrameAnalyzer:
+    """
+    Stadio di analisi della pipeline video: gate di movimento e rilevatori
+    (volto, emozioni, mano) eseguiti dal DetectorScheduler entro un budget di
+    tempo per frame. Lavora su frame propri, copiati dal thread di cattura,
+    quindi può andare a una frequenza diversa.
+    """
+
+    def __init__(self, face_detection_enabled=False, hand_detection_enabled=False, hand_color_range=None,
+                 face_detect_interval=5, face_detect_scale=0.5, motion_threshold=0.2, emotion_interval=1.0,
+                 analysis_budget_ms=25.0, group=None):
+        """
+        :param analysis_budget_ms: Tempo massimo dei rilevatori per ogni frame analizzato.
+        :param group: Se indicato, esegue solo i rilevatori di quel gruppo (processi di analisi).
+        """
+        # Impostazione predefinita per il rilevamento del colore della mano
+        hand_color_range = hand_color_range if hand_color_range else (np.array([0, 100, 100]), np.array([10, 255, 255]))
+        self.face_detector = FaceDetector(face_detect_interval, face_detect_scale)
+        # Il modello ONNX viene caricato solo al primo frame con un volto da classificare
+        self.emotion_detector = EmotionDetector(self.face_detector, emotion_interval)
+        self.hand_detector = HandDetector(hand_color_range)
+        # Ordine di esecuzione: le emozioni usano i volti appena aggiornati
+        self.detectors = [self.face_detector, self.emotion_detector, self.hand_detector]
+        # Rilevatori attivi al frame precedente, da azzerare quando vengono spenti
+        self._was_active = set()
+        self.group = group
+        self.face_detection_enabled = face_detection_enabled
+        self.hand_detection_enabled = hand_detection_enabled
+        self.scheduler = DetectorScheduler(analysis_budget_ms)
+        self.motion_gate = MotionGate(motion_threshold)
+        self.pool = FrameBufferPool()
+        # Durata in ms di ogni passo dell'ultima analisi
+        self.stage_ms = {}
+
+    # Componenti dei rilevatori configurati direttamente dalle impostazioni
+    @property
+    def face_tracker(self):
+        return self.face_detector.tracker
+
+    @property
+    def emotion_classifier(self):
+        return self.emotion_detector.classifier
+
+    @property
+    def hand_color_range(self):
+        return self.hand_detector.color_range
+
+    @property
+    def face_detection_enabled(self):
+        return self.face_detector.enabled
+
+    @face_detection_enabled.setter
+    def face_detection_enabled(self, enabled):
+        # Le emozioni seguono il rilevamento del volto (genitore empatico)
+        self.face_detector.enabled = self.emotion_detector.enabled = enabled
+
+    @property
+    def hand_detection_enabled(self):
+        return self.hand_detector.enabled
+
+    @hand_detection_enabled.setter
+    def hand_detection_enabled(self, enabled):
+        self.hand_detector.enabled = enabled
+
+    @property
+    def enabled(self):
+        """True se almeno un rilevatore è attivo."""
+        return self.face_detection_enabled or self.hand_detection_enabled
+
+    def set_hand_color_range(self, lower, upper):
+        """Cambia l'intervallo HSV del colore della mano."""
+        self.hand_detector.set_color_range((np.array(lower), np.array(upper)))
+
+    def settings(self):
+        """Impostazioni dei rilevatori come valori semplici, da inviare ai processi di analisi."""
+        return {
+            'face_detection_enabled': self.face_detection_enabled,
+            'hand_detection_enabled': self.hand_detection_enabled,
+            'hand_color_range': [r.tolist() for r in self.hand_color_range],
+            'face_detect_interval': self.face_tracker.detect_interval,
+            'face_detect_scale': self.face_tracker.downscale,
+            'motion_threshold': self.motion_gate.threshold,
+            'emotion_interval': self.emotion_classifier.cache_interval,
+            'analysis_budget_ms': self.scheduler.budget_ms,
+        }
+
+    def apply_settings(self, settings):
+        """Applica le impostazioni prodotte da settings(), ricostruendo solo ciò che è cambiato."""
+        self.face_detection_enabled = settings['face_detection_enabled']
+        self.hand_detection_enabled = settings['hand_detection_enabled']
+        if settings['hand_color_range'] != [r.tolist() for r in self.hand_color_range]:
+            self.set_hand_color_range(*settings['hand_color_range'])
+        if (settings['face_detect_interval'], settings['face_detect_scale']) != \
+                (self.face_tracker.detect_interval, self.face_tracker.downscale):
+            self.face_tracker.configure(settings['face_detect_interval'], settings['face_detect_scale'])
+        self.motion_gate.threshold = settings['motion_threshold']
+        self.emotion_classifier.cache_interval = settings['emotion_interval']
+        self.scheduler.budget_ms = settings['analysis_budget_ms']
+
+    def _active_detectors(self):
+        """Rilevatori da considerare per il frame; quelli appena spenti vengono azzerati una volta."""
+        active = []
+        for detector in self.detectors:
+            in_group = self.group is None or detector.group == self.group
+            if in_group and detector.enabled and detector.ensure_setup():
+                active.append(detector)
+            elif detector in self._was_active:
+                detector.reset()
+        self._was_active = set(active)
+        return active
+
+    def analyze(self, frame):
+        """
+        Esegue i rilevatori abilitati che il DetectorScheduler ritiene in attesa.
+        Se il gate di movimento indica una scena ferma, i risultati del frame
+        precedente vengono riutilizzati e i rilevatori non vengono eseguiti.
+        I tempi di ogni passo (ms) restano in self.stage_ms per i benchmark:
+        un rilevatore vi compare solo se è stato eseguito davvero, così i frame
+        saltati dal gate non abbassano la media del suo costo.
+        :return: True se almeno un rilevatore ha potuto elaborare il frame.
+        """
+        stage_ms = self.stage_ms
+        stage_ms.clear()
+        active = self._active_detectors()
+        if not active:
+            self.motion_gate.reset()
+            return False
+
+        start = time.perf_counter()
+        moving = self.motion_gate.update(frame)
+        stage_ms['movimento'] = (time.perf_counter() - start) * 1000
+        if not moving:
+            for detector in active:
+                self.motion_gate.record(detector.name, False)
+            return False
+
+        context = FrameContext(frame, self.pool)
+        now = time.monotonic()
+        spent_ms = 0.0
+        for detector in self.scheduler.plan(active, now):
+            start = time.perf_counter()
+            detector.process(context)
+            ms = (time.perf_counter() - start) * 1000
+            stage_ms[detector.name] = ms
+            self.scheduler.record(detector.name, ms, now)
+            # I rilevatori rinviati dal DetectorScheduler non contano: il gate non li ha né eseguiti né saltati
+            self.motion_gate.record(detector.name, True)
+            spent_ms += ms
+        self.scheduler.finish(spent_ms)
+        return True
+
+    def detector_results(self, group=None):
+        """
+        Ultimi risultati dei rilevatori (solo quelli del gruppo indicato, se
+        c'è) come valori semplici, pronti per DetectionResults o per essere
+        inviati da un processo di analisi.
+        """
+        results = {}
+        for detector in self.detectors:
+            if group is None or detector.group == group:
+                results.update(detector.results())
+        return results
+
+    def log_periodic_stats(self):
+        """Scrive nel log frame saltati dal gate di movimento e costo dei rilevatori."""
+        self.motion_gate.log_skip_ratios()
+        self.scheduler.log_stats()
+
+    def log_stats(self):
+        """Scrive nel log le statistiche dei rilevatori."""
+        for detector in self.detectors:
+            detector.log_stats()
+        self.log_periodic_stats()
+
+class AnalysisThread(QThread):
+    """
+    Stadio di analisi della pipeline: preleva l'ultimo frame disponibile dalla
+    propria mailbox, esegue il FrameAnalyzer e pubblica i risultati in modo
+    asincrono. Se l'analisi è più lenta della webcam, i frame intermedi
+    vengono semplicemente saltati senza rallentare il video.
+    """
+
+    # Ogni quanti frame analizzati scrivere nel log le statistiche del gate di movimento
+    STATS_LOG_INTERVAL = 300
+
+    def __init__(self, analyzer, latency=None):
+        """
+        :param latency: LatencyStats in cui registrare i tempi di ogni rilevatore.
+        """
+        super().__init__()
+        self._run_flag = True
+        self.analyzer = analyzer
+        self.latency = latency
+        self.mailbox = FrameMailbox()
+        self.results = DetectionResults()
+        self.frames_analyzed = 0
+
+    def run(self):
+        """Ciclo dello stadio di analisi."""
+        # _run_flag viene impostato solo in __init__: uno stop() arrivato prima dell'avvio resta valido
+        while self._run_flag:
+            # Senza frame (webcam spenta o rilevatori disattivati) il thread dorme invece di interrogare la mailbox
+            item = self.mailbox.take(block=True)
+            if item is None:
+                continue
+            frame_index, frame = item
+            self.analyzer.analyze(frame)
+            if self.latency is not None:
+                for stage, ms in self.analyzer.stage_ms.items():
+                    self.latency.record(stage, ms)
+            # Pubblicazione atomica: lo stadio di overlay legge sempre un oggetto completo
+            self.results = DetectionResults(frame_index=frame_index, frame_size=frame.shape[1::-1],
+                                            **self.analyzer.detector_results())
+            self.mailbox.release(frame)
+            self.frames_analyzed += 1
+            if self.frames_analyzed % self.STATS_LOG_INTERVAL == 0:
+                self.analyzer.log_periodic_stats()
+        self.analyzer.log_stats()
+
+    def frame_buffer(self, shape):
+        """
+        Buffer dello stadio in cui il thread di cattura scrive direttamente il
+        prossimo frame da analizzare, così submit() non deve copiarlo.
+        :return: None se l'analisi è occupata e il frame verrebbe comunque scartato.
+        """
+        if self.mailbox.has_pending():
+            return None
+        buffer = self.mailbox.acquire(shape)
+        return buffer if buffer is not None else np.empty(shape, dtype=np.uint8)
+
+    def submit(self, frame, frame_index):
+        """Passa all'analisi un frame scritto nel buffer restituito da frame_buffer()."""
+        self.mailbox.post((frame_index, frame))
+
+    def stop(self):
+        """Ferma lo stadio di analisi e ne attende la terminazione."""
+        self._run_flag = False
+        self.mailbox.interrupt()
+        self.wait()
+
+class SharedFrameRing:
+    """
+    Anello di `slots` frame BGR in un blocco di multiprocessing.shared_memory.
+    Il processo principale vi copia i frame da analizzare; i processi di
+    analisi li leggono direttamente dalla memoria condivisa, senza copie né
+    serializzazione.
+    """
+
+    def __init__(self, shape, slots, name=None):
+        """
+        :param shape: Forma (altezza, larghezza, 3) dei frame.
+        :param name: Nome di un anello esistente a cui collegarsi; se None ne crea uno nuovo.
+        """
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.owner = name is None
+        if self.owner:
+            size = slots * int(np.prod(self.shape))
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            try:
+                # Python >= 3.13: il processo che si collega non deve registrare il blocco
+                self._shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                self._shm = shared_memory.SharedMemory(name=name)
+        self.name = self._shm.name
+        self._frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self._shm.buf)
+
+    def frame(self, slot):
+        """Restituisce la vista (senza copia) sul frame dello slot indicato."""
+        return self._frames[slot]
+
+    def close(self):
+        """Chiude l'anello; chi lo ha creato lo elimina anche dal sistema."""
+        self._frames = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+def _analysis_worker(detector, jobs, forward):
+    """
+    Corpo di un processo di analisi: esegue un solo gruppo di rilevatori
+    ("volto" o "mano") sui frame dell'anello condiviso, aggiunge i propri
+    risultati (e il costo di ogni rilevatore) a quelli dei processi
+    precedenti e passa il lavoro a `forward`: la coda del processo successivo
+    o, per l'ultimo, quella dei risultati. Così al processo principale arriva
+    un solo messaggio per frame.
+    """
+    analyzer = FrameAnalyzer(group=detector)
+    frames_analyzed = 0
+    ring = None
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        ring_name, shape, slots, slot, frame_index, settings, detector_results, stage_ms = job
+        if ring is None or ring.name != ring_name:
+            if ring is not None:
+                ring.close()
+            ring = SharedFrameRing(shape, slots, name=ring_name)
+        analyzer.apply_settings(settings)
+        analyzer.analyze(ring.frame(slot))
+        detector_results.update(analyzer.detector_results(detector))
+        stage_ms.update((name, ms) for name, ms in analyzer.stage_ms.items() if name != 'movimento')
+        forward.put((ring_name, shape, slots, slot, frame_index, settings, detector_results, stage_ms))
+        frames_analyzed += 1
+        if frames_analyzed % AnalysisThread.STATS_LOG_INTERVAL == 0:
+            analyzer.log_periodic_stats()
+    if ring is not None:
+        ring.close()
+    analyzer.log_stats()
+
+class ProcessAnalysisStage:
+    """
+    Variante multiprocesso dello stadio di analisi, con la stessa interfaccia
+    di AnalysisThread. Il thread di cattura scrive i frame direttamente in uno
+    SharedFrameRing; ogni gruppo di rilevatori gira in un proprio processo e i
+    processi formano una catena (volto -> mano), così mentre uno elabora un
+    frame il precedente elabora già il successivo: l'analisi usa più core e
+    non contende il GIL al thread della GUI, con un solo messaggio in uscita e
+    uno in entrata per frame. Se tutti gli slot sono occupati il frame non
+    viene analizzato: le code restano limitate a `slots` elementi. Se un
+    processo termina, lo stadio segnala `failed` e il VideoThread torna
+    all'analisi nel thread.
+    """
+
+    # Gruppi di rilevatori (Detector.group), ognuno nel proprio processo
+    DETECTORS = ("volto", "mano")
+
+    def __init__(self, analyzer, slots=3, latency=None):
+        """
+        :param analyzer: FrameAnalyzer del processo principale, usato solo come fonte delle impostazioni.
+        :param latency: LatencyStats in cui registrare i tempi di ogni rilevatore.
+        """
+        self.analyzer = analyzer
+        self.slots = slots
+        self.latency = latency
+        self.results = DetectionResults()
+        self.frames_analyzed = 0
+        self._ring = None
+        self._free = []
+        # Slot inviati ai processi e non ancora tornati
+        self._pending = set()
+        # Slot prestato da frame_buffer() al thread di cattura, con la sua vista sull'anello
+        self._lent = None
+        # Ultimi risultati di ogni rilevatore, uniti in un solo DetectionResults
+        self._latest = {}
+        self._workers = []
+        self._results_queue = None
+        # True se un processo di analisi è terminato: lo stadio va sostituito
+        self.failed = False
+
+    def start(self):
+        """Avvia un processo di analisi per ogni gruppo di rilevatori, collegati in catena."""
+        context = multiprocessing.get_context('spawn')
+        self._results_queue = context.Queue()
+        queues = [context.Queue() for _ in self.DETECTORS] + [self._results_queue]
+        for position, detector in enumerate(self.DETECTORS):
+            process = context.Process(target=_analysis_worker,
+                                      args=(detector, queues[position], queues[position + 1]),
+                                      name=f"analisi-{detector}", daemon=True)
+            process.start()
+            self._workers.append((process, queues[position]))
+        logging.info(f"Analisi video avviata in {len(self._workers)} processi separati")
+
+    def frame_buffer(self, shape):
+        """
+        Raccoglie i risultati arrivati e presta al thread di cattura uno slot
+        libero dell'anello, in cui scrivere direttamente il prossimo frame.
+        :return: La vista sullo slot, o None se il frame non può essere analizzato.
+        """
+        self._check_workers()
+        self._collect()
+        if self.failed:
+            return None
+        if self._ring is None or self._ring.shape != tuple(shape):
+            if self._pending:
+                # L'anello va sostituito solo quando nessun processo lo sta leggendo
+                return None
+            self._replace_ring(shape)
+        if not self._free:
+            return None
+        slot = self._free.pop()
+        self._lent = (slot, self._ring.frame(slot))
+        return self._lent[1]
+
+    def submit(self, frame, frame_index):
+        """Invia al primo processo della catena il frame scritto nello slot prestato da frame_buffer()."""
+        slot, view = self._lent
+        self._lent = None
+        if frame is not view:
+            np.copyto(view, frame)
+        self._pending.add(slot)
+        jobs = self._workers[0][1]
+        jobs.put((self._ring.name, self._ring.shape, self.slots, slot, frame_index, self.analyzer.settings(),
+                  {}, {}))
+
+    def _check_workers(self):
+        """Segna lo stadio come fallito se un processo di analisi è terminato (gli slot non tornerebbero più)."""
+        if self.failed:
+            return
+        for process, _ in self._workers:
+            if not process.is_alive():
+                logging.error(f"Il processo {process.name} è terminato (codice {process.exitcode}): "
+                              f"l'analisi torna nel thread video")
+                self.failed = True
+                return
+
+    def _collect(self):
+        """Applica i risultati restituiti dall'ultimo processo della catena e libera gli slot."""
+        while True:
+            try:
+                _, _, _, slot, frame_index, _, detector_results, stage_ms = self._results_queue.get_nowait()
+            except queue.Empty:
+                return
+            if slot not in self._pending:
+                continue
+            if self.latency is not None:
+                for stage, ms in stage_ms.items():
+                    self.latency.record(stage, ms)
+            self._latest.update(detector_results)
+            self._pending.discard(slot)
+            self._free.append(slot)
+            self.frames_analyzed += 1
+            self.results = DetectionResults(frame_index=frame_index, frame_size=self._ring.shape[1::-1],
+                                            **self._latest)
+
+    def _replace_ring(self, shape):
+        """(Ri)crea l'anello condiviso per la risoluzione indicata."""
+        if self._ring is not None:
+            self._ring.close()
+        self._ring = SharedFrameRing(tuple(shape), self.slots)
+        self._free = list(range(self.slots))
+        logging.info(f"Anello di frame condiviso allocato: {self.slots} x {shape[1]}x{shape[0]}")
+
+    def stop(self):
+        """Ferma i processi di analisi e rilascia la memoria condivisa."""
+        for _, jobs in self._workers:
+            jobs.put(None)
+        for process, _ in self._workers:
+            process.join(timeout=2)
+            if process.is_alive():
+                logging.warning(f"Il processo {process.name} non risponde: viene terminato")
+                process.terminate()
+        self._workers = []
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+        self._pending = set()
 
 class VideoThread(QThread):
     """
     Thread dedicato per la cattura video dalla webcam e rilevamento.
-    Si occupa di acquisire i frame, applicare il rilevamento di volti e mani
-    e inviare i frame elaborati all'interfaccia utente (UI).
+    Orchestra la pipeline video a stadi:
+    - cattura: acquisisce e capovolge i frame alla frequenza della webcam;
+    - analisi: AnalysisThread esegue i rilevatori alla propria frequenza;
+    - uscita: l'ultimo frame viene ridimensionato e depositato nella
+      FrameMailbox letta dalla UI, mentre gli ultimi risultati vengono
+      inviati (solo se cambiati) al DetectionOverlayWidget.
     """
-    # Segnale per inviare l'immagine elaborata all'UI
-    change_pixmap_signal = pyqtSignal(QImage)
+    # Segnale che avvisa l'UI che c'è un nuovo frame nella mailbox.
+    # Viene emesso solo quando lo slot era vuoto, così la coda degli eventi
+    # Qt non si riempie di frame che la GUI non riuscirebbe comunque a disegnare.
+    frame_ready_signal = pyqtSignal()
     # Segnale per inviare messaggi di stato all'UI
     status_signal = pyqtSignal(str)
+    # Segnale con il formato della webcam scelto dalla prova all'avvio, da salvare nelle impostazioni
+    camera_format_signal = pyqtSignal(dict)
+    # Segnale con i DetectionResults da disegnare, emesso solo quando i riquadri cambiano
+    detections_signal = pyqtSignal(object)
 
-    def __init__(self, face_detection_enabled=False, hand_detection_enabled=False, hand_color_range=None):
+    # Livelli di funzionamento della webcam, scelti dalla finestra principale:
+    # spenta, sfondo decorativo a pochi fps, analisi alla frequenza della webcam.
+    TIER_OFF = "spenta"
+    TIER_BACKGROUND = "sfondo"
+    TIER_ANALYSIS = "analisi"
+    # Frame decodificati al secondo nel livello di sfondo
+    BACKGROUND_FPS = 5
+
+    def __init__(self, face_detection_enabled=False, hand_detection_enabled=False, hand_color_range=None,
+                 face_detect_interval=5, face_detect_scale=0.5, motion_threshold=0.2, source=None):
         """
         Inizializza il thread con le impostazioni per il rilevamento.
         :param face_detection_enabled: Booleano per abilitare/disabilitare il rilevamento del volto.
         :param hand_detection_enabled: Booleano per abilitare/disabilitare il rilevamento della mano.
         :param hand_color_range: Tupla contenente i valori HSV minimo e massimo per il colore della mano.
+        :param face_detect_interval: Ogni quanti frame eseguire la cascata di Haar (nel mezzo si insegue).
+        :param face_detect_scale: Fattore di riduzione del frame su cui gira il rilevamento del volto.
+        :param motion_threshold: Percentuale di pixel cambiati per il gate di movimento (0 = analizza sempre ogni frame).
+        :param source: FrameSource da cui leggere i frame (predefinita: la webcam 0).
         """
         super().__init__()
         self._run_flag = True
-        self.face_detection_enabled = face_detection_enabled
-        self.hand_detection_enabled = hand_detection_enabled
-        # Impostazione predefinita per il rilevamento del colore della mano
-        self.hand_color_range = hand_color_range if hand_color_range else (np.array([0, 100, 100]), np.array([10, 255, 255]))
-        self.cap = None
+        self.analyzer = FrameAnalyzer(face_detection_enabled, hand_detection_enabled, hand_color_range,
+                                      face_detect_interval, face_detect_scale, motion_threshold)
+        # Latenze di ogni stadio, dalla cattura al disegno nella GUI
+        self.latency = LatencyStats()
+        self.analysis_stage = AnalysisThread(self.analyzer, latency=self.latency)
+        # Se True l'analisi gira in processi separati (ProcessAnalysisStage)
+        self.process_analysis = False
+        self.source = source if source is not None else CaptureSource(0)
+        self.mailbox = FrameMailbox()
+        self.pool = FrameBufferPool()
+        # Buffer di uscita allocati (quelli riusati tramite la mailbox non contano)
+        self.output_allocations = 0
+        # Frame prelevati dal driver senza decodificarli perché sarebbero stati scartati
+        self.frames_grabbed_only = 0
+        # Dimensione (larghezza, altezza) in pixel dello sfondo video da riempire
+        self.output_size = None
+        self.tier = self.TIER_ANALYSIS
+        self._tier_changed = threading.Event()
+        self._last_frame_time = 0.0
+        # Ultimi risultati inviati all'overlay
+        self._published = None
 
-    def run(self):
+    # Le impostazioni dei rilevatori restano accessibili dal VideoThread
+    @property
+    def face_detection_enabled(self):
+        return self.analyzer.face_detection_enabled
+
+    @face_detection_enabled.setter
+    def face_detection_enabled(self, enabled):
+        self.analyzer.face_detection_enabled = enabled
+
+    @property
+    def hand_detection_enabled(self):
+        return self.analyzer.hand_detection_enabled
+
+    @hand_detection_enabled.setter
+    def hand_detection_enabled(self, enabled):
+        self.analyzer.hand_detection_enabled = enabled
+
+    def set_output_size(self, width, height):
+        """Imposta la dimensione a cui il thread ridimensiona i frame per la GUI."""
+        self.output_size = (width, height)
+
+    def set_tier(self, tier):
+        """Cambia il livello della webcam (TIER_OFF, TIER_BACKGROUND o TIER_ANALYSIS)."""
+        if tier == self.tier:
+            return
+        logging.info(f"Webcam: livello '{self.tier}' -> '{tier}'")
+        self.tier = tier
+        self._tier_changed.set()
+
+    def set_process_analysis(self, enabled):
         """
-        Ciclo principale del thread. Cattura il video dalla webcam,
-        applica i rilevamenti e invia i frame all'interfaccia.
+        Sceglie se eseguire l'analisi in processi separati. Il cambio di
+        stadio avviene nel thread video, al frame successivo.
         """
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
-            self.status_signal.emit("❌ Webcam non disponibile")
-            self._run_flag = False
-            return
+        self.process_analysis = enabled
+
+    def _switch_analysis_stage(self):
+        """Sostituisce lo stadio di analisi in esecuzione con quello richiesto."""
+        self.analysis_stage.stop()
+        if self.process_analysis:
+            stage = ProcessAnalysisStage(self.analyzer, latency=self.latency)
+            try:
+                stage.start()
+            except Exception as e:
+                logging.error(f"Impossibile avviare l'analisi in processi separati: {e}")
+                stage.stop()
+                self.process_analysis = False
+                stage = AnalysisThread(self.analyzer, latency=self.latency)
+                stage.start()
+        else:
+            stage = AnalysisThread(self.analyzer, latency=self.latency)
+            stage.start()
+        self.analysis_stage = stage
 
+    def run(self):
+        """
+        Ciclo principale del thread: apre la sorgente quando il livello della
+        webcam lo richiede e la chiude (senza fermare il thread) quando la
+        webcam viene spenta.
+        """
+        self.analysis_stage.start()
         while self._run_flag:
-            ret, frame = self.cap.read()
+            if self.tier == self.TIER_OFF:
+                # Webcam spenta: si attende un cambio di livello senza tenere aperta la sorgente
+                self._tier_changed.wait()
+                self._tier_changed.clear()
+                continue
+
+            source = self.source
+            if not source.open():
+                self.status_signal.emit(f"❌ {source.name} non disponibile")
+                self._run_flag = False
+                break
+            if source.live and source.capture_format is None:
+                self.status_signal.emit("🔧 Configurazione della webcam...")
+                self.camera_format_signal.emit(source.probe())
+            finished = self._capture(source)
+            # Rilascio della sorgente (webcam) quando il thread si ferma o la webcam viene spenta
+            source.release()
+            if finished:
+                break
+            if self.tier == self.TIER_OFF:
+                self.status_signal.emit("⏸ Webcam in pausa")
+
+        self.analysis_stage.stop()
+        stats = self.mailbox.stats()
+        logging.info(f"Video: {stats['posted']} frame catturati, {stats['shown']} mostrati, "
+                     f"{stats['dropped']} scartati, {self.frames_grabbed_only} non decodificati, "
+                     f"{self.analysis_stage.frames_analyzed} analizzati.")
+        if stats['posted']:
+            allocations = self.pool.allocations + self.analyzer.pool.allocations + self.output_allocations
+            logging.info(f"Video: {allocations / stats['posted']:.3f} allocazioni di buffer per frame "
+                         f"({allocations} in totale).")
+        self.latency.log_summary()
+
+    def _capture(self, source):
+        """
+        Stadio di cattura e overlay. Cattura il video dalla sorgente, passa i
+        frame all'analisi e invia subito all'interfaccia l'ultimo frame con
+        gli ultimi risultati disponibili. Termina quando il thread viene
+        fermato o la webcam spenta.
+        :return: True se la sorgente (file o cartella) ha finito i frame.
+        """
+        pool = self.pool
+        latency = self.latency
+        # Se la sorgente non annuncia la risoluzione, il primo frame la corregge
+        frame_shape = source.frame_shape() or (480, 640, 3)
+        frame_index = 0
+        # Livello per cui è stata chiesta la frequenza alla sorgente, e se la sorgente la rispetta da sola
+        rate_tier = None
+        source_throttled = False
+
+        while self._run_flag and self.tier != self.TIER_OFF:
+            if self.tier != rate_tier:
+                rate_tier = self.tier
+                background = rate_tier == self.TIER_BACKGROUND
+                source_throttled = source.request_fps(self.BACKGROUND_FPS if background else None) and background
+            if self._frame_unneeded():
+                if not source_throttled:
+                    # La sorgente continua alla frequenza piena: si dorme fino al prossimo frame
+                    # invece di prelevarli tutti dal driver
+                    time.sleep(max(0.0, self._last_frame_time + 1.0 / self.BACKGROUND_FPS - time.perf_counter()))
+                    continue
+                # Frame arrivato in anticipo: lo si preleva dal driver senza decodificarlo
+                ret = source.grab()
+                if ret:
+                    self.frames_grabbed_only += 1
+                    continue
+            else:
+                capture = pool.get('capture', frame_shape)
+                ret, captured = source.read(capture)
             if ret:
+                # Istante di cattura del frame, che lo accompagna fino al disegno
+                capture_time = self._last_frame_time = time.perf_counter()
+                # Solo la decodifica: l'attesa del frame successivo non è un costo della cattura
+                latency.record('cattura', source.decode_ms)
+                if captured is not capture:
+                    # La sorgente ha restituito una risoluzione diversa da quella annunciata
+                    frame_shape = captured.shape
+                if isinstance(self.analysis_stage, ProcessAnalysisStage) and self.analysis_stage.failed:
+                    self.process_analysis = False
+                if self.process_analysis != isinstance(self.analysis_stage, ProcessAnalysisStage):
+                    self._switch_analysis_stage()
+                # Se l'analisi accetta il frame, lo specchio viene scritto direttamente nel suo buffer
+                # (o nello slot dell'anello condiviso), senza un'altra copia
+                analysis_buffer = self.analysis_stage.frame_buffer(frame_shape) if self.analyzer.enabled else None
                 # Capovolge il frame orizzontalmente per un effetto "specchio"
-                frame = cv2.flip(frame, 1)
-
-                # Rilevamento del volto
-                if self.face_detection_enabled and face_cascade is not None:
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-                    for (x, y, w, h) in faces:
-                        cv2.rectangle(frame, (x, y), (x + w, y + h), (46, 140, 219), 2)
-
-                # Rilevamento della mano basato sul colore (da implementare)
-                if self.hand_detection_enabled:
-                    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-                    mask = cv2.inRange(hsv, self.hand_color_range[0], self.hand_color_range[1])
-                    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-                    if contours:
-                        max_contour = max(contours, key=cv2.contourArea)
-                        if cv2.contourArea(max_contour) > 5000:
-                            (x, y, w, h) = cv2.boundingRect(max_contour)
-                            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                            cv2.putText(frame, "Mano rilevata", (x, y - 10),
-                                      cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-
-                # Conversione del frame per l'utilizzo in PyQt6
-                rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                h, w, ch = rgb_image.shape
-                bytes_per_line = ch * w
-                q_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-                self.change_pixmap_signal.emit(q_image)
-
-        # Rilascio della webcam quando il thread si ferma
-        if self.cap:
-            self.cap.release()
+                step = time.perf_counter()
+                frame = cv2.flip(captured, 1, dst=analysis_buffer if analysis_buffer is not None
+                                 else pool.get('frame', frame_shape))
+                frame_index += 1
+                latency.record('specchio', (time.perf_counter() - step) * 1000)
+
+                if analysis_buffer is not None:
+                    self.analysis_stage.submit(frame, frame_index)
+                self._publish_detections(self.analysis_stage.results)
+
+                # Ridimensionamento alla dimensione dello sfondo direttamente qui,
+                # così la GUI deve solo disegnare il buffer senza scalarlo.
+                step = time.perf_counter()
+                output = self.render_output(frame)
+                output.capture_time = capture_time
+                output.post_time = time.perf_counter()
+                latency.record('conversione', (output.post_time - step) * 1000)
+                if self.mailbox.post(output):
+                    self.frame_ready_signal.emit()
+            elif not source.live:
+                # File o cartella terminati: la webcam invece può solo perdere un frame
+                self.status_signal.emit(f"⏹ {source.name}: fine dei frame")
+                self._publish_detections(DetectionResults())
+                return True
+        self._publish_detections(DetectionResults())
+        return False
+
+    def _frame_unneeded(self):
+        """
+        True se il prossimo frame verrebbe comunque scartato perché, nel
+        livello di sfondo, non è ancora il momento del prossimo frame. Con la
+        GUI in ritardo invece il frame va decodificato: sostituisce quello in
+        attesa nella mailbox, che altrimenti verrebbe mostrato ormai vecchio.
+        """
+        return (self.tier == self.TIER_BACKGROUND
+                and time.perf_counter() - self._last_frame_time < 1.0 / self.BACKGROUND_FPS)
+
+    def _publish_detections(self, results):
+        """
+        Invia all'overlay della GUI gli ultimi risultati dei rilevatori attivi,
+        ma solo se i riquadri sono cambiati: i frame non vengono mai modificati.
+        """
+        face_enabled = self.face_detection_enabled
+        hand_enabled = self.hand_detection_enabled
+        visible = DetectionResults(results.faces if face_enabled else (),
+                                   results.hand if hand_enabled else None,
+                                   results.frame_index, results.frame_size,
+                                   results.emotions if face_enabled else (),
+                                   results.face_ids if face_enabled else (),
+                                   results.hand_id if hand_enabled else None)
+        if not visible.same_boxes(self._published):
+            self._published = visible
+            self.detections_signal.emit(visible)
+
+    def render_output(self, frame):
+        """
+        Ritaglia e ridimensiona il frame alla dimensione dello sfondo video
+        (equivalente a KeepAspectRatioByExpanding) in un buffer preallocato.
+        Il risultato resta in BGR: la GUI disegna il QImage del PooledFrame (Format_BGR888).
+        """
+        frame_h, frame_w = frame.shape[:2]
+        out_w, out_h = self.output_size or (frame_w, frame_h)
+        if out_w <= 0 or out_h <= 0:
+            out_w, out_h = frame_w, frame_h
+
+        output = self.mailbox.acquire((out_h, out_w, 3))
+        if output is None:
+            output = PooledFrame(out_h, out_w)
+            self.output_allocations += 1
+
+        x0, y0, crop_w, crop_h = expanding_crop(frame_w, frame_h, out_w, out_h)
+        cv2.resize(frame[y0:y0 + crop_h, x0:x0 + crop_w], (out_w, out_h),
+                   dst=output.pixels, interpolation=cv2.INTER_LINEAR)
+        return output
 
     def stop(self):
         """
@@ -101,4 +2063,203 @@ class VideoThread(QThread):
         Imposta il flag di esecuzione su False e attende la terminazione del thread.
         """
         self._run_flag = False
+        # Sveglia il thread se è in attesa con la webcam spenta
+        self._tier_changed.set()
         self.wait()
+
+class VideoBackgroundWidget(QWidget):
+    """
+    Widget di sfondo che disegna direttamente i frame già ridimensionati dal
+    VideoThread, senza conversioni in QPixmap né scalature sul thread della GUI.
+    """
+    # Dimensione in pixel fisici del widget, da passare a VideoThread.set_output_size
+    size_changed = pyqtSignal(int, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+        self.mailbox = None
+        self.latency = None
+        self._frame = None
+        self._image = None
+        self._status = ""
+
+    def set_mailbox(self, mailbox, latency=None):
+        """
+        Collega il widget alla mailbox da cui prelevare i frame.
+        :param latency: LatencyStats in cui registrare attesa, disegno e latenza totale dei frame.
+        """
+        self.mailbox = mailbox
+        self.latency = latency
+
+    def on_frame_ready(self):
+        """Richiede un ridisegno: il frame verrà prelevato in paintEvent."""
+        self.update()
+
+    def set_status(self, message):
+        """
+        Mostra un messaggio di stato al posto del video (es. webcam non
+        disponibile o in pausa); il video riprende con il frame successivo.
+        """
+        self._status = message
+        if message and self._frame is not None:
+            if self.mailbox is not None:
+                self.mailbox.release(self._frame)
+            self._frame = None
+            self._image = None
+        self.update()
+
+    def pixel_size(self):
+        """Restituisce (larghezza, altezza) del widget in pixel fisici."""
+        ratio = self.devicePixelRatioF()
+        return round(self.width() * ratio), round(self.height() * ratio)
+
+    def resizeEvent(self, event):
+        self.size_changed.emit(*self.pixel_size())
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        paint_start = time.perf_counter()
+        new_frame = None
+        if self.mailbox is not None:
+            frame = new_frame = self.mailbox.take()
+            if frame is not None:
+                # Il frame precedente non serve più: torna alla mailbox per essere riusato
+                if self._frame is not None:
+                    self.mailbox.release(self._frame)
+                self._frame = frame
+                self._image = frame.image
+                self._image.setDevicePixelRatio(self.devicePixelRatioF())
+
+        painter = QPainter(self)
+        if self._image is None:
+            painter.fillRect(self.rect(), QColor("black"))
+            if self._status:
+                painter.setPen(QColor("white"))
+                painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, self._status)
+        elif self._frame.shape[1::-1] == self.pixel_size():
+            painter.drawImage(0, 0, self._image)
+        else:
+            # Solo durante un ridimensionamento, finché il thread non si adegua
+            painter.drawImage(self.rect(), self._image)
+        painter.end()
+
+        if new_frame is not None and self.latency is not None:
+            painted = time.perf_counter()
+            self.latency.record('emissione', (paint_start - new_frame.post_time) * 1000)
+            self.latency.record('disegno', (painted - paint_start) * 1000)
+            self.latency.record('totale', (painted - new_frame.capture_time) * 1000)
+
+class DetectionOverlayWidget(QWidget):
+    """
+    Livello trasparente sopra lo sfondo video che disegna i riquadri dei
+    volti (con la loro emozione) e della mano. Viene ridisegnato solo quando arrivano risultati
+    diversi, e lo stile si cambia qui senza toccare la pipeline dei frame.
+    """
+
+    FACE_PEN = QPen(QColor(219, 140, 46), 2)
+    HAND_PEN = QPen(QColor(0, 255, 0), 2)
+    HAND_LABEL = "Mano rilevata"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.setAttribute(Qt.WidgetAttribute.WA_NoSystemBackground)
+        self.results = None
+
+    def set_results(self, results):
+        """Riceve i DetectionResults dal VideoThread e richiede un ridisegno."""
+        self.results = results
+        self.update()
+
+    def _to_widget(self, box, crop, scale_x, scale_y):
+        """Converte un riquadro dai pixel del frame alle coordinate del widget."""
+        x, y, w, h = box
+        x0, y0 = crop[:2]
+        return (round((x - x0) * scale_x), round((y - y0) * scale_y),
+                round(w * scale_x), round(h * scale_y))
+
+    def paintEvent(self, event):
+        results = self.results
+        if results is None or results.frame_size is None or not (results.faces or results.hand):
+            return
+        # Stesso ritaglio usato da VideoThread.render_output per lo sfondo
+        frame_w, frame_h = results.frame_size
+        crop = expanding_crop(frame_w, frame_h, self.width(), self.height())
+        scale_x, scale_y = self.width() / crop[2], self.height() / crop[3]
+
+        painter = QPainter(self)
+        painter.setPen(self.FACE_PEN)
+        for face, emotion in zip(results.faces, results.emotions):
+            x, y, w, h = self._to_widget(face, crop, scale_x, scale_y)
+            painter.drawRect(x, y, w, h)
+            if emotion:
+                painter.drawText(x, y - 10, emotion)
+        if results.hand is not None:
+            x, y, w, h = self._to_widget(results.hand, crop, scale_x, scale_y)
+            painter.setPen(self.HAND_PEN)
+            painter.drawRect(x, y, w, h)
+            painter.drawText(x, y - 10, self.HAND_LABEL)
+        painter.end()
+
+class PerformanceHUD(QLabel):
+    """
+    Pannello facoltativo sopra il video con fps mostrati, frame scartati,
+    fps di analisi, ms di ogni rilevatore e latenza dalla cattura allo schermo.
+    Si aggiorna con un timer solo mentre è visibile.
+    """
+
+    # Stadi mostrati nel pannello, nell'ordine della pipeline
+    STAGES = ('cattura', 'specchio', 'movimento', 'volto', 'emozioni', 'mano', 'conversione', 'emissione', 'disegno')
+
+    def __init__(self, video_thread, parent=None):
+        super().__init__(parent)
+        self.video_thread = video_thread
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 160); color: white; "
+                           "font-family: monospace; padding: 6px;")
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        self._last_time = None
+        self._last_shown = 0
+        self._last_analyzed = 0
+        self.hide()
+
+    def toggle(self):
+        """Mostra o nasconde il pannello."""
+        if self.isVisible():
+            self._timer.stop()
+            self.hide()
+        else:
+            self._last_time = None
+            self.refresh()
+            self.show()
+            self.raise_()
+            self._timer.start(500)
+
+    def refresh(self):
+        """Ricalcola i valori mostrati."""
+        video = self.video_thread
+        stats = video.mailbox.stats()
+        analyzed = video.analysis_stage.frames_analyzed
+        now = time.perf_counter()
+        fps = analysis_fps = 0.0
+        if self._last_time is not None and now > self._last_time:
+            elapsed = now - self._last_time
+            fps = (stats['shown'] - self._last_shown) / elapsed
+            # Lo stadio di analisi può essere stato sostituito e avere azzerato il contatore
+            analysis_fps = max(0, analyzed - self._last_analyzed) / elapsed
+        self._last_time, self._last_shown, self._last_analyzed = now, stats['shown'], analyzed
+
+        summary = video.latency.summary()
+        lines = [f"Webcam: {video.tier}",
+                 f"FPS video {fps:5.1f}   analisi {analysis_fps:5.1f}",
+                 f"Frame scartati {stats['dropped']}   non decodificati {video.frames_grabbed_only}"]
+        for stage in self.STAGES:
+            if stage in summary:
+                lines.append(f"{stage:<12}{summary[stage]['mean']:6.1f} ms")
+        if 'totale' in summary:
+            lines.append(f"Cattura→schermo p50 {summary['totale']['p50']:.1f} ms  "
+                         f"p99 {summary['totale']['p99']:.1f} ms")
+        self.setText("\n".join(lines))
+        self.adjustSize()